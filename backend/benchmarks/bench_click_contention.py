@@ -0,0 +1,119 @@
+"""
+Click-limit enforcement under contention.
+
+Fires ``--clicks`` concurrent ``track_click`` calls at a single link with
+a click limit of ``--limit`` on each storage engine, and checks that
+exactly ``--limit`` redirects are granted and counted. For comparison it
+also runs a read-then-write click (fetch the link, check the limit,
+increment in a second call), the pattern that lets concurrent redirects
+overshoot the limit:
+
+    python -m benchmarks.bench_click_contention --clicks 5000 --limit 100
+
+The MongoDB run uses MONGO_URL and the BENCH_DB_NAME database (default
+"xpirelink_bench"), which is dropped afterwards; it is skipped when
+MongoDB is unreachable.
+"""
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from services.link_store import LinkStore, MemoryLinkStore, MongoLinkStore
+from services.sqlite_store import SqliteLinkStore
+from services.link_cache import link_cache
+from services.link_service import track_click
+from utils.short_code import random_short_code
+from utils.expiry_fields import normalize_expiry_fields
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+async def create(store: LinkStore, limit: int) -> str:
+    expiry_rules = {
+        "summary": f"Expires after {limit} clicks",
+        "type": "clicks",
+        "clickLimit": limit,
+        "timeLimit": None,
+        "rawInput": f"{limit} clicks"
+    }
+    link = {
+        "id": str(uuid.uuid4()),
+        "shortCode": random_short_code(7),
+        "originalUrl": "https://example.com/",
+        "expiryRules": expiry_rules,
+        "clicks": 0,
+        "status": "active",
+        "createdAt": datetime.utcnow(),
+        **normalize_expiry_fields(expiry_rules)
+    }
+    await store.insert(link)
+    return link['shortCode']
+
+
+async def atomic_click(store: LinkStore, short_code: str) -> bool:
+    return (await track_click(store, short_code))['shouldRedirect']
+
+
+async def read_then_write_click(store: LinkStore, short_code: str) -> bool:
+    link = await store.get_by_code(short_code)
+    if link['clicks'] >= link['clickLimit']:
+        return False
+    # Any await between check and write (logging, caching, I/O) lets other clicks in
+    await asyncio.sleep(0)
+    await store.add_clicks({short_code: 1})
+    return True
+
+
+async def bench(label: str, store: LinkStore, click, args) -> None:
+    link_cache.clear()
+    short_code = await create(store, args.limit)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(click(store, short_code) for _ in range(args.clicks)))
+    elapsed = time.perf_counter() - started
+    granted = sum(results)
+    stored = (await store.get_by_code(short_code))['clicks']
+    verdict = "ok" if granted == stored == args.limit else "LIMIT EXCEEDED" if granted > args.limit else "MISMATCH"
+    print(f"{label:<22} granted {granted:>6}  stored {stored:>6}  limit {args.limit:>6}  "
+          f"{args.clicks / elapsed:>10,.0f} clicks/s  {verdict}")
+
+
+async def main(args) -> None:
+    await bench("memory", MemoryLinkStore(), atomic_click, args)
+    await bench("memory read-then-write", MemoryLinkStore(), read_then_write_click, args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteLinkStore(os.path.join(directory, 'links.db'))
+        try:
+            await bench("sqlite", store, atomic_click, args)
+            await bench("sqlite read-then-write", store, read_then_write_click, args)
+        finally:
+            await store.close()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000)
+    db = client[os.environ.get('BENCH_DB_NAME', 'xpirelink_bench')]
+    try:
+        await client.admin.command('ping')
+    except Exception as e:
+        print(f"mongo                  skipped: {e.__class__.__name__}")
+        return
+    try:
+        await db.links.create_index("shortCode", unique=True)
+        await bench("mongo", MongoLinkStore(db), atomic_click, args)
+        await bench("mongo read-then-write", MongoLinkStore(db), read_then_write_click, args)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Click-limit enforcement under contention")
+    parser.add_argument('--clicks', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""
+Microbenchmark for the compiled expiry rule engine.
+
+Compares evaluating a cached ``CompiledExpiry`` against compiling on
+every call, and against the old per-request approach of re-parsing
+``expiryRules.timeLimit``. Pure Python, no database needed:
+
+    python -m benchmarks.bench_expiry_engine [--evaluations 1000000]
+"""
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+from services.expiry_engine import compile_expiry, _compile
+from utils.dates import to_utc_datetime
+from utils.expiry_fields import normalize_expiry_fields
+
+
+def _legacy_is_expired(link: dict) -> bool:
+    expiry_rules = link.get('expiryRules') or {}
+    time_limit = to_utc_datetime(expiry_rules.get('timeLimit'))
+    if time_limit is not None and datetime.now(timezone.utc) >= time_limit:
+        return True
+    click_limit = expiry_rules.get('clickLimit')
+    return click_limit is not None and link.get('clicks', 0) >= int(click_limit)
+
+
+def _rate(label: str, evaluations: int, fn) -> None:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {evaluations / elapsed:>14,.0f} evaluations/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Expiry rule engine microbenchmark")
+    parser.add_argument('--evaluations', type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.evaluations
+
+    expiry_rules = {
+        "summary": "Expires after 5 clicks or by tomorrow",
+        "type": "hybrid",
+        "clickLimit": 5,
+        "timeLimit": (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z',
+        "rawInput": "5 clicks or tomorrow"
+    }
+    link = {"shortCode": "aB3xY9", "clicks": 2, "expiryRules": expiry_rules}
+    link.update(normalize_expiry_fields(expiry_rules))
+    now = time.time()
+
+    def legacy():
+        for _ in range(n):
+            _legacy_is_expired(link)
+
+    def uncached():
+        for _ in range(n):
+            _compile(link).is_expired(2, now)
+
+    def cached():
+        for _ in range(n):
+            compile_expiry(link).is_expired(2, now)
+
+    compiled = compile_expiry(link)
+
+    def precompiled():
+        for _ in range(n):
+            compiled.is_expired(2, now)
+
+    _rate("legacy re-parse per request", n, legacy)
+    _rate("compile per request", n, uncached)
+    _rate("compile_expiry (cached)", n, cached)
+    _rate("CompiledExpiry.is_expired only", n, precompiled)
+
+
+if __name__ == '__main__':
+    main()
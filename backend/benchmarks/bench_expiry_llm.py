@@ -0,0 +1,95 @@
+"""
+Expiry parsing against a simulated LLM.
+
+``--requests`` link creations from ``--concurrency`` creators submit
+phrases the grammar can't read, so every parse needs the LLM. The LLM is
+simulated with a log-normal latency around ``--latency-ms``, of which
+``--slow-fraction`` of the calls take ``--slow-factor`` times longer,
+so no API key is needed. The parse cache is disabled so each request
+goes to the LLM again.
+
+Three runs are reported: a burst drawn from ``--phrases`` distinct
+phrases (LLM calls saved by singleflight), then distinct phrases with
+hedging off and on (tail latency, hedges sent and deadline fallbacks):
+
+    python -m benchmarks.bench_expiry_llm --requests 2000 --concurrency 200 --phrases 20
+"""
+import time
+import random
+import logging
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from services.ai_parser import ExpiryParser, EXPIRY_LLM_DEADLINE_MS
+from services.parse_cache import ExpiryParseCache
+
+
+def simulated_llm(latency_ms: float, slow_fraction: float = 0.0, slow_factor: float = 1.0):
+    calls = []
+
+    async def llm(expiry_text: str, now: datetime) -> dict:
+        calls.append(expiry_text)
+        latency = random.lognormvariate(0, 0.25) * latency_ms / 1000
+        if random.random() < slow_fraction:
+            latency *= slow_factor
+        await asyncio.sleep(latency)
+        return {
+            "type": "time",
+            "clickLimit": None,
+            "timeLimit": (now + timedelta(days=14)).isoformat() + 'Z',
+            "summary": "Expires in 14 days"
+        }
+
+    return llm, calls
+
+
+async def run(label: str, parser: ExpiryParser, calls: list, phrase, args) -> None:
+    remaining = args.requests
+    latencies = []
+
+    async def creator():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await parser.parse(phrase())
+            latencies.append((time.perf_counter() - started) * 1e3)
+
+    await asyncio.gather(*(creator() for _ in range(args.concurrency)))
+    stats = parser.stats()
+    latencies.sort()
+    print(f"{label:<14} {len(calls):>6} LLM calls  {stats['coalescedParses']:>6} coalesced  "
+          f"{stats['hedgesSent']:>5} hedges  {stats['hedgedParses']:>5} hedge wins  {stats['timeouts']:>5} timeouts  "
+          f"p50 {statistics.median(latencies):>6.0f} ms  p99 {latencies[int(len(latencies) * 0.99) - 1]:>6.0f} ms")
+
+
+async def main(args) -> None:
+    llm, calls = simulated_llm(args.latency_ms, args.slow_fraction, args.slow_factor)
+    parser = ExpiryParser(cache=ExpiryParseCache(max_entries=0), llm=llm, hedge_percentile=0)
+    phrases = [f"when campaign {n} wraps up" for n in range(args.phrases)]
+    await run("singleflight", parser, calls, lambda: random.choice(phrases), args)
+
+    counter = iter(range(10 ** 9))
+    for hedge_percentile in (0, args.hedge_percentile):
+        llm, calls = simulated_llm(args.latency_ms, args.slow_fraction, args.slow_factor)
+        parser = ExpiryParser(cache=ExpiryParseCache(max_entries=0), llm=llm, hedge_percentile=hedge_percentile)
+        label = f"hedge p{hedge_percentile:g}" if hedge_percentile else "no hedge"
+        await run(label, parser, calls, lambda: f"when campaign {next(counter)} wraps up", args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Expiry parsing against a simulated LLM")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--phrases', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=400)
+    parser.add_argument('--slow-fraction', type=float, default=0.05)
+    parser.add_argument('--slow-factor', type=float, default=8)
+    parser.add_argument('--hedge-percentile', type=float, default=90)
+    args = parser.parse_args()
+    # Per-request outcome logging would drown the report
+    logging.disable(logging.WARNING)
+    print(f"simulated LLM ~{args.latency_ms:g} ms, {args.slow_fraction:.0%} of calls {args.slow_factor:g}x slower; "
+          f"deadline {EXPIRY_LLM_DEADLINE_MS:g} ms")
+    asyncio.run(main(args))
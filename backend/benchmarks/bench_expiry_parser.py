@@ -0,0 +1,54 @@
+"""
+Coverage and speed of the deterministic expiry grammar.
+
+Parses a corpus of typical expiry phrases, reports how many clear
+``EXPIRY_PARSER_MIN_CONFIDENCE`` and would skip the Gemini round trip,
+and times a parse:
+
+    python -m benchmarks.bench_expiry_parser --verbose
+"""
+import time
+import argparse
+from datetime import datetime
+from services.ai_parser import EXPIRY_PARSER_MIN_CONFIDENCE
+from utils.expiry_grammar import parse_expiry_text
+
+PHRASES = [
+    "3 clicks", "expire after 5 clicks", "1 click", "single use", "10 views", "100 visits", "twice", "5 times",
+    "24 hours", "expire in 24 hours", "48h", "30 minutes", "half an hour", "2 days", "a week", "1 month",
+    "in 3 weeks", "1 hour 30 minutes", "tomorrow", "by tomorrow", "tomorrow at 5pm", "end of day", "tonight",
+    "by friday", "monday 9am", "next week", "next month", "end of the month", "eow", "at midnight",
+    "2025-12-31", "12/31/2025", "dec 31", "january 15th 2026 at noon",
+    "3 clicks or 24 hours", "expire after 5 clicks or by tomorrow", "10 clicks or 7 days whichever comes first",
+    "50 views or end of week", "1 click or 1 hour",
+    "next friday", "3 clicks and 2 days", "after a few clicks", "when the campaign ends", "until the sale is over",
+    "in a fortnight", "3", "expire soon", "after the webinar on tuesday"
+]
+
+
+def main(args) -> None:
+    now = datetime.utcnow()
+    confident = 0
+    for phrase in PHRASES:
+        parsed = parse_expiry_text(phrase)
+        if parsed.confidence >= EXPIRY_PARSER_MIN_CONFIDENCE:
+            confident += 1
+        if args.verbose:
+            marker = "grammar" if parsed.confidence >= EXPIRY_PARSER_MIN_CONFIDENCE else "LLM"
+            print(f"{phrase!r:<46} {parsed.confidence:4.2f} {marker:<7} {parsed.to_expiry(now)['summary']}")
+
+    rounds = max(1, args.parses // len(PHRASES))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for phrase in PHRASES:
+            parse_expiry_text(phrase).to_expiry(now)
+    elapsed = time.perf_counter() - started
+    print(f"{confident}/{len(PHRASES)} phrases at confidence >= {EXPIRY_PARSER_MIN_CONFIDENCE} skip the LLM")
+    print(f"parse + anchor {elapsed / (rounds * len(PHRASES)) * 1e6:.1f} µs")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Coverage and speed of the deterministic expiry grammar")
+    parser.add_argument('--parses', type=int, default=100_000)
+    parser.add_argument('--verbose', action='store_true')
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+"""
+Recovery time of the journaled in-memory link store.
+
+Writes ``--links`` synthetic links (plus ``--clicks`` click records)
+through a ``LinkJournal`` in a temporary directory, then times
+``recover`` twice: replaying the raw journal, and loading a compacted
+snapshot plus a journal tail of ``--tail`` records:
+
+    python -m benchmarks.bench_link_journal --links 1000000
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+from services.link_journal import LinkJournal, INSERT, CLICKS
+from utils.short_code import random_short_code
+from utils.expiry_fields import normalize_expiry_fields
+
+
+def _link() -> dict:
+    expiry_rules = {
+        "summary": "Expires after 5 clicks",
+        "type": "clicks",
+        "clickLimit": 5,
+        "timeLimit": None,
+        "rawInput": "5 clicks"
+    }
+    return {
+        "id": str(uuid.uuid4()),
+        "shortCode": random_short_code(7),
+        "originalUrl": "https://example.com/some/landing/page?utm_source=bench",
+        "expiryRules": expiry_rules,
+        "clicks": 0,
+        "status": "active",
+        "createdAt": datetime.utcnow(),
+        **normalize_expiry_fields(expiry_rules)
+    }
+
+
+def _size(directory: str) -> float:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1e6
+
+
+async def _write(journal: LinkJournal, links: int, clicks: int) -> list:
+    short_codes = []
+    for i in range(links):
+        link = _link()
+        short_codes.append(link['shortCode'])
+        journal.append((INSERT, link))
+        if i % 10000 == 0:
+            await journal.flush()
+    for i in range(clicks):
+        journal.append((CLICKS, random.choice(short_codes), 1))
+        if i % 10000 == 0:
+            await journal.flush()
+    await journal.flush()
+    return short_codes
+
+
+def _recover(directory: str, label: str) -> None:
+    journal = LinkJournal(directory)
+    started = time.perf_counter()
+    links = journal.recover()
+    elapsed = time.perf_counter() - started
+    journal._file.close()
+    print(f"{label:<28} {len(links):>9,} links  {journal.replayed_records:>9,} records  "
+          f"{elapsed:>7.2f} s  {_size(directory):>8.1f} MB on disk")
+
+
+async def main(args) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        journal = LinkJournal(directory, snapshot_every=args.links * 10)
+        journal.recover()
+        started = time.perf_counter()
+        short_codes = await _write(journal, args.links, args.clicks)
+        print(f"journaled {journal.appended:,} records in {time.perf_counter() - started:.2f} s")
+        await journal.stop()
+
+        _recover(directory, "journal replay")
+
+        journal = LinkJournal(directory)
+        journal.recover()
+        journal.start()
+        await journal.snapshot()
+        print(f"snapshot written in {journal.last_snapshot_ms / 1000:.2f} s")
+        for _ in range(args.tail):
+            journal.append((CLICKS, random.choice(short_codes), 1))
+        await journal.stop()
+
+        _recover(directory, "snapshot + journal tail")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Journaled in-memory link store recovery time")
+    parser.add_argument('--links', type=int, default=1_000_000)
+    parser.add_argument('--clicks', type=int, default=1_000_000)
+    parser.add_argument('--tail', type=int, default=100_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+Redirect throughput per link storage engine.
+
+Creates links with a click limit (so every redirect is an atomic store
+write, never a write-behind) and drives ``track_click`` from concurrent
+workers through the memory, SQLite and MongoDB engines:
+
+    python -m benchmarks.bench_link_store --links 1000 --clicks 20000 --concurrency 64
+
+The MongoDB run uses MONGO_URL and the BENCH_DB_NAME database (default
+"xpirelink_bench"), which is dropped afterwards; it is skipped when
+MongoDB is unreachable. The SQLite file is created in a temporary
+directory.
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from datetime import datetime
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from services.link_store import LinkStore, MemoryLinkStore, MongoLinkStore
+from services.sqlite_store import SqliteLinkStore
+from services.link_cache import link_cache
+from services.link_service import track_click
+from utils.short_code import random_short_code
+from utils.expiry_fields import normalize_expiry_fields
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+async def populate(store: LinkStore, total: int, limit: int = 1000000) -> list:
+    short_codes = []
+    for _ in range(total):
+        expiry_rules = {
+            "summary": f"Expires after {limit} clicks",
+            "type": "clicks",
+            "clickLimit": limit,
+            "timeLimit": None,
+            "rawInput": f"{limit} clicks"
+        }
+        link = {
+            "id": str(uuid.uuid4()),
+            "shortCode": random_short_code(7),
+            "originalUrl": "https://example.com/",
+            "expiryRules": expiry_rules,
+            "clicks": 0,
+            "status": "active",
+            "createdAt": datetime.utcnow(),
+            **normalize_expiry_fields(expiry_rules)
+        }
+        await store.insert(link)
+        short_codes.append(link['shortCode'])
+    return short_codes
+
+
+async def run_clicks(store: LinkStore, short_codes: list, clicks: int, concurrency: int) -> dict:
+    remaining = clicks
+    latencies = []
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            result = await track_click(store, random.choice(short_codes))
+            latencies.append((time.perf_counter() - t0) * 1e3)
+            assert result['shouldRedirect']
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "redirects/s": clicks / elapsed,
+        "p50 ms": statistics.median(latencies),
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1]
+    }
+
+
+async def bench(label: str, store: LinkStore, args) -> None:
+    link_cache.clear()
+    short_codes = await populate(store, args.links)
+    result = await run_clicks(store, short_codes, args.clicks, args.concurrency)
+    print(f"{label:<8} " + "  ".join(f"{k} {v:>10,.2f}" for k, v in result.items()))
+    extra = store.stats()
+    if len(extra) > 1:
+        print(f"         {extra}")
+
+
+async def main(args) -> None:
+    await bench("memory", MemoryLinkStore(), args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteLinkStore(os.path.join(directory, 'links.db'))
+        try:
+            await bench("sqlite", store, args)
+        finally:
+            await store.close()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000)
+    db = client[os.environ.get('BENCH_DB_NAME', 'xpirelink_bench')]
+    try:
+        await client.admin.command('ping')
+    except Exception as e:
+        print(f"mongo    skipped: {e.__class__.__name__}")
+        return
+    try:
+        await db.links.create_index("shortCode", unique=True)
+        await bench("mongo", MongoLinkStore(db), args)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Redirect throughput per link storage engine")
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
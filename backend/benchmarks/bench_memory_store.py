@@ -0,0 +1,111 @@
+"""
+Memory per link of the in-memory link store.
+
+Measures with ``tracemalloc`` what ``--links`` realistic links cost when
+kept the historical way (a dict per link, indexed by short code and by
+id) and in a ``CompactLinkTable``, then times the hot operations of the
+table:
+
+    python -m benchmarks.bench_memory_store --links 200000
+"""
+import gc
+import time
+import pickle
+import uuid
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from utils.short_code import random_short_code
+from utils.expiry_fields import normalize_expiry_fields
+from utils.compact_links import CompactLinkTable
+
+_RULES = [
+    ("Expires after {n} clicks", "clicks", "{n} clicks"),
+    ("Expires in {n} hours", "time", "{n} hours"),
+    ("Expires after {n} clicks or in 7 days", "hybrid", "{n} clicks or 7 days"),
+]
+
+
+def _link() -> dict:
+    """A link as create_link builds it, with a varied URL and rule."""
+    n = random.choice([1, 5, 10, 24, 100])
+    summary, rule_type, raw_input = (s.format(n=n) for s in random.choice(_RULES))
+    now = datetime.now(timezone.utc)
+    expiry_rules = {
+        "summary": summary,
+        "type": rule_type,
+        "clickLimit": n if rule_type != 'time' else None,
+        "timeLimit": now + timedelta(hours=n if rule_type == 'time' else 168) if rule_type != 'clicks' else None,
+        "rawInput": raw_input
+    }
+    return {
+        "id": str(uuid.uuid4()),
+        "shortCode": random_short_code(random.choice([6, 7])),
+        "originalUrl": f"https://example.com/articles/{random.randrange(10 ** 9)}?utm_source=newsletter",
+        "expiryRules": expiry_rules,
+        "clicks": random.randrange(50),
+        "status": "active",
+        "createdAt": now.replace(tzinfo=None),
+        **normalize_expiry_fields(expiry_rules)
+    }
+
+
+def _traced(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def _per_op(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def main(args) -> None:
+    links = [_link() for _ in range(args.links)]
+    # Each store gets its own objects, as documents arriving from requests or the journal do
+    blobs = [pickle.dumps(link) for link in links]
+
+    def dicts():
+        by_code, by_id = {}, {}
+        for blob in blobs:
+            stored = pickle.loads(blob)
+            by_code[stored['shortCode']] = stored
+            by_id[stored['id']] = stored
+        return by_code, by_id
+
+    def table():
+        links_table = CompactLinkTable()
+        for blob in blobs:
+            links_table.put(pickle.loads(blob))
+        return links_table
+
+    (by_code, _), dict_bytes = _traced(dicts)
+    del by_code, _
+    links_table, table_bytes = _traced(table)
+    count = len(links_table)
+    print(f"dict per link        {dict_bytes / count:>8.0f} bytes/link")
+    print(f"CompactLinkTable     {table_bytes / count:>8.0f} bytes/link  "
+          f"({links_table.memory_bytes() / count:.0f} by memory_bytes())")
+    print(f"ratio                {dict_bytes / table_bytes:>8.1f}x")
+
+    codes = [link['shortCode'] for link in random.sample(links, min(count, 50000))]
+    fresh = [_link() for _ in range(len(codes))]
+    print(f"put {_per_op(links_table.put, fresh):.1f} µs  "
+          f"get {_per_op(links_table.get, codes):.1f} µs  "
+          f"contains {_per_op(links_table.__contains__, codes):.1f} µs  "
+          f"add_clicks {_per_op(lambda code: links_table.add_clicks(code, 1), codes):.1f} µs")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory per link of the in-memory link store")
+    parser.add_argument('--links', type=int, default=200_000)
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+"""
+Throughput of MongoDB link lookups and clicks with and without micro-batching.
+
+Drives ``--requests`` ``get_by_code`` calls, then as many ``click``
+calls, from ``--concurrency`` workers against a ``MongoLinkStore`` with
+batching off, then on, and prints throughput, latency and the
+batch-size histogram. The click run also checks that no link was
+granted more clicks than its limit:
+
+    python -m benchmarks.bench_mongo_batching --requests 50000 --concurrency 256
+
+Uses MONGO_URL and the BENCH_DB_NAME database (default
+"xpirelink_bench"), which is dropped afterwards; exits when MongoDB is
+unreachable.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from services.link_store import MongoLinkStore
+from benchmarks.bench_link_store import populate
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+async def drive(call, short_codes: list, requests: int, concurrency: int) -> dict:
+    remaining = requests
+    latencies = []
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await call(random.choice(short_codes))
+            latencies.append((time.perf_counter() - t0) * 1e3)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "req/s": requests / elapsed,
+        "p50 ms": statistics.median(latencies),
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1]
+    }
+
+
+def report(label: str, result: dict, batcher) -> None:
+    print(f"{label:<16} " + "  ".join(f"{k} {v:>10,.2f}" for k, v in result.items()))
+    if batcher is not None:
+        stats = batcher.stats()
+        print(f"{'':<16} avg batch {stats['avgBatchSize']:.1f}  histogram {stats['batchSizeHistogram']}")
+
+
+async def main(args) -> None:
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000)
+    db = client[os.environ.get('BENCH_DB_NAME', 'xpirelink_bench')]
+    try:
+        await client.admin.command('ping')
+    except Exception as e:
+        print(f"MongoDB unreachable: {e.__class__.__name__}")
+        return
+    try:
+        await db.links.create_index("shortCode", unique=True)
+        short_codes = await populate(MongoLinkStore(db), args.links)
+        for batching in (False, True):
+            store = MongoLinkStore(db, read_batching=batching)
+            result = await drive(store.get_by_code, short_codes, args.requests, args.concurrency)
+            report("reads batched" if batching else "reads", result, store.read_batcher)
+            await store.close()
+
+        for batching in (False, True):
+            await db.links.delete_many({})
+            limit = args.requests // args.links // 2
+            short_codes = await populate(MongoLinkStore(db), args.links, limit)
+            store = MongoLinkStore(db, click_batching=batching)
+            granted = {}
+
+            async def click(short_code):
+                _, counted = await store.click(short_code, time.time())
+                granted[short_code] = granted.get(short_code, 0) + counted
+
+            result = await drive(click, short_codes, args.requests, args.concurrency)
+            report("clicks batched" if batching else "clicks", result, store.click_batcher)
+            await store.close()
+            stored = {doc['shortCode']: doc['clicks'] async for doc in db.links.find({}, {"shortCode": 1, "clicks": 1})}
+            over = [code for code in short_codes if granted.get(code, 0) != stored[code] or stored[code] > limit]
+            print(f"{'':<16} {len(over)} links over their limit of {limit} or with granted != stored")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="MongoDB link lookups with and without micro-batching")
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--concurrency', type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
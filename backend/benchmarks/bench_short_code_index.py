@@ -0,0 +1,114 @@
+"""
+Compare the string shortCode index with the int64 shortCodeKey index.
+
+Fills a scratch collection with synthetic links, builds both indexes and
+reports their on-disk size plus point-lookup latency through each key.
+Run from the backend directory against a disposable database:
+
+    python -m benchmarks.bench_short_code_index --links 10000000
+
+Requires MONGO_URL; uses the BENCH_DB_NAME database (default
+"xpirelink_bench"), which is dropped afterwards unless --keep is passed.
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils.short_code import random_short_code, link_lookup_keys, short_code_key
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+async def populate(collection, total: int, batch_size: int) -> list:
+    """Insert synthetic links and return a sample of their short codes."""
+    sample = []
+    seen = set()
+    inserted = 0
+    while inserted < total:
+        docs = []
+        while len(docs) < min(batch_size, total - inserted):
+            short_code = random_short_code(7)
+            if short_code in seen:
+                continue
+            seen.add(short_code)
+            link_id = str(uuid.uuid4())
+            docs.append({
+                "id": link_id,
+                "shortCode": short_code,
+                "originalUrl": "https://example.com/",
+                "clicks": 0,
+                "status": "active",
+                "createdAt": datetime.utcnow(),
+                **link_lookup_keys(short_code, link_id)
+            })
+        await collection.insert_many(docs, ordered=False)
+        inserted += len(docs)
+        if len(sample) < 100000:
+            sample.extend(doc['shortCode'] for doc in docs[:1000])
+        print(f"\rinserted {inserted}/{total}", end='', flush=True)
+    print()
+    return sample
+
+
+async def time_lookups(collection, filters: list) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for query in filters:
+        t0 = time.perf_counter()
+        await collection.find_one(query, {"_id": 0, "originalUrl": 1})
+        latencies.append((time.perf_counter() - t0) * 1e6)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "lookups/s": round(len(filters) / elapsed),
+        "p50_us": round(statistics.median(latencies)),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1])
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="shortCode vs shortCodeKey index benchmark")
+    parser.add_argument('--links', type=int, default=10_000_000)
+    parser.add_argument('--lookups', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark database")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('BENCH_DB_NAME', 'xpirelink_bench')]
+    collection = db.links
+    try:
+        await collection.drop()
+        sample = await populate(collection, args.links, args.batch_size)
+        await collection.create_index("shortCode", unique=True)
+        await collection.create_index("shortCodeKey", unique=True)
+
+        stats = await db.command("collStats", "links")
+        sizes = stats['indexSizes']
+        print(f"index size  shortCode_1:    {sizes['shortCode_1'] / 2**20:8.1f} MiB")
+        print(f"index size  shortCodeKey_1: {sizes['shortCodeKey_1'] / 2**20:8.1f} MiB")
+
+        codes = [random.choice(sample) for _ in range(args.lookups)]
+        # Warm both indexes before timing
+        await time_lookups(collection, [{"shortCode": code} for code in codes[:10000]])
+        await time_lookups(collection, [{"shortCodeKey": short_code_key(code)} for code in codes[:10000]])
+        print("lookup by shortCode:   ", await time_lookups(collection, [{"shortCode": code} for code in codes]))
+        print("lookup by shortCodeKey:", await time_lookups(
+            collection, [{"shortCodeKey": short_code_key(code)} for code in codes]
+        ))
+    finally:
+        if not args.keep:
+            await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
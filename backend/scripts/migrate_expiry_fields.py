@@ -0,0 +1,71 @@
+"""
+Backfill the precomputed ``expiresAtEpoch`` and ``clickLimit`` fields.
+
+Links created before these fields existed are still served through a
+slower ``expiryRules`` fallback; run this once, from the backend directory:
+
+    python -m scripts.migrate_expiry_fields [--chunk-size 5000]
+
+Safe to re-run: only documents without ``expiresAtEpoch`` are touched.
+"""
+import os
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from utils.expiry_fields import normalize_expiry_fields
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(db: AsyncIOMotorDatabase, chunk_size: int = 5000) -> int:
+    """
+    Add the numeric expiry fields to every link that lacks them, in chunked bulk writes.
+
+    Args:
+        db: MongoDB database instance
+        chunk_size: Number of updates per bulk_write
+
+    Returns:
+        Number of documents updated
+    """
+    updated = 0
+    ops = []
+    cursor = db.links.find(
+        {"expiresAtEpoch": {"$exists": False}}, {"_id": 1, "expiryRules": 1}
+    ).batch_size(chunk_size)
+    async for doc in cursor:
+        ops.append(UpdateOne({"_id": doc['_id']}, {"$set": normalize_expiry_fields(doc.get('expiryRules'))}))
+        if len(ops) >= chunk_size:
+            result = await db.links.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+            logger.info(f"Migrated {updated} links")
+    if ops:
+        result = await db.links.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+    return updated
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        updated = await migrate(client[os.environ['DB_NAME']], args.chunk_size)
+        logger.info(f"Done: {updated} links migrated")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
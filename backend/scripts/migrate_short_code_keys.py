@@ -0,0 +1,76 @@
+"""
+Backfill ``shortCodeKey`` and ``idKey`` on existing links.
+
+Run from the backend directory before enabling ``SHORT_CODE_INT_KEY``:
+
+    python -m scripts.migrate_short_code_keys [--chunk-size 5000]
+
+Safe to re-run: only documents without ``shortCodeKey`` are touched.
+"""
+import os
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from utils.short_code import link_lookup_keys
+from services.indexes import ensure_link_indexes
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(db: AsyncIOMotorDatabase, chunk_size: int = 5000) -> int:
+    """
+    Add lookup keys to every link that lacks them, in chunked bulk writes.
+
+    Args:
+        db: MongoDB database instance
+        chunk_size: Number of updates per bulk_write
+
+    Returns:
+        Number of documents updated
+    """
+    # Includes the unique partial indexes on shortCodeKey and idKey
+    await ensure_link_indexes(db)
+
+    updated = 0
+    ops = []
+    cursor = db.links.find(
+        {"shortCodeKey": {"$exists": False}}, {"_id": 1, "shortCode": 1, "id": 1}
+    ).batch_size(chunk_size)
+    async for doc in cursor:
+        keys = link_lookup_keys(doc['shortCode'], doc.get('id', ''))
+        if keys:
+            ops.append(UpdateOne({"_id": doc['_id']}, {"$set": keys}))
+        if len(ops) >= chunk_size:
+            result = await db.links.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+            logger.info(f"Migrated {updated} links")
+    if ops:
+        result = await db.links.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+    return updated
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        updated = await migrate(client[os.environ['DB_NAME']], args.chunk_size)
+        logger.info(f"Done: {updated} links migrated")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -13,7 +14,21 @@ from datetime import datetime, timezone
 
 # Import our custom modules
 from models import CreateLinkRequest, CreateLinkResponse, ClickResponse
-from services.link_service import create_link, get_link_by_short_code, track_click, get_link_stats
+from services.link_service import (
+    create_link, get_link_by_short_code, track_click, get_link_stats, flush_click_buffer, expire_due_links
+)
+from services.indexes import bootstrap_link_indexes, LINK_INDEX_AUDIT
+from services.link_store import create_link_store, FallbackLinkStore
+from services.reconciler import reconciler
+from services.circuit_breaker import mongo_breaker
+from utils.short_code import is_valid_short_code
+from services.link_cache import link_cache, miss_cache
+from services.click_buffer import click_buffer
+from services.code_index import short_code_index
+from services.code_reservoir import code_reservoir
+from services.ai_parser import expiry_parser, gemini_client
+from services.parse_cache import expiry_parse_cache
+from utils.compact_links import MemoryFullError
 
 
 ROOT_DIR = Path(__file__).parent
@@ -21,8 +36,13 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Bound how long a call waits for an unreachable server before the breaker counts a
+# failure; the driver's 30 s default would hold every request that long during an outage
+client = AsyncIOMotorClient(
+    mongo_url, serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000'))
+)
 db = client[os.environ['DB_NAME']]
+link_store = create_link_store(db)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -79,11 +99,14 @@ async def create_smart_link(request: CreateLinkRequest):
     Create a new smart link with AI-powered expiry rule parsing.
     """
     try:
-        link_data = await create_link(db, request)
+        link_data = await create_link(link_store, request)
         return CreateLinkResponse(
             success=True,
             data=link_data
         )
+    except MemoryFullError as e:
+        logger.error(f"Error creating link: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error creating link: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -95,7 +118,7 @@ async def get_link(short_code: str):
     Get link details by short code.
     """
     try:
-        link = await get_link_by_short_code(db, short_code)
+        link = await get_link_by_short_code(link_store, short_code)
         if not link:
             raise HTTPException(status_code=404, detail="Link not found")
         
@@ -139,7 +162,7 @@ async def track_link_click(short_code: str):
     Track a click on a link and check expiry.
     """
     try:
-        result = await track_click(db, short_code)
+        result = await track_click(link_store, short_code)
         return ClickResponse(**result)
     except Exception as e:
         logger.error(f"Error tracking click: {e}")
@@ -152,7 +175,7 @@ async def get_link_statistics(link_id: str):
     Get statistics for a specific link.
     """
     try:
-        stats = await get_link_stats(db, link_id)
+        stats = await get_link_stats(link_store, link_id)
         if not stats:
             raise HTTPException(status_code=404, detail="Link not found")
         
@@ -167,6 +190,29 @@ async def get_link_statistics(link_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/metrics")
+async def get_metrics():
+    """
+    Expose in-process cache and buffer counters for capacity sizing.
+    """
+    return {
+        "success": True,
+        "data": {
+            "linkStore": link_store.stats(),
+            "mongoBreaker": mongo_breaker.stats(),
+            "linkCache": link_cache.stats(),
+            "missCache": miss_cache.stats(),
+            "clickBuffer": click_buffer.stats(),
+            "shortCodeIndex": short_code_index.stats(),
+            "codeReservoir": code_reservoir.stats(),
+            "reconciler": reconciler.stats(),
+            "expiryParser": expiry_parser.stats(),
+            "expiryParseCache": expiry_parse_cache.stats(),
+            "geminiClient": gemini_client.stats()
+        }
+    }
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -185,8 +231,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def prepare_links_collection():
+    try:
+        if link_store.db is not None:
+            await bootstrap_link_indexes(link_store.db)
+        await expire_due_links(link_store)
+    except Exception as e:
+        logger.error(f"Error preparing links collection: {e}")
+        if LINK_INDEX_AUDIT == 'strict':
+            raise
+
+@app.on_event("startup")
+async def bootstrap_indexes():
+    if LINK_INDEX_AUDIT == 'strict':
+        # Refuse to serve traffic until every query shape is index-served
+        await prepare_links_collection()
+    else:
+        # Don't hold up startup (or the in-memory fallback) on a slow or absent MongoDB
+        asyncio.create_task(prepare_links_collection())
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Restore journaled in-memory links before serving
+    await link_store.open()
+    gemini_client.start()
+    # Parse cache, shared and warmed from past links' expiry phrases when MongoDB is configured
+    expiry_parser.start(link_store.db)
+    click_buffer.start(lambda: flush_click_buffer(link_store))
+    if link_store.db is not None:
+        # The Bloom filter and the code reservoir are built from MongoDB
+        short_code_index.start(link_store.db)
+        code_reservoir.start(link_store.db)
+    if isinstance(link_store, FallbackLinkStore):
+        # Write links created during MongoDB outages back once it recovers
+        reconciler.start(link_store)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Drain write-behind clicks before the connection goes away
+    await click_buffer.stop()
+    await reconciler.stop()
+    await short_code_index.stop()
+    await code_reservoir.stop(link_store.db)
+    await expiry_parser.stop()
+    await link_store.close()
     client.close()
 
 # Minimal expired HTML page
@@ -215,12 +303,14 @@ def expired_html(link: dict) -> str:
 # Redirect short code at root
 @app.get("/{short_code}")
 async def redirect_short_code(short_code: str):
+    # favicon.ico, robots.txt, scanner probes and typos never reach the database
+    if not is_valid_short_code(short_code):
+        raise HTTPException(status_code=404, detail="Link not found")
     try:
-        result = await track_click(db, short_code)
+        result = await track_click(link_store, short_code)
         if result.get("shouldRedirect") and result.get("originalUrl"):
             return RedirectResponse(url=result["originalUrl"], status_code=307)
-        link = await get_link_by_short_code(db, short_code)
-        return HTMLResponse(content=expired_html(link or {}), status_code=410)
+        return HTMLResponse(content=expired_html(result.get("link") or {}), status_code=410)
     except HTTPException:
         raise
     except Exception as e:
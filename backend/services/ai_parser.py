@@ -1,14 +1,37 @@
 import os
 import json
-from datetime import datetime, timedelta
+import time
+import uuid
+import asyncio
+import itertools
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from dotenv import load_dotenv
 import logging
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.expiry_grammar import (
+    MAX_CLICK_LIMIT, ParsedExpiry, normalize_expiry_text, parse_expiry_text, parsed_from_expiry
+)
+from services.parse_cache import ExpiryParseCache, expiry_parse_cache
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+GEMINI_PROVIDER = "gemini"
+GEMINI_MODEL = "gemini-2.0-flash"
+# Phrases the grammar reads at least this confidently never reach Gemini
+EXPIRY_PARSER_MIN_CONFIDENCE = float(os.environ.get('EXPIRY_PARSER_MIN_CONFIDENCE', '0.8'))
+# Total time a request may spend waiting on Gemini before the grammar answers instead
+EXPIRY_LLM_DEADLINE_MS = float(os.environ.get('EXPIRY_LLM_DEADLINE_MS', '2500'))
+# Send a second request once the first has run longer than this percentile of recent calls; 0 disables
+EXPIRY_LLM_HEDGE_PERCENTILE = float(os.environ.get('EXPIRY_LLM_HEDGE_PERCENTILE', '90'))
+
+# Recent call latencies the hedge delay is computed from, and how many it needs first
+LLM_LATENCY_WINDOW = 256
+HEDGE_MIN_SAMPLES = 20
 
 SYSTEM_PROMPT = """You are an expiry rule parser for a link shortener called XpireLink. Your job is to parse user's natural language input describing when a link should expire and return structured JSON.
 
@@ -16,155 +39,333 @@ Rules:
 - Identify click-based expiry (e.g., "3 clicks", "after 5 clicks", "5 times")
 - Identify time-based expiry (e.g., "24 hours", "tomorrow", "2 days", "next week")
 - Handle hybrid rules (e.g., "3 clicks or 24 hours", "5 clicks or by tomorrow")
-- Current date and time: {current_time}
+- Each request starts with the current date and time; compute time limits from it
 
 Output ONLY valid JSON in this exact format (no markdown, no code blocks, just JSON):
-{{
+{
   "type": "clicks" | "time" | "hybrid",
   "clickLimit": number or null,
   "timeLimit": "ISO 8601 datetime string" or null,
   "summary": "Human-readable expiry description"
-}}
+}
 
 Examples:
 Input: "expire after 3 clicks"
-Output: {{"type": "clicks", "clickLimit": 3, "timeLimit": null, "summary": "Expires after 3 clicks"}}
+Output: {"type": "clicks", "clickLimit": 3, "timeLimit": null, "summary": "Expires after 3 clicks"}
 
 Input: "expire in 24 hours"
-Output: {{"type": "time", "clickLimit": null, "timeLimit": "2024-11-26T19:30:00Z", "summary": "Expires in 24 hours (Nov 26, 7:30 PM)"}}
+Output: {"type": "time", "clickLimit": null, "timeLimit": "2024-11-26T19:30:00Z", "summary": "Expires in 24 hours (Nov 26, 7:30 PM)"}
 
 Input: "expire after 5 clicks or by tomorrow"
-Output: {{"type": "hybrid", "clickLimit": 5, "timeLimit": "2024-11-26T23:59:59Z", "summary": "Expires after 5 clicks or by tomorrow (Nov 26, 11:59 PM)"}}
+Output: {"type": "hybrid", "clickLimit": 5, "timeLimit": "2024-11-26T23:59:59Z", "summary": "Expires after 5 clicks or by tomorrow (Nov 26, 11:59 PM)"}
 
 Be precise with dates and times. Return ONLY the JSON, nothing else."""
 
 
-async def parse_expiry_with_gemini(expiry_text: str) -> dict:
-    """
-    Parse natural language expiry text using Gemini AI.
-    
-    Args:
-        expiry_text: Natural language description of expiry rules
-    
-    Returns:
-        Dictionary with parsed expiry rules
+class GeminiClient:
     """
-    try:
-        current_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-        system_message = SYSTEM_PROMPT.format(current_time=current_time)
+    Process-wide Gemini client for expiry parsing.
 
-        if not GEMINI_API_KEY:
-            raise ValueError("Missing GEMINI_API_KEY")
+    ``start`` resolves the integration once at startup; afterwards a call
+    only builds its message objects. The system prompt is constant and
+    the request's current time travels in the user message. ``LlmChat``
+    keeps the history of its conversation, so each call gets a chat of
+    its own under a unique session ID instead of every request appending
+    to one shared "expiry-parser" conversation; the HTTP transport
+    underneath is process-wide, so connections are reused across calls.
+    """
 
-        try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-        except Exception as e:
-            raise e
+    def __init__(self, api_key: Optional[str] = GEMINI_API_KEY):
+        self.api_key = api_key
+        self._chat_type = None
+        self._message_type = None
+        self._started = False
+        self._session_prefix = f"expiry-parser-{uuid.uuid4().hex[:8]}"
+        self._sessions = itertools.count(1)
+        self.error: Optional[str] = None
+        self.calls = 0
 
-        chat = LlmChat(
-            api_key=GEMINI_API_KEY,
-            session_id="expiry-parser",
-            system_message=system_message
-        ).with_model("gemini", "gemini-2.0-flash")
+    def start(self) -> None:
+        """Resolve the integration; a missing key or package is reported once and makes every call fail fast."""
+        if self._started:
+            return
+        self._started = True
+        if not self.api_key:
+            self.error = "Missing GEMINI_API_KEY"
+        else:
+            try:
+                from emergentintegrations.llm.chat import LlmChat, UserMessage
+                self._chat_type, self._message_type = LlmChat, UserMessage
+            except ImportError as e:
+                self.error = f"emergentintegrations unavailable: {e}"
+        if self.error:
+            logger.warning(f"Gemini expiry parsing disabled: {self.error}")
 
-        user_message = UserMessage(
-            text=f"Parse this expiry rule: {expiry_text}"
-        )
+    async def ask(self, expiry_text: str, now: datetime) -> dict:
+        """
+        Parse expiry text with Gemini AI, relative to ``now`` (naive UTC).
 
-        response = await chat.send_message(user_message)
+        Raises:
+            Exception: If Gemini is not configured, fails, or returns
+                something other than the expected JSON
+        """
+        self.start()
+        if self._chat_type is None:
+            raise RuntimeError(self.error)
+        self.calls += 1
+        chat = self._chat_type(
+            api_key=self.api_key,
+            session_id=f"{self._session_prefix}-{next(self._sessions)}",
+            system_message=SYSTEM_PROMPT
+        ).with_model(GEMINI_PROVIDER, GEMINI_MODEL)
+        response = await chat.send_message(self._message_type(
+            text=f"Current date and time: {now:%Y-%m-%d %H:%M:%S} UTC\nParse this expiry rule: {expiry_text}"
+        ))
         logger.info(f"Gemini raw response: {response}")
-        
-        cleaned_response = response.strip()
-        if cleaned_response.startswith('```'):
-            lines = cleaned_response.split('\n')
-            cleaned_response = '\n'.join(lines[1:-1] if len(lines) > 2 else lines)
-            cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
-        
+        return _parse_response(response)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self._chat_type is not None,
+            "model": GEMINI_MODEL,
+            "calls": self.calls,
+            "error": self.error
+        }
+
+
+gemini_client = GeminiClient()
+
+
+def _parse_response(response: str) -> dict:
+    cleaned_response = response.strip()
+    if cleaned_response.startswith('```'):
+        lines = cleaned_response.split('\n')
+        cleaned_response = '\n'.join(lines[1:-1] if len(lines) > 2 else lines)
+        cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
+    
+    try:
         parsed_data = json.loads(cleaned_response)
-        required_fields = ['type', 'clickLimit', 'timeLimit', 'summary']
-        if not all(field in parsed_data for field in required_fields):
-            raise ValueError("Missing required fields in AI response")
-        
-        return parsed_data
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse Gemini response as JSON: {e}")
+    except json.JSONDecodeError:
         logger.error(f"Raw response: {response}")
-        return _fallback_parse(expiry_text)
-    except Exception as e:
-        logger.error(f"Error parsing expiry with Gemini: {e}")
-        return _fallback_parse(expiry_text)
+        raise
+    required_fields = ['type', 'clickLimit', 'timeLimit', 'summary']
+    if not all(field in parsed_data for field in required_fields):
+        raise ValueError("Missing required fields in AI response")
+    click_limit = parsed_data['clickLimit']
+    if click_limit is not None and not 1 <= click_limit <= MAX_CLICK_LIMIT:
+        raise ValueError(f"Click limit out of range in AI response: {click_limit}")
+    
+    return parsed_data
 
 
-def _fallback_parse(expiry_text: str) -> dict:
+class ExpiryParser:
     """
-    Fallback parser if Gemini fails.
-    Basic pattern matching for common cases.
+    Expiry phrase parsing, deterministic grammar first.
+
+    A phrase the grammar in ``utils.expiry_grammar`` reads with at least
+    ``min_confidence`` is answered locally in microseconds. Anything less
+    certain is looked up in the parse cache, and only then goes to
+    Gemini, whose answer is cached as relative rules. If Gemini is
+    unavailable, answers with something unusable or misses the deadline,
+    the grammar's best reading is used, which is the 7-day default when
+    it recognized nothing.
+
+    Concurrent requests for the same normalized phrase share one cache
+    lookup and LLM call: the first starts it, the rest wait for its
+    result (singleflight).
+
+    Each LLM call has ``deadline_ms`` in total. When it is still running
+    after the ``hedge_percentile`` latency of recent calls, an identical
+    second request is sent and whichever answers first is used; the
+    other is cancelled. Every request is logged with its outcome:
+    grammar, cache, llm, hedge or fallback (and coalesced when it shared
+    another request's call).
     """
-    text = expiry_text.lower()
-    
-    # Click-based expiry
-    if 'click' in text:
-        import re
-        click_match = re.search(r'(\d+)\s*click', text)
-        clicks = int(click_match.group(1)) if click_match else 3
-        return {
-            "type": "clicks",
-            "clickLimit": clicks,
-            "timeLimit": None,
-            "summary": f"Expires after {clicks} clicks"
-        }
-    
-    # Time-based expiry
-    if 'min' in text or 'minute' in text or 'minutes' in text:
-        import re
-        minute_match = re.search(r'(\d+)\s*(min|mins|minute|minutes)', text)
-        minutes = int(minute_match.group(1)) if minute_match else 1
-        expiry_time = datetime.utcnow() + timedelta(minutes=minutes)
-        return {
-            "type": "time",
-            "clickLimit": None,
-            "timeLimit": expiry_time.isoformat() + 'Z',
-            "summary": f"Expires in {minutes} minute{'s' if minutes != 1 else ''}"
-        }
-    if 'hour' in text:
-        import re
-        hour_match = re.search(r'(\d+)\s*hour', text)
-        hours = int(hour_match.group(1)) if hour_match else 24
-        expiry_time = datetime.utcnow() + timedelta(hours=hours)
-        return {
-            "type": "time",
-            "clickLimit": None,
-            "timeLimit": expiry_time.isoformat() + 'Z',
-            "summary": f"Expires in {hours} hours"
-        }
-    
-    if 'day' in text:
-        import re
-        day_match = re.search(r'(\d+)\s*day', text)
-        days = int(day_match.group(1)) if day_match else 1
-        expiry_time = datetime.utcnow() + timedelta(days=days)
+
+    def __init__(
+        self,
+        min_confidence: float = EXPIRY_PARSER_MIN_CONFIDENCE,
+        cache: ExpiryParseCache = expiry_parse_cache,
+        llm: Optional[Callable[[str, datetime], Awaitable[dict]]] = None,
+        deadline_ms: float = EXPIRY_LLM_DEADLINE_MS,
+        hedge_percentile: float = EXPIRY_LLM_HEDGE_PERCENTILE
+    ):
+        self.min_confidence = min_confidence
+        self.cache = cache
+        # (expiry_text, now) -> parsed expiry dict; raises on failure
+        self.llm = llm or gemini_client.ask
+        self.deadline = deadline_ms / 1000
+        self.hedge_percentile = hedge_percentile
+        self._latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.grammar_parses = 0
+        self.coalesced_parses = 0
+        self.cache_parses = 0
+        self.llm_parses = 0
+        self.hedged_parses = 0
+        self.hedges_sent = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+
+    def start(self, db: Optional[AsyncIOMotorDatabase]) -> None:
+        """Attach the shared parse cache tier and warm the cache."""
+        self.cache.start(db, self.min_confidence)
+
+    async def stop(self) -> None:
+        await self.cache.stop()
+
+    async def parse(self, expiry_text: str) -> dict:
+        """
+        Parse natural language expiry text.
+
+        Args:
+            expiry_text: Natural language description of expiry rules
+
+        Returns:
+            Dictionary with parsed expiry rules
+        """
+        started = time.perf_counter()
+        parsed = parse_expiry_text(expiry_text)
+        if parsed.confidence >= self.min_confidence:
+            self.grammar_parses += 1
+            result, outcome = parsed.to_expiry(), "grammar"
+        else:
+            key = normalize_expiry_text(expiry_text)
+            shared = self._in_flight.get(key)
+            if shared is None:
+                shared = asyncio.get_running_loop().create_task(self._resolve(expiry_text, parsed))
+                self._in_flight[key] = shared
+                shared.add_done_callback(lambda task: self._landed(key, task))
+                coalesced = ""
+            else:
+                self.coalesced_parses += 1
+                coalesced = " (coalesced)"
+            # A caller that gives up must not cancel the call the others wait on
+            result, outcome = await asyncio.shield(shared)
+            result, outcome = dict(result), outcome + coalesced
+        logger.info(f"Expiry parse of {expiry_text!r}: {outcome} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return result
+
+    def _landed(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def _resolve(self, expiry_text: str, parsed: ParsedExpiry) -> Tuple[dict, str]:
+        cached = await self.cache.get(expiry_text)
+        if cached is not None:
+            self.cache_parses += 1
+            return cached.to_expiry(), "cache"
+
+        now = datetime.utcnow()
+        try:
+            result, outcome = await self._ask_within_deadline(expiry_text, now)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini missed the {self.deadline * 1000:.0f} ms expiry parse deadline")
+            self.timeouts += 1
+            self.fallbacks += 1
+            return parsed.to_expiry(), "fallback"
+        except Exception as e:
+            logger.error(f"Error parsing expiry with Gemini: {e}")
+            self.fallbacks += 1
+            return parsed.to_expiry(), "fallback"
+        if outcome == "hedge":
+            self.hedged_parses += 1
+        else:
+            self.llm_parses += 1
+        relative = parsed_from_expiry(expiry_text, result, now)
+        if relative is not None:
+            self.cache.put(expiry_text, relative)
+        return result, outcome
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call gets a hedged twin, or None while hedging is off or uncalibrated."""
+        if not self.hedge_percentile or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        delay = latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))]
+        return delay if delay < self.deadline else None
+
+    async def _ask_within_deadline(self, expiry_text: str, now: datetime) -> Tuple[dict, str]:
+        """
+        Ask the LLM, hedging a slow call, within the deadline.
+
+        Returns:
+            (result, "llm" or "hedge" for whichever call answered)
+
+        Raises:
+            asyncio.TimeoutError: If no call answered within the deadline
+            Exception: The last call's error if every call failed
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.deadline
+        hedge_at = self.hedge_delay()
+        hedge_at = started + hedge_at if hedge_at is not None else None
+        calls = {loop.create_task(self.llm(expiry_text, now)): ("llm", started)}
+        error: Optional[BaseException] = None
+        try:
+            while calls:
+                wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, _ = await asyncio.wait(calls, timeout=max(0.0, wake - loop.time()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    outcome, call_started = calls.pop(call)
+                    if call.exception() is None:
+                        self._latencies.append(loop.time() - call_started)
+                        return call.result(), outcome
+                    error = call.exception()
+                if done:
+                    continue
+                if loop.time() >= deadline:
+                    # Censored at the deadline, so slow periods still raise the percentile
+                    self._latencies.append(self.deadline)
+                    raise asyncio.TimeoutError()
+                calls[loop.create_task(self.llm(expiry_text, now))] = ("hedge", loop.time())
+                self.hedges_sent += 1
+                hedge_at = None
+            raise error
+        finally:
+            for call in calls:
+                call.cancel()
+
+    def stats(self) -> dict:
+        total = self.grammar_parses + self.coalesced_parses + self.cache_parses + self.llm_parses \
+            + self.hedged_parses + self.fallbacks
+        latencies = sorted(self._latencies)
+        hedge_delay = self.hedge_delay()
         return {
-            "type": "time",
-            "clickLimit": None,
-            "timeLimit": expiry_time.isoformat() + 'Z',
-            "summary": f"Expires in {days} days"
+            "minConfidence": self.min_confidence,
+            "deadlineMs": self.deadline * 1000,
+            "hedgePercentile": self.hedge_percentile,
+            "hedgeDelayMs": hedge_delay * 1000 if hedge_delay is not None else None,
+            "llmP50Ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+            "inFlight": len(self._in_flight),
+            "grammarParses": self.grammar_parses,
+            # Requests that joined an identical parse in flight: LLM calls saved
+            "coalescedParses": self.coalesced_parses,
+            "cacheParses": self.cache_parses,
+            "llmParses": self.llm_parses,
+            # Parses answered by the hedged second request
+            "hedgedParses": self.hedged_parses,
+            "hedgesSent": self.hedges_sent,
+            "fallbacks": self.fallbacks,
+            "timeouts": self.timeouts,
+            "grammarRate": self.grammar_parses / total if total else 0.0
         }
+
+
+expiry_parser = ExpiryParser()
+
+
+async def parse_expiry_with_gemini(expiry_text: str) -> dict:
+    """
+    Parse natural language expiry text, asking Gemini AI only for phrases
+    the grammar can't read confidently.
     
-    if 'tomorrow' in text:
-        expiry_time = datetime.utcnow() + timedelta(days=1)
-        expiry_time = expiry_time.replace(hour=23, minute=59, second=59)
-        return {
-            "type": "time",
-            "clickLimit": None,
-            "timeLimit": expiry_time.isoformat() + 'Z',
-            "summary": "Expires tomorrow at 11:59 PM"
-        }
+    Args:
+        expiry_text: Natural language description of expiry rules
     
-    # Default: 7 days
-    expiry_time = datetime.utcnow() + timedelta(days=7)
-    return {
-        "type": "time",
-        "clickLimit": None,
-        "timeLimit": expiry_time.isoformat() + 'Z',
-        "summary": "Expires in 7 days"
-    }
+    Returns:
+        Dictionary with parsed expiry rules
+    """
+    return await expiry_parser.parse(expiry_text)
@@ -0,0 +1,146 @@
+import os
+import time
+import logging
+from typing import Callable, Optional, Tuple, Type
+from dotenv import load_dotenv
+from pymongo.errors import ConnectionFailure
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGO_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('MONGO_BREAKER_FAILURE_THRESHOLD', '5'))
+MONGO_BREAKER_RESET_SECONDS = float(os.environ.get('MONGO_BREAKER_RESET_SECONDS', '10'))
+MONGO_BREAKER_HALF_OPEN_PROBES = int(os.environ.get('MONGO_BREAKER_HALF_OPEN_PROBES', '1'))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for an async dependency.
+
+    Used as ``async with breaker: await call()``. After ``failure_threshold``
+    consecutive failures the breaker opens and every call raises
+    ``CircuitOpenError`` immediately. After ``reset_seconds`` it turns
+    half-open and lets ``half_open_probes`` concurrent calls through: a
+    success closes it again, a failure re-opens it for another period.
+
+    Only exceptions in ``failure_types`` (connection-level errors by
+    default) count as failures; query errors such as a duplicate key
+    mean the dependency is up.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = MONGO_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = MONGO_BREAKER_RESET_SECONDS,
+        half_open_probes: int = MONGO_BREAKER_HALF_OPEN_PROBES,
+        failure_types: Tuple[Type[BaseException], ...] = (ConnectionFailure,),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        # A threshold of 0 disables the breaker
+        self.enabled = failure_threshold > 0
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.failure_types = failure_types
+        self.clock = clock
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.half_opened = 0
+        self.closed = 0
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; claims a probe slot when half-open."""
+        if not self.enabled or self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if self.clock() - self._opened_at < self.reset_seconds:
+                return False
+            self._transition(HALF_OPEN)
+            self.half_opened += 1
+        if self._probes >= self.half_open_probes:
+            return False
+        self._probes += 1
+        return True
+
+    def record_success(self) -> None:
+        self.successes += 1
+        self._consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            self._probes = 0
+            self._transition(CLOSED)
+            self.closed += 1
+
+    def record_failure(self, error: BaseException) -> None:
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self._consecutive_failures += 1
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self._consecutive_failures >= self.failure_threshold
+        ):
+            self._probes = 0
+            self._opened_at = self.clock()
+            self._transition(OPEN)
+            self.opened += 1
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+
+    async def __aenter__(self) -> "CircuitBreaker":
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if not self.enabled:
+            return False
+        if exc is None:
+            self.record_success()
+        elif isinstance(exc, self.failure_types):
+            self.record_failure(exc)
+        elif self.state == HALF_OPEN:
+            if isinstance(exc, Exception):
+                # The probe reached the dependency and got a query error back
+                self.record_success()
+            else:
+                # Cancelled before an answer; free the slot for another probe
+                self._probes = max(0, self._probes - 1)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "consecutiveFailures": self._consecutive_failures,
+            "failureThreshold": self.failure_threshold,
+            "resetSeconds": self.reset_seconds,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "halfOpened": self.half_opened,
+            "closed": self.closed,
+            "lastError": self.last_error
+        }
+
+
+mongo_breaker = CircuitBreaker("mongo")
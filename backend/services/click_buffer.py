@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CLICK_WRITE_BEHIND = os.environ.get('CLICK_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+CLICK_FLUSH_INTERVAL_SECONDS = float(os.environ.get('CLICK_FLUSH_INTERVAL_SECONDS', '1.0'))
+CLICK_FLUSH_MAX_PENDING = int(os.environ.get('CLICK_FLUSH_MAX_PENDING', '1000'))
+
+
+class ClickBuffer:
+    """
+    Write-behind accumulator for click increments.
+
+    Clicks are summed per short code in memory and handed to a flush
+    coroutine every ``flush_interval`` seconds, or sooner once
+    ``max_pending`` clicks are waiting. Only links whose click count never
+    affects the redirect decision (no click limit) may be buffered.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = CLICK_WRITE_BEHIND,
+        flush_interval: float = CLICK_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = CLICK_FLUSH_MAX_PENDING
+    ):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, int] = {}
+        self._pending_clicks = 0
+        self._flush: Optional[Callable[[], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self.buffered_clicks = 0
+        self.flushes = 0
+        self.flushed_clicks = 0
+        self.failed_flushes = 0
+
+    @property
+    def accepting(self) -> bool:
+        """True while the flush loop is running and clicks may be buffered."""
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def add(self, short_code: str, clicks: int = 1) -> None:
+        """Buffer clicks for a short code, waking the flusher past the size threshold."""
+        self._pending[short_code] = self._pending.get(short_code, 0) + clicks
+        self._pending_clicks += clicks
+        self.buffered_clicks += clicks
+        if self._pending_clicks >= self.max_pending:
+            self._wake.set()
+
+    def pending(self, short_code: str) -> int:
+        """Clicks buffered for a short code but not yet flushed."""
+        return self._pending.get(short_code, 0)
+
+    def drain(self) -> Dict[str, int]:
+        """Take all pending increments, leaving the buffer empty."""
+        drained, self._pending = self._pending, {}
+        self._pending_clicks = 0
+        return drained
+
+    def restore(self, increments: Dict[str, int]) -> None:
+        """Put back increments from a failed flush so they are retried."""
+        for short_code, clicks in increments.items():
+            self._pending[short_code] = self._pending.get(short_code, 0) + clicks
+            self._pending_clicks += clicks
+
+    def record_flush(self, clicks: int) -> None:
+        self.flushes += 1
+        self.flushed_clicks += clicks
+
+    def start(self, flush: Callable[[], Awaitable[None]]) -> None:
+        """
+        Start the background flush loop if write-behind is enabled.
+
+        Args:
+            flush: Coroutine function that drains and persists the buffer
+        """
+        if not self.enabled or self.accepting:
+            return
+        self._flush = flush
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Click write-behind enabled (interval={self.flush_interval}s, max_pending={self.max_pending})"
+        )
+
+    async def stop(self) -> None:
+        """Stop the flush loop and drain whatever is still buffered."""
+        if self._task is not None:
+            # Not cancelled: a flush in flight holds drained increments that would be lost
+            self._stopping = True
+            self._wake.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+                self._stopping = False
+        if self._flush is not None and self._pending:
+            await self._flush_once()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending and not self._stopping:
+                await self._flush_once()
+
+    async def _flush_once(self) -> None:
+        try:
+            await self._flush()
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Error flushing buffered clicks: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.accepting,
+            "pendingCodes": len(self._pending),
+            "pendingClicks": self._pending_clicks,
+            "bufferedClicks": self.buffered_clicks,
+            "flushes": self.flushes,
+            "flushedClicks": self.flushed_clicks,
+            "failedFlushes": self.failed_flushes
+        }
+
+
+click_buffer = ClickBuffer()
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.bloom import BloomFilter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SHORT_CODE_BLOOM = os.environ.get('SHORT_CODE_BLOOM', 'false').lower() in ('1', 'true', 'yes')
+BLOOM_CAPACITY = int(os.environ.get('BLOOM_CAPACITY', '1000000'))
+BLOOM_ERROR_RATE = float(os.environ.get('BLOOM_ERROR_RATE', '0.001'))
+BLOOM_REFRESH_SECONDS = float(os.environ.get('BLOOM_REFRESH_SECONDS', '5'))
+
+
+class ShortCodeIndex:
+    """
+    In-process Bloom filter of every issued short code.
+
+    Built in bulk from the links collection at startup and updated on each
+    local create. Codes created by other processes are picked up by an
+    incremental refresh every ``refresh_seconds``, so a code issued on
+    another node may be reported missing here for up to that long.
+    Until the initial build succeeds every code is treated as possibly
+    present and callers fall back to the database.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SHORT_CODE_BLOOM,
+        capacity: int = BLOOM_CAPACITY,
+        error_rate: float = BLOOM_ERROR_RATE,
+        refresh_seconds: float = BLOOM_REFRESH_SECONDS
+    ):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.ready = False
+        self._filter = BloomFilter(capacity, error_rate)
+        self._added_during_build = None
+        self._refreshed_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.builds = 0
+        self.definite_misses = 0
+
+    def add(self, short_code: str) -> None:
+        self._filter.add(short_code)
+        if self._added_during_build is not None:
+            self._added_during_build.append(short_code)
+
+    def might_exist(self, short_code: str) -> bool:
+        """False only when the code was definitely never issued."""
+        if not self.ready:
+            return True
+        if short_code in self._filter:
+            return True
+        self.definite_misses += 1
+        return False
+
+    async def build(self, db: AsyncIOMotorDatabase) -> None:
+        """
+        Rebuild the filter from every shortCode in the links collection.
+        """
+        started_at = datetime.utcnow()
+        self._added_during_build = []
+        try:
+            total = await db.links.estimated_document_count()
+            bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+            async for doc in db.links.find({}, {"_id": 0, "shortCode": 1}).batch_size(10000):
+                bloom.add(doc['shortCode'])
+            # Codes created locally while the scan was running may not be in it
+            for short_code in self._added_during_build:
+                bloom.add(short_code)
+        finally:
+            self._added_during_build = None
+        self._filter = bloom
+        self._refreshed_at = started_at
+        self.capacity = bloom.capacity
+        self.ready = True
+        self.builds += 1
+        logger.info(f"Short code Bloom filter built with {bloom.count} codes ({bloom.memory_report()['bytes']} bytes)")
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> None:
+        """Add codes created by any process since the previous build or refresh."""
+        if self._filter.count > self.capacity:
+            await self.build(db)
+            return
+        started_at = datetime.utcnow()
+        # Overlap the window slightly to tolerate clock skew between nodes
+        since = self._refreshed_at - timedelta(seconds=1)
+        async for doc in db.links.find({"createdAt": {"$gte": since}}, {"_id": 0, "shortCode": 1}):
+            self._filter.add(doc['shortCode'])
+        self._refreshed_at = started_at
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        """Build the filter and keep it refreshed in a background task."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            try:
+                if self.ready:
+                    await self.refresh(db)
+                else:
+                    await self.build(db)
+            except Exception as e:
+                logger.error(f"Error maintaining short code Bloom filter: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "builds": self.builds,
+            "definiteMisses": self.definite_misses,
+            "memory": self._filter.memory_report()
+        }
+
+
+short_code_index = ShortCodeIndex()
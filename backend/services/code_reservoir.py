@@ -0,0 +1,308 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from utils.short_code import SHORT_CODE_GENERATOR, counter_codes, random_short_code, short_codes_filter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CODE_RESERVOIR = os.environ.get('CODE_RESERVOIR', 'false').lower() in ('1', 'true', 'yes')
+CODE_RESERVOIR_SIZE = int(os.environ.get('CODE_RESERVOIR_SIZE', '1000'))
+CODE_RESERVOIR_LOW_WATERMARK = int(os.environ.get('CODE_RESERVOIR_LOW_WATERMARK', '250'))
+CODE_RESERVOIR_BATCH = int(os.environ.get('CODE_RESERVOIR_BATCH', '500'))
+CODE_RESERVOIR_LEASE_SECONDS = float(os.environ.get('CODE_RESERVOIR_LEASE_SECONDS', '600'))
+CODE_RESERVOIR_RETRY_SECONDS = 5
+CODE_RESERVOIR_MAX_RETRY_SECONDS = 60
+# Refill batches tried per pass, as a multiple of the batches needed to fill the pool
+CODE_RESERVOIR_REFILL_ATTEMPTS_FACTOR = 2
+
+
+class CodeReservoir:
+    """
+    Per-process pool of short codes that are already known to be unused
+    and reserved for this process, so ``create_link`` can take one in O(1).
+
+    A background task refills the pool in batches of codes from the
+    configured ``SHORT_CODE_GENERATOR``. Each batch costs one ``$in``
+    query against ``links`` plus one ``insert_many`` into
+    ``code_reservations``, whose ``_id`` uniqueness keeps two processes
+    from reserving the same code. Reservations carry a lease that the
+    owning process keeps extending; after a crash, the lease lapses and
+    the next refill pass of any process adopts the orphaned codes,
+    dropping those that already became links. A clean shutdown releases
+    unused codes immediately.
+
+    A popped code keeps its reservation until its link is in MongoDB:
+    ``mark_used`` drops it, ``release`` returns the code to the pool
+    when the insert failed, and ``mark_pending`` keeps the lease while
+    the link only lives in the outage fallback.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = CODE_RESERVOIR,
+        size: int = CODE_RESERVOIR_SIZE,
+        low_watermark: int = CODE_RESERVOIR_LOW_WATERMARK,
+        batch_size: int = CODE_RESERVOIR_BATCH,
+        lease_seconds: float = CODE_RESERVOIR_LEASE_SECONDS
+    ):
+        self.enabled = enabled
+        self.size = size
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.owner = str(uuid.uuid4())
+        self._codes = deque()
+        self._used = []
+        # Popped codes whose reservation must be kept, and those of them stored outside MongoDB
+        self._held = set()
+        self._pending = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.low_watermark_events = 0
+        self.refills = 0
+        self.reserved = 0
+        self.adopted = 0
+        self.last_refill_ms = 0.0
+        self.total_refill_ms = 0.0
+
+    def pop(self) -> Optional[str]:
+        """Take a reserved code, or None if the pool is empty."""
+        if not self._codes:
+            self.misses += 1
+            if self.accepting:
+                self._wake.set()
+            return None
+        short_code = self._codes.popleft()
+        self._held.add(short_code)
+        self.hits += 1
+        if len(self._codes) < self.low_watermark:
+            self.low_watermark_events += 1
+            self._wake.set()
+        return short_code
+
+    def mark_used(self, short_code: str) -> None:
+        """Record that a popped code is now stored as a link; its reservation is dropped on the next refill."""
+        self._held.discard(short_code)
+        self._pending.discard(short_code)
+        self._used.append(short_code)
+
+    def mark_pending(self, short_code: str) -> None:
+        """Record that a popped code's link is stored outside MongoDB; the lease is kept until it is written back."""
+        self._pending.add(short_code)
+
+    def release(self, short_code: str) -> None:
+        """Return a popped code whose link could not be stored; it is still reserved."""
+        self._held.discard(short_code)
+        self._codes.appendleft(short_code)
+
+    async def is_reserved(self, db: AsyncIOMotorDatabase, short_code: str) -> bool:
+        """Whether any process holds a reservation for a code, for codes generated outside the pool."""
+        return await db.code_reservations.find_one({"_id": short_code}, {"_id": 1}) is not None
+
+    @property
+    def accepting(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def adopt_orphans(self, db: AsyncIOMotorDatabase) -> None:
+        """
+        Claim reservations whose lease lapsed and return the unused ones to the pool.
+        """
+        now = datetime.utcnow()
+        lapsed = [
+            doc['_id'] async for doc in db.code_reservations.find(
+                {"leaseUntil": {"$lt": now}}, {"_id": 1}
+            ).limit(self.batch_size)
+            if doc['_id'] not in self._held
+        ]
+        if not lapsed:
+            return
+        # Conditional on the lease, so only one process wins each code
+        await db.code_reservations.update_many(
+            {"_id": {"$in": lapsed}, "leaseUntil": {"$lt": now}},
+            {"$set": {"owner": self.owner, "leaseUntil": self._lease_until()}}
+        )
+        claimed = [
+            doc['_id'] async for doc in db.code_reservations.find(
+                {"_id": {"$in": lapsed}, "owner": self.owner}, {"_id": 1}
+            )
+            if doc['_id'] not in self._codes
+        ]
+        if not claimed:
+            return
+        issued = {
+            doc['shortCode'] async for doc in db.links.find(
+                short_codes_filter(claimed), {"_id": 0, "shortCode": 1}
+            )
+        }
+        if issued:
+            await db.code_reservations.delete_many({"_id": {"$in": list(issued)}})
+        unused = [code for code in claimed if code not in issued]
+        self._codes.extend(unused)
+        self.adopted += len(unused)
+        logger.info(f"Adopted {len(unused)} reserved short codes ({len(issued)} already issued)")
+
+    async def _candidates(self, db: AsyncIOMotorDatabase) -> List[str]:
+        """One batch of codes from the configured generator."""
+        if SHORT_CODE_GENERATOR == 'counter':
+            try:
+                return [await counter_codes.next_code(db) for _ in range(self.batch_size)]
+            except Exception as e:
+                logger.warning(f"Counter short codes unavailable, reserving random codes: {e}")
+        return list({random_short_code() for _ in range(self.batch_size)})
+
+    async def refill(self, db: AsyncIOMotorDatabase) -> int:
+        """
+        Reserve one batch of fresh codes.
+
+        Returns:
+            Number of codes added to the pool
+        """
+        started = time.perf_counter()
+        candidates = await self._candidates(db)
+        existing = {
+            doc['shortCode'] async for doc in db.links.find(
+                short_codes_filter(candidates), {"_id": 0, "shortCode": 1}
+            )
+        }
+        now = datetime.utcnow()
+        docs = [
+            {"_id": code, "owner": self.owner, "reservedAt": now, "leaseUntil": self._lease_until()}
+            for code in candidates if code not in existing
+        ]
+        taken = set()
+        if docs:
+            try:
+                await db.code_reservations.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Codes already reserved by another process
+                taken = {docs[error['index']]['_id'] for error in e.details.get('writeErrors', [])}
+        fresh = [doc['_id'] for doc in docs if doc['_id'] not in taken]
+        self._codes.extend(fresh)
+
+        self.refills += 1
+        self.reserved += len(fresh)
+        self.last_refill_ms = (time.perf_counter() - started) * 1000
+        self.total_refill_ms += self.last_refill_ms
+        return len(fresh)
+
+    async def _maintain(self, db: AsyncIOMotorDatabase) -> bool:
+        """
+        One maintenance pass: drop used reservations, renew leases, adopt
+        orphans and refill, with a bounded number of refill batches.
+
+        Returns:
+            False if the pool needed codes and no batch reserved any
+        """
+        if self._pending:
+            written = {
+                doc['shortCode'] async for doc in db.links.find(
+                    short_codes_filter(self._pending), {"_id": 0, "shortCode": 1}
+                )
+            }
+            for short_code in written:
+                self.mark_used(short_code)
+        if self._used:
+            used, self._used = self._used, []
+            await db.code_reservations.delete_many({"_id": {"$in": used}})
+        await db.code_reservations.update_many(
+            {"owner": self.owner}, {"$set": {"leaseUntil": self._lease_until()}}
+        )
+        try:
+            await self.adopt_orphans(db)
+        except Exception as e:
+            logger.error(f"Error adopting reserved short codes: {e}")
+        missing = self.size - len(self._codes)
+        if missing <= 0:
+            return True
+        attempts = CODE_RESERVOIR_REFILL_ATTEMPTS_FACTOR * -(-missing // self.batch_size)
+        reserved = 0
+        for _ in range(attempts):
+            if len(self._codes) >= self.size:
+                break
+            reserved += await self.refill(db)
+        if len(self._codes) < self.size:
+            logger.warning(f"Short code reservoir at {len(self._codes)}/{self.size} after {attempts} refill batches")
+        return reserved > 0
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        retry_seconds = CODE_RESERVOIR_RETRY_SECONDS
+        while True:
+            try:
+                progressed = await self._maintain(db)
+            except Exception as e:
+                logger.error(f"Error refilling short code reservoir: {e}")
+                progressed = False
+            if progressed:
+                retry_seconds = CODE_RESERVOIR_RETRY_SECONDS
+            else:
+                # Back off instead of retrying against MongoDB on every pop
+                await asyncio.sleep(retry_seconds)
+                retry_seconds = min(retry_seconds * 2, CODE_RESERVOIR_MAX_RETRY_SECONDS)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.lease_seconds / 3)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self.enabled and self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self, db: AsyncIOMotorDatabase) -> None:
+        """Stop refilling and hand unused reservations back for immediate adoption."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            if self._used:
+                await db.code_reservations.delete_many({"_id": {"$in": self._used}})
+                self._used = []
+            # Codes of links not yet in MongoDB stay leased until the lease runs out
+            await db.code_reservations.update_many(
+                {"owner": self.owner, "_id": {"$nin": list(self._pending)}}, {"$set": {"leaseUntil": datetime.utcnow()}}
+            )
+            self._codes.clear()
+        except Exception as e:
+            logger.error(f"Error releasing reserved short codes: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "available": len(self._codes),
+            "size": self.size,
+            "lowWatermark": self.low_watermark,
+            "belowLowWatermark": len(self._codes) < self.low_watermark,
+            "lowWatermarkEvents": self.low_watermark_events,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refills": self.refills,
+            "reserved": self.reserved,
+            "adopted": self.adopted,
+            "pendingDurable": len(self._pending),
+            "lastRefillMs": self.last_refill_ms,
+            "avgRefillMs": self.total_refill_ms / self.refills if self.refills else 0.0
+        }
+
+
+code_reservoir = CodeReservoir()
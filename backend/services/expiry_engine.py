@@ -0,0 +1,208 @@
+"""
+Compiled expiry rules shared by the lookup, click and stats paths.
+
+A link's rules are compiled once into a ``CompiledExpiry`` and cached by
+short code until the rule inputs change. Every path asks the same
+question, "is this link expired with ``clicks`` clicks at time ``now``",
+so a link with ``clickLimit`` N serves exactly N redirects everywhere.
+
+New rule types subclass ``ExpiryRule`` and are added with
+``register_rule``; call sites and the MongoDB click filter pick them up
+without changes.
+"""
+import os
+import inspect
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Type
+from dotenv import load_dotenv
+from utils.expiry_fields import link_expires_at, link_click_limit
+
+load_dotenv()
+
+EXPIRY_ENGINE_CACHE_SIZE = int(os.environ.get('EXPIRY_ENGINE_CACHE_SIZE', '10000'))
+
+
+class ExpiryRule(ABC):
+    """
+    One compiled expiry condition.
+
+    Subclasses implement ``compile`` (return None when the link has no
+    such rule), ``is_expired`` and ``clickable_clause``, and list the link
+    fields they read in ``fingerprint_fields`` so cached compilations are
+    dropped when those fields change.
+    """
+
+    __slots__ = ()
+
+    fingerprint_fields: tuple = ()
+    depends_on_clicks: bool = False
+
+    @classmethod
+    @abstractmethod
+    def compile(cls, link: dict) -> Optional['ExpiryRule']:
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_expired(self, clicks: int, now: float) -> bool:
+        raise NotImplementedError
+
+    def seconds_left(self, now: float) -> Optional[float]:
+        """Seconds until the rule expires by time alone, or None if it never does."""
+        return None
+
+    @staticmethod
+    @abstractmethod
+    def clickable_clause(now: float) -> dict:
+        """MongoDB filter clause matching links this rule still allows a click on."""
+        raise NotImplementedError
+
+
+class ClickLimitRule(ExpiryRule):
+    """Expired once ``clicks`` reaches ``clickLimit``."""
+
+    __slots__ = ('limit',)
+
+    fingerprint_fields = ('clickLimit',)
+    depends_on_clicks = True
+
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    @classmethod
+    def compile(cls, link: dict) -> Optional['ClickLimitRule']:
+        limit = link_click_limit(link)
+        return cls(limit) if limit is not None else None
+
+    def is_expired(self, clicks: int, now: float) -> bool:
+        return clicks >= self.limit
+
+    @staticmethod
+    def clickable_clause(now: float) -> dict:
+        return {"$or": [
+            {"clickLimit": {"$type": "null"}},
+            {"$expr": {"$lt": ["$clicks", "$clickLimit"]}},
+            # Documents written before clickLimit was precomputed
+            {"expiresAtEpoch": {"$exists": False}, "$or": [
+                {"expiryRules.clickLimit": None},
+                {"$expr": {"$lt": ["$clicks", "$expiryRules.clickLimit"]}}
+            ]}
+        ]}
+
+
+class TimeLimitRule(ExpiryRule):
+    """Expired once the current time reaches ``expiresAtEpoch``."""
+
+    __slots__ = ('expires_at',)
+
+    fingerprint_fields = ('expiresAtEpoch',)
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def compile(cls, link: dict) -> Optional['TimeLimitRule']:
+        expires_at = link_expires_at(link)
+        return cls(expires_at) if expires_at is not None else None
+
+    def is_expired(self, clicks: int, now: float) -> bool:
+        return now >= self.expires_at
+
+    def seconds_left(self, now: float) -> Optional[float]:
+        return self.expires_at - now
+
+    @staticmethod
+    def clickable_clause(now: float) -> dict:
+        return {"$or": [
+            {"expiresAtEpoch": {"$type": "null"}},
+            {"expiresAtEpoch": {"$gt": now}},
+            # Documents written before expiresAtEpoch was precomputed
+            {"expiresAtEpoch": {"$exists": False}, "$or": [
+                {"expiryRules.timeLimit": None},
+                {"expiryRules.timeLimit": {"$gt": datetime.fromtimestamp(now, timezone.utc)}}
+            ]}
+        ]}
+
+
+RULE_TYPES: List[Type[ExpiryRule]] = [ClickLimitRule, TimeLimitRule]
+_FINGERPRINT_FIELDS = tuple(field for rule in RULE_TYPES for field in rule.fingerprint_fields)
+
+
+def register_rule(rule_type: Type[ExpiryRule]) -> Type[ExpiryRule]:
+    """Add a rule type to every compilation and click filter; usable as a decorator."""
+    global _FINGERPRINT_FIELDS
+    if inspect.isabstract(rule_type):
+        raise TypeError(f"{rule_type.__name__} does not implement {', '.join(sorted(rule_type.__abstractmethods__))}")
+    RULE_TYPES.append(rule_type)
+    _FINGERPRINT_FIELDS = tuple(field for rule in RULE_TYPES for field in rule.fingerprint_fields)
+    _compiled_cache.clear()
+    return rule_type
+
+
+class CompiledExpiry:
+    """The compiled rules of one link."""
+
+    __slots__ = ('rules', 'depends_on_clicks')
+
+    def __init__(self, rules: List[ExpiryRule]):
+        self.rules = tuple(rules)
+        self.depends_on_clicks = any(rule.depends_on_clicks for rule in rules)
+
+    def is_expired(self, clicks: int, now: float) -> bool:
+        for rule in self.rules:
+            if rule.is_expired(clicks, now):
+                return True
+        return False
+
+    def seconds_left(self, now: float) -> Optional[float]:
+        """Seconds until the link expires by time, or None if no rule is time-based."""
+        bounds = [left for left in (rule.seconds_left(now) for rule in self.rules) if left is not None]
+        return min(bounds) if bounds else None
+
+
+_compiled_cache = OrderedDict()  # shortCode -> (fingerprint, CompiledExpiry)
+
+
+def compile_expiry(link: dict) -> CompiledExpiry:
+    """
+    Return the compiled rules for a link, reusing the cached compilation
+    while the link's rule inputs are unchanged.
+
+    Args:
+        link: Link document
+
+    Returns:
+        CompiledExpiry for the link
+    """
+    short_code = link.get('shortCode')
+    if short_code is None or 'expiresAtEpoch' not in link:
+        # Unmigrated documents derive their inputs from expiryRules
+        return _compile(link)
+
+    fingerprint = tuple(map(link.get, _FINGERPRINT_FIELDS))
+    entry = _compiled_cache.get(short_code)
+    if entry is not None and entry[0] == fingerprint:
+        _compiled_cache.move_to_end(short_code)
+        return entry[1]
+
+    compiled = _compile(link)
+    _compiled_cache[short_code] = (fingerprint, compiled)
+    _compiled_cache.move_to_end(short_code)
+    if len(_compiled_cache) > EXPIRY_ENGINE_CACHE_SIZE:
+        _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def _compile(link: dict) -> CompiledExpiry:
+    rules = []
+    for rule_type in RULE_TYPES:
+        rule = rule_type.compile(link)
+        if rule is not None:
+            rules.append(rule)
+    return CompiledExpiry(rules)
+
+
+def clickable_clauses(now: float) -> List[dict]:
+    """MongoDB clauses that together match links every rule still allows a click on."""
+    return [rule_type.clickable_clause(now) for rule_type in RULE_TYPES]
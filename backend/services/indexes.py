@@ -0,0 +1,184 @@
+"""
+Declared indexes for the links collection and a query-shape audit.
+
+Every index lists the ``link_service`` (or helper) queries it serves.
+``ensure_link_indexes`` builds them at startup; the audit explains each
+query shape and reports any that would fall back to a collection scan:
+
+    python -m services.indexes --check
+"""
+import os
+import sys
+import uuid
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+from utils.short_code import short_code_filter, short_codes_filter, link_id_filter
+from services.link_store import clickable_filter, due_links_filter, click_refused_filter
+from services.reconciler import reconcile_filter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "off": build indexes only; "warn": also log unindexed query shapes;
+# "strict": refuse to start while any query shape is unindexed
+LINK_INDEX_AUDIT = os.environ.get('LINK_INDEX_AUDIT', 'off').lower()
+
+
+class IndexSpec(NamedTuple):
+    """An index on ``links`` and the query shapes it exists for."""
+    name: str
+    keys: list
+    options: dict
+    serves: tuple
+
+
+LINK_INDEXES: List[IndexSpec] = [
+    IndexSpec(
+        "shortCode_unique", [("shortCode", ASCENDING)], {"unique": True},
+        serves=(
+            "get_link_by_short_code", "track_click", "track_click.expire",
+            "flush_click_buffer", "generate_unique_short_code", "code_reservoir.$in",
+            "read_batcher.$in", "click_batcher.refused", "reconciler.upsert"
+        )
+    ),
+    IndexSpec(
+        "id_unique", [("id", ASCENDING)], {"unique": True},
+        serves=("get_link_stats", "reconciler.$in")
+    ),
+    IndexSpec(
+        "shortCodeKey_unique", [("shortCodeKey", ASCENDING)],
+        {"unique": True, "partialFilterExpression": {"shortCodeKey": {"$exists": True}}},
+        serves=(
+            "get_link_by_short_code", "track_click", "code_reservoir.$in", "read_batcher.$in",
+            "click_batcher.refused"
+        )
+    ),
+    IndexSpec(
+        "idKey_unique", [("idKey", ASCENDING)],
+        {"unique": True, "partialFilterExpression": {"idKey": {"$exists": True}}},
+        serves=("get_link_stats",)
+    ),
+    IndexSpec(
+        "active_expiresAtEpoch", [("status", ASCENDING), ("expiresAtEpoch", ASCENDING)],
+        {"partialFilterExpression": {"status": "active"}},
+        serves=("expire_due_links",)
+    ),
+    IndexSpec(
+        "createdAt", [("createdAt", ASCENDING)], {},
+        serves=("code_index.refresh", "parse_cache.warm")
+    ),
+]
+
+SAMPLE_SHORT_CODE = "aB3xY9"
+SAMPLE_LINK_ID = str(uuid.UUID(int=0))
+
+# Representative filter for every query issued against links
+QUERY_SHAPES: Dict[str, Callable[[float], dict]] = {
+    "get_link_by_short_code": lambda now: short_code_filter(SAMPLE_SHORT_CODE),
+    "track_click": lambda now: clickable_filter(SAMPLE_SHORT_CODE, now),
+    "track_click.expire": lambda now: short_code_filter(SAMPLE_SHORT_CODE),
+    "flush_click_buffer": lambda now: short_code_filter(SAMPLE_SHORT_CODE),
+    "generate_unique_short_code": lambda now: short_code_filter(SAMPLE_SHORT_CODE),
+    "code_reservoir.$in": lambda now: short_codes_filter([SAMPLE_SHORT_CODE, "Zz9Yy8"]),
+    "read_batcher.$in": lambda now: short_codes_filter([SAMPLE_SHORT_CODE, "Zz9Yy8"]),
+    "click_batcher.refused": lambda now: click_refused_filter(SAMPLE_SHORT_CODE, 2, "owner", 1),
+    "get_link_stats": lambda now: link_id_filter(SAMPLE_LINK_ID),
+    "expire_due_links": lambda now: due_links_filter(now),
+    "code_index.refresh": lambda now: {"createdAt": {"$gte": datetime.utcfromtimestamp(now)}},
+    "parse_cache.warm": lambda now: {"createdAt": {"$gte": datetime.utcfromtimestamp(now - 30 * 86400)}},
+    "reconciler.upsert": lambda now: reconcile_filter(SAMPLE_SHORT_CODE, SAMPLE_LINK_ID, "owner", 1),
+    "reconciler.$in": lambda now: {"id": {"$in": [SAMPLE_LINK_ID]}},
+}
+
+
+async def ensure_link_indexes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Create every declared index; existing ones are left as they are.
+
+    Failures (for example duplicate short codes blocking a unique index)
+    are logged per index so the remaining indexes still get built.
+    """
+    for spec in LINK_INDEXES:
+        try:
+            await db.links.create_index(spec.keys, name=spec.name, **spec.options)
+        except Exception as e:
+            logger.error(f"Could not create index {spec.name} (serves {', '.join(spec.serves)}): {e}")
+
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def audit_query_shapes(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """
+    Explain every query shape against the live collection.
+
+    Returns:
+        Mapping of query shape name to the stages of any plan that
+        scans the collection; empty when every shape is index-served
+    """
+    now = time.time()
+    failures = {}
+    for name, build_filter in QUERY_SHAPES.items():
+        explain = await db.links.find(build_filter(now)).explain()
+        stages = _plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+        if 'COLLSCAN' in stages or not any('IXSCAN' in stage or stage == 'IDHACK' for stage in stages):
+            failures[name] = stages
+    for name in QUERY_SHAPES:
+        if not any(name in spec.serves for spec in LINK_INDEXES):
+            failures.setdefault(name, ['NO_DECLARED_INDEX'])
+    return failures
+
+
+async def bootstrap_link_indexes(db: AsyncIOMotorDatabase, audit: str = LINK_INDEX_AUDIT) -> None:
+    """
+    Startup step: build indexes, then audit query shapes per ``LINK_INDEX_AUDIT``.
+
+    Raises:
+        RuntimeError: In strict mode, when a query shape is not index-served
+    """
+    await ensure_link_indexes(db)
+    if audit not in ('warn', 'strict'):
+        return
+    failures = await audit_query_shapes(db)
+    for name, stages in failures.items():
+        logger.warning(f"Query shape {name} is not index-served: {stages}")
+    if failures and audit == 'strict':
+        raise RuntimeError(f"Unindexed query shapes: {', '.join(failures)}")
+
+
+async def main() -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        if '--check' not in sys.argv:
+            await ensure_link_indexes(db)
+        failures = await audit_query_shapes(db)
+    finally:
+        client.close()
+    for name in QUERY_SHAPES:
+        print(f"{'FAIL' if name in failures else 'ok  '} {name} {failures.get(name, '')}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,170 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+from services.expiry_engine import compile_expiry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LINK_CACHE_MAX_ENTRIES = int(os.environ.get('LINK_CACHE_MAX_ENTRIES', '10000'))
+LINK_CACHE_TTL_SECONDS = float(os.environ.get('LINK_CACHE_TTL_SECONDS', '30'))
+MISS_CACHE_MAX_ENTRIES = int(os.environ.get('MISS_CACHE_MAX_ENTRIES', '50000'))
+MISS_CACHE_TTL_SECONDS = float(os.environ.get('MISS_CACHE_TTL_SECONDS', '60'))
+
+
+class LinkCache:
+    """
+    Bounded in-process cache of resolved links keyed by short code.
+
+    Entries are evicted least-recently-used first once ``max_entries`` is
+    reached. Each entry lives for ``ttl_seconds`` at most, and never past
+    the link's own ``timeLimit`` so an active entry cannot outlive the
+    moment the link expires. Set ``max_entries`` to 0 to disable caching.
+    """
+
+    def __init__(self, max_entries: int = LINK_CACHE_MAX_ENTRIES, ttl_seconds: float = LINK_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # shortCode -> (monotonic deadline, link)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, short_code: str) -> Optional[dict]:
+        """
+        Return the cached link for a short code, or None on a miss.
+
+        The returned dict is shared with the cache and must not be mutated.
+        """
+        entry = self._entries.get(short_code)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        deadline, link = entry
+        if time.monotonic() >= deadline:
+            del self._entries[short_code]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(short_code)
+        self.hits += 1
+        return link
+
+    def put(self, short_code: str, link: dict) -> None:
+        """
+        Cache a link document, replacing any existing entry for the code.
+        """
+        if self.max_entries <= 0:
+            return
+
+        ttl = self.ttl_seconds
+        if link.get('status') != 'expired':
+            seconds_left = compile_expiry(link).seconds_left(time.time())
+            if seconds_left is not None:
+                ttl = min(ttl, seconds_left)
+        if ttl <= 0:
+            self.invalidate(short_code)
+            return
+
+        cached = {key: value for key, value in link.items() if key != '_id'}
+        self._entries[short_code] = (time.monotonic() + ttl, cached)
+        self._entries.move_to_end(short_code)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def add_clicks(self, short_code: str, clicks: int) -> None:
+        """Apply persisted click increments to a cached entry without touching its TTL."""
+        entry = self._entries.get(short_code)
+        if entry is not None:
+            entry[1]['clicks'] = entry[1].get('clicks', 0) + clicks
+
+    def invalidate(self, short_code: str) -> None:
+        """Drop the entry for a short code if present."""
+        self._entries.pop(short_code, None)
+
+    def clear(self) -> None:
+        """Drop all entries; counters are kept."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return size and hit/miss/eviction counters for sizing the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hitRatio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class MissCache:
+    """
+    Bounded negative cache of short codes recently found not to exist.
+
+    Lets repeated lookups of unknown codes (typos, scanners, stale links)
+    answer without a database query. Entries expire after ``ttl_seconds``
+    and are dropped as soon as a link with that code is created here.
+    """
+
+    def __init__(self, max_entries: int = MISS_CACHE_MAX_ENTRIES, ttl_seconds: float = MISS_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # shortCode -> monotonic deadline
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, short_code: str) -> bool:
+        deadline = self._entries.get(short_code)
+        if deadline is None:
+            self.misses += 1
+            return False
+        if time.monotonic() >= deadline:
+            del self._entries[short_code]
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, short_code: str) -> None:
+        """Remember that a short code was looked up and not found."""
+        if self.max_entries <= 0:
+            return
+        self._entries[short_code] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(short_code)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, short_code: str) -> None:
+        self._entries.pop(short_code, None)
+
+    def clear(self) -> None:
+        """Drop all entries; counters are kept."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+link_cache = LinkCache()
+miss_cache = MissCache()
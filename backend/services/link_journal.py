@@ -0,0 +1,274 @@
+"""
+Append-only journal and snapshots for the in-memory link store.
+
+Every create, click, status change and delete is appended as a framed record
+(length, CRC32, pickled tuple) to the current journal segment. Appends
+only touch an in-memory buffer; a background task writes and fsyncs it
+every ``MEMORY_STORE_FSYNC_MS``, so one fsync covers every write in that
+window and at most that window is lost on a crash.
+
+After ``MEMORY_STORE_SNAPSHOT_EVERY`` records the journal rolls to a new
+segment and a worker thread folds the previous snapshot plus the closed
+segments into a new snapshot, then deletes them. Compaction reads only
+closed files, never the live table or the open segment, so it needs no
+lock: only the roll itself holds up appends' fsyncs, and the event loop
+keeps serving meanwhile.
+A snapshot is a pickled ``CompactLinkTable``: its columns load as whole
+arrays, without rebuilding a document per link.
+
+On startup ``recover`` loads the newest snapshot and replays the segments
+written after it. A torn record at the end of a segment (crash mid-write)
+ends replay of that segment.
+"""
+import os
+import glob
+import time
+import pickle
+import struct
+import asyncio
+import logging
+import zlib
+from typing import Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.compact_links import CompactLinkTable
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MEMORY_STORE_JOURNAL_DIR = os.environ.get('MEMORY_STORE_JOURNAL_DIR', '')
+MEMORY_STORE_FSYNC_MS = float(os.environ.get('MEMORY_STORE_FSYNC_MS', '50'))
+MEMORY_STORE_SNAPSHOT_EVERY = int(os.environ.get('MEMORY_STORE_SNAPSHOT_EVERY', '500000'))
+
+_FRAME = struct.Struct('<II')
+
+# Record tuples
+INSERT = 'i'   # ('i', link)
+CLICKS = 'c'   # ('c', short_code, clicks)
+STATUS = 's'   # ('s', short_code, status)
+DELETE = 'd'   # ('d', short_code)
+
+
+def apply_record(links: CompactLinkTable, record: tuple) -> None:
+    """Apply one journal record to a link table."""
+    op = record[0]
+    if op == INSERT:
+        links.put(record[1])
+    elif op == DELETE:
+        links.delete(record[1])
+    elif op == CLICKS:
+        links.add_clicks(record[1], record[2])
+    elif op == STATUS and record[2] == 'expired':
+        # Expiry is the only status change, and it is terminal
+        links.set_expired(record[1])
+
+
+def encode_record(record: tuple) -> bytes:
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path: str) -> Iterator[tuple]:
+    """Yield the records of one segment, stopping at the first torn or corrupt frame."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning(f"Journal {path}: ignoring torn record at byte {offset}")
+            return
+        yield pickle.loads(payload)
+        offset = start + length
+
+
+def _fsync_directory(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LinkJournal:
+    """Durable log of in-memory link store writes; see the module docstring."""
+
+    def __init__(
+        self,
+        directory: str,
+        fsync_ms: float = MEMORY_STORE_FSYNC_MS,
+        snapshot_every: int = MEMORY_STORE_SNAPSHOT_EVERY
+    ):
+        self.directory = directory
+        self.fsync_interval = fsync_ms / 1000
+        self.snapshot_every = snapshot_every
+        self._buffer = bytearray()
+        self._segment = 0
+        self._file = None
+        self._since_snapshot = 0
+        self._io_lock = asyncio.Lock()
+        self._snapshot_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.appended = 0
+        self.fsyncs = 0
+        self.snapshots = 0
+        self.last_snapshot_ms = 0.0
+        self.recovered_links = 0
+        self.replayed_records = 0
+        self.recovery_ms = 0.0
+
+    def _path(self, kind: str, number: int) -> str:
+        suffix = 'snap' if kind == 'snapshot' else 'log'
+        return os.path.join(self.directory, f"{kind}-{number:08d}.{suffix}")
+
+    def _numbers(self, kind: str) -> List[int]:
+        suffix = 'snap' if kind == 'snapshot' else 'log'
+        paths = glob.glob(os.path.join(self.directory, f"{kind}-*.{suffix}"))
+        return sorted(int(os.path.basename(p)[len(kind) + 1:-len(suffix) - 1]) for p in paths)
+
+    def _load(self, upto: Optional[int] = None) -> Tuple[CompactLinkTable, int, List[int], int]:
+        """
+        Rebuild state from the newest snapshot and the segments after it.
+
+        Returns:
+            Tuple of (uncapped link table, snapshot number, replayed segment
+            numbers, replayed record count)
+        """
+        snapshots = self._numbers('snapshot')
+        base = snapshots[-1] if snapshots else 0
+        links = CompactLinkTable()
+        if snapshots:
+            with open(self._path('snapshot', base), 'rb') as f:
+                links = pickle.load(f)
+        segments = [n for n in self._numbers('journal') if n >= base and (upto is None or n < upto)]
+        replayed = 0
+        for number in segments:
+            for record in read_records(self._path('journal', number)):
+                apply_record(links, record)
+                replayed += 1
+        return links, base, segments, replayed
+
+    def recover(self) -> CompactLinkTable:
+        """
+        Load the stored links and open a fresh segment for new writes.
+
+        Blocking; run it in an executor.
+
+        Returns:
+            Recovered links, in a table without a memory cap
+        """
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        links, base, segments, self.replayed_records = self._load()
+        self._segment = max(segments + [base]) + 1
+        self._file = open(self._path('journal', self._segment), 'ab')
+        _fsync_directory(self.directory)
+        self.recovered_links = len(links)
+        self.recovery_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Recovered {len(links)} in-memory links from {self.directory} "
+            f"({self.replayed_records} journal records) in {self.recovery_ms:.0f} ms"
+        )
+        return links
+
+    def append(self, record: tuple) -> None:
+        """Buffer a record; it is durable after the next fsync."""
+        self._buffer += encode_record(record)
+        self.appended += 1
+        self._since_snapshot += 1
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def flush(self) -> None:
+        """Write and fsync everything appended so far."""
+        async with self._io_lock:
+            if not self._buffer or self._file is None:
+                return
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+            self.fsyncs += 1
+
+    async def snapshot(self) -> None:
+        """Roll to a new segment and fold everything before it into a snapshot."""
+        async with self._snapshot_lock:
+            async with self._io_lock:
+                if self._buffer:
+                    data, self._buffer = bytes(self._buffer), bytearray()
+                    await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+                    self.fsyncs += 1
+                self._file.close()
+                self._segment += 1
+                self._file = open(self._path('journal', self._segment), 'ab')
+                self._since_snapshot = 0
+                upto = self._segment
+            # Appends and fsyncs go on into the new segment meanwhile
+            await asyncio.get_running_loop().run_in_executor(None, self._compact, upto)
+
+    def _compact(self, upto: int) -> None:
+        started = time.perf_counter()
+        links, base, segments, _ = self._load(upto)
+        path = self._path('snapshot', upto)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(links, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        _fsync_directory(self.directory)
+        if base:
+            os.remove(self._path('snapshot', base))
+        for number in segments:
+            os.remove(self._path('journal', number))
+        self.snapshots += 1
+        self.last_snapshot_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Journal snapshot of {len(links)} links written in {self.last_snapshot_ms:.0f} ms")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.fsync_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                if self._since_snapshot >= self.snapshot_every:
+                    await self.snapshot()
+                else:
+                    await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing link journal: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer, fsync the remaining buffer and close the segment."""
+        if self._task is not None:
+            # Not cancelled: a write or compaction in flight finishes first
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._file is not None:
+            await self.flush()
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "segment": self._segment,
+            "bufferedBytes": len(self._buffer),
+            "appendedRecords": self.appended,
+            "recordsSinceSnapshot": self._since_snapshot,
+            "fsyncs": self.fsyncs,
+            "snapshots": self.snapshots,
+            "lastSnapshotMs": self.last_snapshot_ms,
+            "recoveredLinks": self.recovered_links,
+            "recoveryMs": self.recovery_ms
+        }
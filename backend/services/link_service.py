@@ -1,32 +1,55 @@
-from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
+import time
 import logging
 from models import Link, ExpiryRules, CreateLinkRequest
-from utils.short_code import generate_unique_short_code
+from utils.short_code import generate_short_code, is_valid_short_code, link_lookup_keys, SHORT_CODE_INT_KEY
+from utils.expiry_fields import normalize_expiry_fields
 from services.ai_parser import parse_expiry_with_gemini
-
-IN_MEMORY_LINKS_BY_CODE = {}
-IN_MEMORY_LINKS_BY_ID = {}
+from services.link_cache import link_cache, miss_cache
+from services.click_buffer import click_buffer
+from services.code_index import short_code_index
+from services.code_reservoir import code_reservoir
+from services.expiry_engine import compile_expiry
+from services.link_store import DuplicateLinkError, LinkStore
 
 logger = logging.getLogger(__name__)
 
+# Short codes tried before a create gives up on duplicate key errors
+CREATE_LINK_ATTEMPTS = 3
+
+_NOT_FOUND_CLICK = {
+    "success": False,
+    "shouldRedirect": False,
+    "currentClicks": 0,
+    "status": "not_found",
+    "link": None
+}
+
+
+async def _generate_code(store: LinkStore) -> str:
+    """Generate a unique short code inline, for when the reservoir is empty or off."""
+    if not code_reservoir.enabled or store.db is None:
+        return await generate_short_code(store.db, store.code_exists, might_exist=short_code_index.might_exist)
+
+    async def taken(short_code: str) -> bool:
+        return await store.code_exists(short_code) or await code_reservoir.is_reserved(store.db, short_code)
+
+    # Reserved codes are not links yet, so the Bloom filter cannot rule them out
+    return await generate_short_code(store.db, taken)
 
-async def create_link(db: AsyncIOMotorDatabase, request: CreateLinkRequest) -> dict:
+
+async def create_link(store: LinkStore, request: CreateLinkRequest) -> dict:
     """
     Create a new smart link with AI-parsed expiry rules.
     
     Args:
-        db: MongoDB database instance
+        store: Link storage engine
         request: Create link request with originalUrl and expiryText
     
     Returns:
         Dictionary with created link data
     """
     try:
-        # Generate unique short code
-        short_code = await generate_unique_short_code(db)
-        logger.info(f"Generated short code: {short_code}")
-        
         # Parse expiry rules using Gemini AI
         parsed_expiry = await parse_expiry_with_gemini(request.expiryText)
         logger.info(f"Parsed expiry rules: {parsed_expiry}")
@@ -40,23 +63,53 @@ async def create_link(db: AsyncIOMotorDatabase, request: CreateLinkRequest) -> d
             rawInput=request.expiryText
         )
         
-        # Create link object
-        link = Link(
-            shortCode=short_code,
-            originalUrl=request.originalUrl,
-            expiryRules=expiry_rules,
-            clicks=0,
-            status="active"
-        )
-        
-        link_dict = link.dict()
-        try:
-            await db.links.insert_one(link_dict)
-            logger.info(f"Link created: {short_code}")
-        except Exception:
-            IN_MEMORY_LINKS_BY_CODE[short_code] = link_dict
-            IN_MEMORY_LINKS_BY_ID[link.id] = link_dict
-            logger.info(f"Link stored in memory: {short_code}")
+        for attempt in range(1, CREATE_LINK_ATTEMPTS + 1):
+            # Take a pre-reserved short code, or generate a unique one inline
+            short_code = code_reservoir.pop()
+            from_reservoir = short_code is not None
+            if not from_reservoir:
+                short_code = await _generate_code(store)
+            logger.info(f"Generated short code: {short_code}")
+            
+            # Create link object
+            link = Link(
+                shortCode=short_code,
+                originalUrl=request.originalUrl,
+                expiryRules=expiry_rules,
+                clicks=0,
+                status="active"
+            )
+            
+            link_dict = link.model_dump()
+            link_dict.update(normalize_expiry_fields(link_dict['expiryRules']))
+            if SHORT_CODE_INT_KEY:
+                link_dict.update(link_lookup_keys(short_code, link.id))
+            try:
+                await store.insert(link_dict)
+                break
+            except DuplicateLinkError:
+                # Issued meanwhile, e.g. by a node whose codes the Bloom filter has not seen yet
+                logger.warning(f"Short code {short_code} is already taken (attempt {attempt})")
+                short_code_index.add(short_code)
+                if from_reservoir:
+                    code_reservoir.mark_used(short_code)
+                if attempt == CREATE_LINK_ATTEMPTS:
+                    raise
+            except Exception:
+                if from_reservoir:
+                    # Still reserved, so the next link can have it
+                    code_reservoir.release(short_code)
+                raise
+        logger.info(f"Link created: {short_code}")
+        if from_reservoir:
+            if store.answered_by_primary():
+                code_reservoir.mark_used(short_code)
+            else:
+                # Only in the outage fallback; the lease guards the code until it is written back
+                code_reservoir.mark_pending(short_code)
+        short_code_index.add(short_code)
+        miss_cache.discard(short_code)
+        link_cache.put(short_code, link_dict)
         
         # Return response
         return {
@@ -80,188 +133,235 @@ async def create_link(db: AsyncIOMotorDatabase, request: CreateLinkRequest) -> d
         raise
 
 
-async def get_link_by_short_code(db: AsyncIOMotorDatabase, short_code: str) -> dict:
+def is_known_missing(short_code: str) -> bool:
+    """
+    Answer a lookup without I/O when the code cannot exist.
+
+    Rejects codes the generator could never have produced, codes recently
+    found missing in the database and codes the Bloom filter has never seen.
+
+    Args:
+        short_code: The short code to check
+
+    Returns:
+        True if the code is definitely or very recently unknown
+    """
+    return (
+        not is_valid_short_code(short_code)
+        or short_code in miss_cache
+        or not short_code_index.might_exist(short_code)
+    )
+
+
+async def get_link_by_short_code(store: LinkStore, short_code: str) -> dict:
     """
     Get link details by short code.
     
     Args:
-        db: MongoDB database instance
+        store: Link storage engine
         short_code: The short code to look up
     
     Returns:
         Dictionary with link data or None if not found
     """
-    try:
-        link = await db.links.find_one({"shortCode": short_code})
-    except Exception:
-        link = IN_MEMORY_LINKS_BY_CODE.get(short_code)
+    if is_known_missing(short_code):
+        return None
+
+    cached = link_cache.get(short_code)
+    if cached is not None:
+        link = dict(cached)
+    else:
+        link = await store.get_by_code(short_code)
+        if link:
+            link_cache.put(short_code, link)
 
     if not link:
+        if store.answered_by_primary():
+            miss_cache.add(short_code)
         return None
 
     try:
-        expiry_rules = link.get('expiryRules') or {}
-        # Compute effective expiry by time or clicks
-        expired = False
-        tl = expiry_rules.get('timeLimit')
-        if tl:
-            if isinstance(tl, str):
-                time_limit = datetime.fromisoformat(tl.replace('Z', '+00:00'))
-            else:
-                time_limit = tl
-            if time_limit.tzinfo is None:
-                from datetime import timezone
-                time_limit = time_limit.replace(tzinfo=timezone.utc)
-            from datetime import timezone
-            now_utc = datetime.now(timezone.utc)
-            if now_utc >= time_limit:
-                expired = True
-        cl = expiry_rules.get('clickLimit')
-        clicks = link.get('clicks', 0)
-        if cl is not None and cl != None:
-            try:
-                limit = int(cl)
-                if clicks >= limit:
-                    expired = True
-            except Exception:
-                pass
-
+        expired = compile_expiry(link).is_expired(link.get('clicks', 0), time.time())
         if expired and link.get('status') != 'expired':
-            update_data = {"status": "expired"}
-            try:
-                await db.links.update_one({"shortCode": short_code}, {"$set": update_data})
-            except Exception:
-                if short_code in IN_MEMORY_LINKS_BY_CODE:
-                    IN_MEMORY_LINKS_BY_CODE[short_code].update(update_data)
-                    IN_MEMORY_LINKS_BY_ID[IN_MEMORY_LINKS_BY_CODE[short_code]['id']].update(update_data)
-            link.update(update_data)
+            await store.mark_expired(short_code)
+            link['status'] = 'expired'
+            # Replace the stale active entry with the terminal expired state
+            link_cache.invalidate(short_code)
+            link_cache.put(short_code, link)
     except Exception:
         pass
 
+    pending_clicks = click_buffer.pending(short_code)
+    if pending_clicks:
+        link = {**link, "clicks": link.get('clicks', 0) + pending_clicks}
     return link
 
 
-async def track_click(db: AsyncIOMotorDatabase, short_code: str) -> dict:
+async def track_click(store: LinkStore, short_code: str) -> dict:
     """
     Track a click on a link and check if it should expire.
-    
+
+    The click is counted with one atomic ``LinkStore.click``: it only
+    counts links that are still active and within their click/time limits,
+    so concurrent clicks can never push a link past its click limit.
+    Otherwise the link is flipped to ``expired`` and the post-update
+    document is returned for rendering.
+
     Args:
-        db: MongoDB database instance
+        store: Link storage engine
         short_code: The short code that was clicked
-    
+
     Returns:
-        Dictionary with click tracking result
+        Dictionary with click tracking result; ``link`` holds the
+        post-update document (or None if the code is unknown)
     """
     try:
-        link = None
-        try:
-            link = await db.links.find_one({"shortCode": short_code})
-        except Exception:
-            link = IN_MEMORY_LINKS_BY_CODE.get(short_code)
-        if not link:
+        if is_known_missing(short_code):
+            return dict(_NOT_FOUND_CLICK)
+
+        cached = link_cache.get(short_code)
+        if cached is not None and cached.get('status') == 'expired':
+            # Expired is terminal, so no round trip is needed to refuse the click
             return {
-                "success": False,
+                "success": True,
                 "shouldRedirect": False,
-                "currentClicks": 0,
-                "status": "not_found"
+                "originalUrl": None,
+                "currentClicks": cached.get('clicks', 0),
+                "status": "expired",
+                "link": cached
             }
-        
-        # Check if already expired
-        if link['status'] == 'expired':
+
+        if cached is not None and click_buffer.accepting and not compile_expiry(cached).depends_on_clicks:
+            # Without a click limit the count never changes the redirect decision, and
+            # the cache entry cannot outlive timeLimit, so the write can be deferred.
+            click_buffer.add(short_code)
+            return {
+                "success": True,
+                "shouldRedirect": True,
+                "originalUrl": cached['originalUrl'],
+                "currentClicks": cached.get('clicks', 0) + click_buffer.pending(short_code),
+                "status": "active",
+                "link": cached
+            }
+
+        link, counted = await store.click(short_code, time.time())
+
+        if not link:
+            # A miss seen only by the outage fallback may be a link MongoDB has
+            if store.answered_by_primary():
+                miss_cache.add(short_code)
+            return dict(_NOT_FOUND_CLICK)
+
+        if not counted:
+            logger.info(f"Link {short_code} is expired")
+            link_cache.invalidate(short_code)
+            link_cache.put(short_code, link)
             return {
                 "success": True,
                 "shouldRedirect": False,
                 "originalUrl": None,
-                "currentClicks": link['clicks'],
-                "status": "expired"
+                "currentClicks": link.get('clicks', 0),
+                "status": "expired",
+                "link": link
             }
-        
-        # Increment click count
-        new_click_count = link['clicks'] + 1
-        
-        # Check expiry conditions
-        should_expire = False
-        expiry_rules = link['expiryRules']
-        
-        # Check click limit (expire when count reaches limit)
-        if expiry_rules['clickLimit'] and new_click_count > expiry_rules['clickLimit']:
-            should_expire = True
-            logger.info(f"Link {short_code} reached click limit (> {expiry_rules['clickLimit']})")
-        
-        # Check time limit
-        if expiry_rules['timeLimit']:
-            tl = expiry_rules['timeLimit']
-            if isinstance(tl, str):
-                time_limit = datetime.fromisoformat(tl.replace('Z', '+00:00'))
-            else:
-                time_limit = tl
-            if time_limit.tzinfo is None:
-                from datetime import timezone
-                time_limit = time_limit.replace(tzinfo=timezone.utc)
-            from datetime import timezone
-            now_utc = datetime.now(timezone.utc)
-            if now_utc >= time_limit:
-                should_expire = True
-                logger.info(f"Link {short_code} reached time limit")
-        
-        update_data = {"clicks": new_click_count}
-        if should_expire:
-            update_data["status"] = "expired"
-
-        try:
-            await db.links.update_one(
-                {"shortCode": short_code},
-                {"$set": update_data}
-            )
-        except Exception:
-            if short_code in IN_MEMORY_LINKS_BY_CODE:
-                IN_MEMORY_LINKS_BY_CODE[short_code].update(update_data)
-                IN_MEMORY_LINKS_BY_ID[IN_MEMORY_LINKS_BY_CODE[short_code]['id']].update(update_data)
-        
+
+        link_cache.put(short_code, link)
         return {
             "success": True,
-            "shouldRedirect": not should_expire,
-            "originalUrl": link['originalUrl'] if not should_expire else None,
-            "currentClicks": new_click_count,
-            "status": "expired" if should_expire else "active"
+            "shouldRedirect": True,
+            "originalUrl": link['originalUrl'],
+            "currentClicks": link['clicks'],
+            "status": "active",
+            "link": link
         }
-        
+
     except Exception as e:
         logger.error(f"Error tracking click: {e}")
         raise
 
 
-async def get_link_stats(db: AsyncIOMotorDatabase, link_id: str) -> dict:
+async def flush_click_buffer(store: LinkStore) -> None:
+    """
+    Persist buffered click increments in one bulk store write.
+
+    Increments the store could not apply are put back in the buffer and
+    retried on the next flush.
+
+    Args:
+        store: Link storage engine
+    """
+    increments = click_buffer.drain()
+    if not increments:
+        return
+
+    total = sum(increments.values())
+    try:
+        retry = await store.add_clicks(increments)
+    except Exception:
+        retry = dict(increments)
+    if retry:
+        click_buffer.restore(retry)
+        for code in retry:
+            increments.pop(code)
+        total -= sum(retry.values())
+        logger.warning(f"Re-queued buffered clicks for {len(retry)} links")
+
+    for code, clicks in increments.items():
+        link_cache.add_clicks(code, clicks)
+    click_buffer.record_flush(total)
+
+
+async def expire_due_links(store: LinkStore) -> int:
+    """
+    Flip every active link whose time limit has passed to expired.
+
+    Links otherwise only flip when they are next looked up or clicked;
+    cached entries never outlive ``timeLimit``, so no invalidation is needed.
+
+    Args:
+        store: Link storage engine
+
+    Returns:
+        Number of links expired
+    """
+    expired = await store.expire_due(time.time())
+    if expired:
+        logger.info(f"Expired {expired} links past their time limit")
+    return expired
+
+
+async def get_link_stats(store: LinkStore, link_id: str) -> dict:
     """
     Get statistics for a link.
     
     Args:
-        db: MongoDB database instance
+        store: Link storage engine
         link_id: The link ID
     
     Returns:
         Dictionary with link statistics
     """
-    link = None
-    try:
-        link = await db.links.find_one({"id": link_id})
-    except Exception:
-        link = IN_MEMORY_LINKS_BY_ID.get(link_id)
+    link = await store.get_by_id(link_id)
     if not link:
         return None
-    
+
+    clicks = link['clicks'] + click_buffer.pending(link['shortCode'])
+    status = link['status']
+    if status != 'expired' and compile_expiry(link).is_expired(clicks, time.time()):
+        # Report the effective state even if no lookup or click has flipped it yet
+        status = 'expired'
     return {
         "id": link['id'],
         "shortCode": link['shortCode'],
         "originalUrl": link['originalUrl'],
-        "clicks": link['clicks'],
-        "status": link['status'],
+        "clicks": clicks,
+        "status": status,
         "expiryInfo": {
             "summary": link['expiryRules']['summary'],
             "type": link['expiryRules']['type'],
             "clickLimit": link['expiryRules']['clickLimit'],
             "timeLimit": link['expiryRules']['timeLimit'],
-            "currentClicks": link['clicks']
+            "currentClicks": clicks
         },
         "createdAt": link['createdAt'].isoformat() + 'Z' if isinstance(link['createdAt'], datetime) else link['createdAt']
     }
@@ -0,0 +1,655 @@
+"""
+Storage engines for links.
+
+``link_service`` talks to a ``LinkStore`` instead of MongoDB directly.
+The engine is chosen with ``LINK_STORE``:
+
+- ``mongo``: MongoDB only; storage errors (including ``CircuitOpenError``
+  while the MongoDB breaker is open) propagate to the caller
+- ``memory``: a bounded, column-oriented in-process table, for benchmarks
+  and edge nodes
+- ``sqlite``: a local SQLite database, for single-node deployments
+  without mongod (``services/sqlite_store.py``)
+- ``fallback`` (default): MongoDB, falling back to the in-memory engine
+  whenever MongoDB is unreachable or the breaker is open; query errors
+  such as a duplicate short code propagate
+"""
+import os
+import copy
+import uuid
+import asyncio
+import logging
+import contextvars
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from utils.short_code import short_code_filter, short_codes_filter, link_id_filter
+from services.expiry_engine import clickable_clauses
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, mongo_breaker
+from services.micro_batcher import MicroBatcher
+from services.link_journal import LinkJournal, INSERT, CLICKS, STATUS, DELETE, MEMORY_STORE_JOURNAL_DIR
+from utils.compact_links import CompactLinkTable
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LINK_STORE = os.environ.get('LINK_STORE', 'fallback').lower()
+MEMORY_STORE_MAX_BYTES = int(os.environ.get('MEMORY_STORE_MAX_BYTES', str(256 * 1024 * 1024)))
+MEMORY_STORE_EVICTION = os.environ.get('MEMORY_STORE_EVICTION', 'reject').lower()
+MONGO_READ_BATCHING = os.environ.get('MONGO_READ_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+MONGO_READ_BATCH_WINDOW_MS = float(os.environ.get('MONGO_READ_BATCH_WINDOW_MS', '0.5'))
+MONGO_READ_BATCH_MAX = int(os.environ.get('MONGO_READ_BATCH_MAX', '128'))
+MONGO_CLICK_BATCHING = os.environ.get('MONGO_CLICK_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+MONGO_CLICK_BATCH_WINDOW_MS = float(os.environ.get('MONGO_CLICK_BATCH_WINDOW_MS', '0.5'))
+MONGO_CLICK_BATCH_MAX = int(os.environ.get('MONGO_CLICK_BATCH_MAX', '256'))
+
+# How long another node's click grant record is kept on a link
+CLICK_GRANT_TTL_SECONDS = 60
+
+# Link reads leave out click batches' grant records and the reconciler's
+# write-back stamps, which are bookkeeping and not part of the document
+LINK_PROJECTION = {"_id": 0, "clickGrants": 0, "syncSeq": 0}
+
+# Errors meaning MongoDB is unreachable, as opposed to refusing or failing a query
+MONGO_OUTAGE_ERRORS = (ConnectionFailure, CircuitOpenError)
+
+# Per task: whether the last FallbackLinkStore call was answered by MongoDB
+_answered_by_primary = contextvars.ContextVar('answered_by_primary', default=True)
+
+
+class DuplicateLinkError(Exception):
+    """Raised by ``LinkStore.insert`` when the short code or id is already taken."""
+
+
+class LinkStore(ABC):
+    """
+    Async storage interface for link documents.
+
+    Returned documents belong to the caller and may be modified freely.
+    """
+
+    name = "base"
+    # MongoDB database behind the engine, for Mongo-only features
+    # (counter leases, code reservations, Bloom filter builds)
+    db: Optional[AsyncIOMotorDatabase] = None
+
+    @abstractmethod
+    async def insert(self, link: dict) -> None:
+        """
+        Store a new link.
+
+        Raises:
+            DuplicateLinkError: A link with the same short code or id exists
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_by_code(self, short_code: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_by_id(self, link_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def existing_codes(self, short_codes: Iterable[str]) -> Set[str]:
+        """Return the subset of ``short_codes`` that belong to stored links."""
+        raise NotImplementedError
+
+    async def code_exists(self, short_code: str) -> bool:
+        return bool(await self.existing_codes([short_code]))
+
+    @abstractmethod
+    async def click(self, short_code: str, now: float) -> Tuple[Optional[dict], bool]:
+        """
+        Atomically count a click if the link may still serve a redirect.
+
+        Otherwise the link is flipped to expired.
+
+        Returns:
+            Tuple of (post-update link or None if unknown, whether the click was counted)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def mark_expired(self, short_code: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_clicks(self, increments: Dict[str, int]) -> Dict[str, int]:
+        """
+        Apply click increments in bulk.
+
+        Returns:
+            Increments that could not be applied yet and should be retried
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expire_due(self, now: float) -> int:
+        """Flip active links whose time limit is at or before ``now``; returns how many."""
+        raise NotImplementedError
+
+    def answered_by_primary(self) -> bool:
+        """
+        Whether the current task's last call was answered by the engine of
+        record. Only then is an unknown link definitely missing, rather
+        than unknown to a stand-in used during an outage.
+        """
+        return True
+
+    async def open(self) -> None:
+        """Load persisted state and start background work; awaited at startup."""
+
+    async def close(self) -> None:
+        """Release engine resources at shutdown."""
+
+    def stats(self) -> dict:
+        return {"engine": self.name}
+
+
+def clickable_filter(short_code: str, now: float) -> dict:
+    """
+    Filter matching a link that may still serve a redirect at ``now`` (Unix seconds).
+
+    Each registered expiry rule type contributes one clause, mirroring
+    ``CompiledExpiry.is_expired`` on the database side.
+    """
+    return {
+        **short_code_filter(short_code),
+        "status": {"$ne": "expired"},
+        "$and": clickable_clauses(now)
+    }
+
+
+def due_links_filter(now: float) -> dict:
+    """Filter matching active links whose precomputed expiry time has passed."""
+    return {"status": "active", "expiresAtEpoch": {"$lte": now}}
+
+
+def click_grant_update(clicks: int, owner: str, seq: int, now: float) -> list:
+    """
+    Update pipeline counting up to ``clicks`` clicks on a clickable link.
+
+    The clicks granted, ``min(clicks, clickLimit - clicks)`` (all of them
+    without a limit), are recorded under ``clickGrants.<owner>`` with the
+    batch sequence number, so the batch can read back its own outcome.
+    Other nodes' records older than ``CLICK_GRANT_TTL_SECONDS`` are dropped.
+    """
+    limit = {"$ifNull": ["$clickLimit", {"$ifNull": ["$expiryRules.clickLimit", None]}]}
+    granted = {"$cond": [
+        {"$eq": [limit, None]},
+        clicks,
+        {"$max": [0, {"$min": [clicks, {"$subtract": [limit, "$clicks"]}]}]}
+    ]}
+    others = {"$filter": {
+        "input": {"$objectToArray": {"$ifNull": ["$clickGrants", {}]}},
+        "cond": {"$and": [
+            {"$ne": ["$$this.k", owner]},
+            {"$gt": ["$$this.v.at", now - CLICK_GRANT_TTL_SECONDS]}
+        ]}
+    }}
+    return [
+        {"$set": {"clickGrants": {"$arrayToObject": others}}},
+        {"$set": {
+            "clicks": {"$add": ["$clicks", granted]},
+            f"clickGrants.{owner}": {"seq": seq, "n": granted, "at": now}
+        }}
+    ]
+
+
+def click_refused_filter(short_code: str, clicks: int, owner: str, seq: int) -> dict:
+    """Filter matching a link that refused some of a batch's clicks and is not yet expired."""
+    return {
+        **short_code_filter(short_code),
+        "status": {"$ne": "expired"},
+        "$or": [
+            {f"clickGrants.{owner}.seq": {"$ne": seq}},
+            {f"clickGrants.{owner}.n": {"$lt": clicks}}
+        ]
+    }
+
+
+class MongoLinkStore(LinkStore):
+    """
+    Links in the MongoDB ``links`` collection.
+
+    Every call goes through a circuit breaker, so during an outage calls
+    raise ``CircuitOpenError`` at once instead of each waiting out the
+    driver's server selection timeout.
+
+    With read batching, concurrent ``get_by_code`` calls are coalesced
+    into one ``$in`` query per ``MicroBatcher`` window.
+
+    With click batching, the clicks of one window become one ordered
+    ``bulk_write`` with two operations per clicked link: a conditional
+    increment granting as many clicks as the limit still allows
+    (``click_grant_update``), then an expiry of links that refused any.
+    The bulk result has no per-operation outcome, so the grants are read
+    back with the documents in one ``$in`` query; one click batch runs at
+    a time per process, so its ``clickGrants.<owner>`` record is still
+    its own when read. The first callers for a link get the granted
+    clicks, the rest the expired outcome, and all get the document as of
+    the end of the batch. Reads leave grant records out (``LINK_PROJECTION``).
+    """
+
+    name = "mongo"
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        breaker: CircuitBreaker = mongo_breaker,
+        read_batching: bool = MONGO_READ_BATCHING,
+        click_batching: bool = MONGO_CLICK_BATCHING
+    ):
+        self.db = db
+        self.breaker = breaker
+        self.read_batcher = (
+            MicroBatcher(self._get_many, MONGO_READ_BATCH_WINDOW_MS, MONGO_READ_BATCH_MAX)
+            if read_batching else None
+        )
+        self.click_batcher = (
+            MicroBatcher(self._click_many, MONGO_CLICK_BATCH_WINDOW_MS, MONGO_CLICK_BATCH_MAX, max_in_flight=1)
+            if click_batching else None
+        )
+        self.owner = uuid.uuid4().hex
+        self._click_seq = 0
+
+    async def insert(self, link: dict) -> None:
+        try:
+            async with self.breaker:
+                await self.db.links.insert_one(link)
+        except DuplicateKeyError as e:
+            raise DuplicateLinkError(str(e)) from e
+        finally:
+            link.pop('_id', None)
+
+    async def get_by_code(self, short_code: str) -> Optional[dict]:
+        if self.read_batcher is not None:
+            return await self.read_batcher.submit(short_code)
+        async with self.breaker:
+            return await self.db.links.find_one(short_code_filter(short_code), LINK_PROJECTION)
+
+    async def _get_many(self, short_codes: List[str]) -> List[Optional[dict]]:
+        """Resolve a batch of ``get_by_code`` calls with one ``$in`` query."""
+        async with self.breaker:
+            found = {
+                doc['shortCode']: doc async for doc in self.db.links.find(
+                    short_codes_filter(set(short_codes)), LINK_PROJECTION
+                )
+            }
+        results = []
+        handed_out = set()
+        for short_code in short_codes:
+            link = found.get(short_code)
+            if link is not None and short_code in handed_out:
+                # Every caller gets a document of its own
+                link = copy.deepcopy(link)
+            handed_out.add(short_code)
+            results.append(link)
+        return results
+
+    async def get_by_id(self, link_id: str) -> Optional[dict]:
+        async with self.breaker:
+            return await self.db.links.find_one(link_id_filter(link_id), LINK_PROJECTION)
+
+    async def existing_codes(self, short_codes: Iterable[str]) -> Set[str]:
+        async with self.breaker:
+            return {
+                doc['shortCode'] async for doc in self.db.links.find(
+                    short_codes_filter(short_codes), {"_id": 0, "shortCode": 1}
+                )
+            }
+
+    async def click(self, short_code: str, now: float) -> Tuple[Optional[dict], bool]:
+        if self.click_batcher is not None:
+            return await self.click_batcher.submit((short_code, now))
+        async with self.breaker:
+            link = await self.db.links.find_one_and_update(
+                clickable_filter(short_code, now),
+                {"$inc": {"clicks": 1}},
+                projection=LINK_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            if link is not None:
+                return link, True
+            link = await self.db.links.find_one_and_update(
+                short_code_filter(short_code),
+                {"$set": {"status": "expired"}},
+                projection=LINK_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            return link, False
+
+    async def _click_many(self, clicks: List[Tuple[str, float]]) -> list:
+        """Resolve a batch of ``click`` calls with one ordered bulk_write and one read-back."""
+        # Clickability is judged as of the newest click in the batch
+        now = max(at for _, at in clicks)
+        counts: Dict[str, int] = {}
+        for short_code, _ in clicks:
+            counts[short_code] = counts.get(short_code, 0) + 1
+        self._click_seq += 1
+        seq = self._click_seq
+        operations = []
+        for short_code, count in counts.items():
+            operations.append(UpdateOne(clickable_filter(short_code, now), click_grant_update(count, self.owner, seq, now)))
+            operations.append(UpdateOne(
+                click_refused_filter(short_code, count, self.owner, seq), {"$set": {"status": "expired"}}
+            ))
+        # Links whose operations did not run (the ordered bulk stopped at an error)
+        unattempted: Set[str] = set()
+        async with self.breaker:
+            try:
+                await self.db.links.bulk_write(operations, ordered=True)
+            except BulkWriteError as e:
+                # Ordered: the one write error is where execution stopped. A failed
+                # increment (even index) leaves its link unattempted, a failed expiry does not.
+                errors = e.details.get('writeErrors') or [{'index': 0}]
+                stopped = errors[0]['index']
+                unattempted = set(list(counts)[(stopped + 1) // 2:])
+                logger.warning(f"Click batch stopped at operation {stopped}: {e}")
+            found = {
+                doc['shortCode']: doc async for doc in self.db.links.find(
+                    # This batch's own grant record is read, then popped
+                    short_codes_filter(list(counts)), {"_id": 0, "syncSeq": 0}
+                )
+            }
+        granted: Dict[str, int] = {}
+        for short_code, link in found.items():
+            grant = (link.pop('clickGrants', None) or {}).get(self.owner)
+            granted[short_code] = grant['n'] if grant and grant.get('seq') == seq else 0
+        results = []
+        for short_code, _ in clicks:
+            link = found.get(short_code)
+            if short_code in unattempted:
+                results.append(RuntimeError(f"Click on {short_code} was not applied"))
+            elif link is None:
+                results.append((None, False))
+            else:
+                counted = granted[short_code] > 0
+                if counted:
+                    granted[short_code] -= 1
+                results.append((copy.deepcopy(link), counted))
+        return results
+
+    async def mark_expired(self, short_code: str) -> None:
+        async with self.breaker:
+            await self.db.links.update_one(short_code_filter(short_code), {"$set": {"status": "expired"}})
+
+    async def add_clicks(self, increments: Dict[str, int]) -> Dict[str, int]:
+        async with self.breaker:
+            await self.db.links.bulk_write(
+                [UpdateOne(short_code_filter(code), {"$inc": {"clicks": clicks}}) for code, clicks in increments.items()],
+                ordered=False
+            )
+        return {}
+
+    async def expire_due(self, now: float) -> int:
+        async with self.breaker:
+            result = await self.db.links.update_many(due_links_filter(now), {"$set": {"status": "expired"}})
+        return result.modified_count
+
+    async def close(self) -> None:
+        for batcher in (self.read_batcher, self.click_batcher):
+            if batcher is not None:
+                await batcher.close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        if self.read_batcher is not None:
+            stats["readBatcher"] = self.read_batcher.stats()
+        if self.click_batcher is not None:
+            stats["clickBatcher"] = self.click_batcher.stats()
+        return stats
+
+
+class MemoryLinkStore(LinkStore):
+    """
+    Links in a process-local ``CompactLinkTable``.
+
+    Every operation completes without awaiting, so each one is atomic with
+    respect to other coroutines. The table is capped at ``max_bytes``;
+    when full, expired links are evicted first and then, with the
+    ``oldest`` policy, the oldest links, otherwise inserts fail with
+    ``MemoryFullError``. With a ``LinkJournal`` every write (evictions
+    included) is also journaled, and ``open`` restores the links from the
+    previous run.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        journal: Optional[LinkJournal] = None,
+        max_bytes: int = MEMORY_STORE_MAX_BYTES,
+        eviction: str = MEMORY_STORE_EVICTION
+    ):
+        if eviction not in ('reject', 'oldest'):
+            raise ValueError(f"Unknown MEMORY_STORE_EVICTION policy: {eviction}")
+        self.links = CompactLinkTable(max_bytes, eviction)
+        self.journal = journal
+
+    async def open(self) -> None:
+        if self.journal is None:
+            return
+        links = await asyncio.get_running_loop().run_in_executor(None, self.journal.recover)
+        links.max_bytes, links.eviction = self.links.max_bytes, self.links.eviction
+        # Links written before recovery finished take precedence
+        for code in self.links.codes():
+            links.put(self.links.get(code))
+        self.links = links
+        self.journal.start()
+
+    async def close(self) -> None:
+        if self.journal is not None:
+            await self.journal.stop()
+
+    def _log(self, *record) -> None:
+        if self.journal is not None:
+            self.journal.append(record)
+
+    async def insert(self, link: dict) -> None:
+        if link['shortCode'] in self.links:
+            raise DuplicateLinkError(f"Short code {link['shortCode']} is already taken")
+        for code in self.links.put(link):
+            self._log(DELETE, code)
+        self._log(INSERT, link)
+
+    async def get_by_code(self, short_code: str) -> Optional[dict]:
+        return self.links.get(short_code)
+
+    async def get_by_id(self, link_id: str) -> Optional[dict]:
+        return self.links.get_by_id(link_id)
+
+    async def existing_codes(self, short_codes: Iterable[str]) -> Set[str]:
+        return {code for code in short_codes if code in self.links}
+
+    async def click(self, short_code: str, now: float) -> Tuple[Optional[dict], bool]:
+        # Check and increment are one table call with no await around it, so
+        # concurrent redirects cannot both pass the click limit; the event
+        # loop thread is the only one touching the table, so no lock is needed.
+        counted = self.links.click(short_code, now)
+        if counted is None:
+            return None, False
+        if counted:
+            self._log(CLICKS, short_code, 1)
+        elif self.links.set_expired(short_code):
+            self._log(STATUS, short_code, 'expired')
+        return self.links.get(short_code), counted
+
+    async def mark_expired(self, short_code: str) -> None:
+        if self.links.set_expired(short_code):
+            self._log(STATUS, short_code, 'expired')
+
+    async def add_clicks(self, increments: Dict[str, int]) -> Dict[str, int]:
+        for code, clicks in increments.items():
+            if self.links.add_clicks(code, clicks):
+                self._log(CLICKS, code, clicks)
+        return {}
+
+    def discard(self, short_code: str) -> None:
+        """Drop a link, e.g. once it has been written back to MongoDB."""
+        if self.links.delete(short_code):
+            self._log(DELETE, short_code)
+
+    async def expire_due(self, now: float) -> int:
+        due = [
+            code for code, _, status, expires_at in self.links.items()
+            if status == 'active' and expires_at is not None and expires_at <= now
+        ]
+        for code in due:
+            self.links.set_expired(code)
+            self._log(STATUS, code, 'expired')
+        return len(due)
+
+    def stats(self) -> dict:
+        stats = {**super().stats(), **self.links.stats()}
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        return stats
+
+
+class FallbackLinkStore(LinkStore):
+    """
+    MongoDB first, the in-memory engine when MongoDB is unreachable.
+
+    This is the historical behaviour: links created during an outage
+    live only in memory, and reads for them fall through after the
+    MongoDB call errors out. Until the reconciler writes them back, a
+    link MongoDB does not know is also looked up in memory.
+    ``answered_by_primary`` tells whether MongoDB answered the current
+    task's last call, so a miss seen only by the fallback is not taken
+    as final.
+    """
+
+    name = "fallback"
+
+    def __init__(self, primary: MongoLinkStore, fallback: MemoryLinkStore):
+        self.primary = primary
+        self.fallback = fallback
+        self.db = primary.db
+
+    def answered_by_primary(self) -> bool:
+        return _answered_by_primary.get()
+
+    async def insert(self, link: dict) -> None:
+        try:
+            await self.primary.insert(link)
+        except MONGO_OUTAGE_ERRORS:
+            _answered_by_primary.set(False)
+            await self.fallback.insert(link)
+            logger.info(f"Link stored in memory: {link['shortCode']}")
+            return
+        _answered_by_primary.set(True)
+
+    async def get_by_code(self, short_code: str) -> Optional[dict]:
+        try:
+            link = await self.primary.get_by_code(short_code)
+        except MONGO_OUTAGE_ERRORS:
+            _answered_by_primary.set(False)
+            return await self.fallback.get_by_code(short_code)
+        _answered_by_primary.set(True)
+        if link is None:
+            # Created during an outage and not written back yet
+            link = await self.fallback.get_by_code(short_code)
+        return link
+
+    async def get_by_id(self, link_id: str) -> Optional[dict]:
+        try:
+            link = await self.primary.get_by_id(link_id)
+        except MONGO_OUTAGE_ERRORS:
+            _answered_by_primary.set(False)
+            return await self.fallback.get_by_id(link_id)
+        _answered_by_primary.set(True)
+        if link is None:
+            link = await self.fallback.get_by_id(link_id)
+        return link
+
+    async def existing_codes(self, short_codes: Iterable[str]) -> Set[str]:
+        short_codes = list(short_codes)
+        held = await self.fallback.existing_codes(short_codes)
+        try:
+            return held | await self.primary.existing_codes(short_codes)
+        except MONGO_OUTAGE_ERRORS:
+            return held
+
+    async def click(self, short_code: str, now: float) -> Tuple[Optional[dict], bool]:
+        try:
+            link, counted = await self.primary.click(short_code, now)
+        except MONGO_OUTAGE_ERRORS:
+            _answered_by_primary.set(False)
+            return await self.fallback.click(short_code, now)
+        _answered_by_primary.set(True)
+        if link is None:
+            return await self.fallback.click(short_code, now)
+        return link, counted
+
+    async def mark_expired(self, short_code: str) -> None:
+        try:
+            await self.primary.mark_expired(short_code)
+        except MONGO_OUTAGE_ERRORS:
+            await self.fallback.mark_expired(short_code)
+            return
+        if short_code in self.fallback.links:
+            await self.fallback.mark_expired(short_code)
+
+    async def add_clicks(self, increments: Dict[str, int]) -> Dict[str, int]:
+        try:
+            return await self.primary.add_clicks(increments)
+        except MONGO_OUTAGE_ERRORS:
+            # Apply what the fallback holds; the rest waits for MongoDB
+            retry = {code: clicks for code, clicks in increments.items() if code not in self.fallback.links}
+            await self.fallback.add_clicks(
+                {code: clicks for code, clicks in increments.items() if code not in retry}
+            )
+            return retry
+
+    async def open(self) -> None:
+        await self.fallback.open()
+
+    async def close(self) -> None:
+        await self.primary.close()
+        await self.fallback.close()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "primary": self.primary.stats(), "fallback": self.fallback.stats()}
+
+    async def expire_due(self, now: float) -> int:
+        expired = await self.fallback.expire_due(now)
+        try:
+            expired += await self.primary.expire_due(now)
+        except MONGO_OUTAGE_ERRORS as e:
+            logger.error(f"Error expiring due links in MongoDB: {e}")
+        return expired
+
+
+def memory_journal() -> Optional[LinkJournal]:
+    """Journal for the in-memory engine, when ``MEMORY_STORE_JOURNAL_DIR`` is set."""
+    return LinkJournal(MEMORY_STORE_JOURNAL_DIR) if MEMORY_STORE_JOURNAL_DIR else None
+
+
+def create_link_store(db: AsyncIOMotorDatabase, engine: str = LINK_STORE) -> LinkStore:
+    """
+    Build the storage engine selected by ``LINK_STORE``.
+
+    Args:
+        db: MongoDB database instance (unused by the memory and sqlite engines)
+        engine: "mongo", "memory", "sqlite" or "fallback"
+
+    Returns:
+        The configured LinkStore
+    """
+    if engine == 'mongo':
+        return MongoLinkStore(db)
+    if engine == 'memory':
+        return MemoryLinkStore(memory_journal())
+    if engine == 'sqlite':
+        from services.sqlite_store import SqliteLinkStore
+        return SqliteLinkStore()
+    if engine == 'fallback':
+        return FallbackLinkStore(MongoLinkStore(db), MemoryLinkStore(memory_journal()))
+    raise ValueError(f"Unknown LINK_STORE engine: {engine}")
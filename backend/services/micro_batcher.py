@@ -0,0 +1,143 @@
+"""
+Request coalescing into micro-batches, DataLoader style.
+
+Callers ``submit`` one item each and await its own result. The first
+item of a batch arms a ``window_ms`` timer (``0`` means the next event
+loop iteration, which still gathers every coroutine that became ready
+in the current one); when it fires, or as soon as ``max_batch`` items
+are waiting, the items are handed to the handler in one call and its
+results are fanned back to the callers in submission order.
+
+The handler returns one result per item. A result that is an
+``Exception`` is raised to that caller only; if the handler itself
+raises, every caller in the batch gets the error.
+
+``max_in_flight`` bounds concurrent handler calls. Items arriving while
+it is reached wait for a running batch to finish and then go out at
+once, so batches grow with load instead of queueing round trips.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+class MicroBatcher:
+    """Gather concurrent single-item calls into batched handler calls; see the module docstring."""
+
+    def __init__(
+        self,
+        handler: Callable[[List], Awaitable[List]],
+        window_ms: float,
+        max_batch: int,
+        max_in_flight: int = 0
+    ):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        # 0: unbounded
+        self.max_in_flight = max_in_flight
+        self._items: List = []
+        self._futures: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._running: Set[asyncio.Task] = set()
+        # Power-of-two buckets: batches of 1, 2, 3-4, 5-8, ... items
+        self._histogram: Dict[int, int] = {}
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+
+    async def submit(self, item):
+        """
+        Queue an item for the next batch and wait for its result.
+
+        Args:
+            item: One handler input
+
+        Returns:
+            The handler's result for this item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append(item)
+        self._futures.append(future)
+        if len(self._items) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            if self.window > 0:
+                self._timer = loop.call_later(self.window, self._dispatch)
+            else:
+                self._timer = loop.call_soon(self._dispatch)
+        return await future
+
+    def _saturated(self) -> bool:
+        return bool(self.max_in_flight) and len(self._running) >= self.max_in_flight
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._items and not self._saturated():
+            items, futures = self._items[:self.max_batch], self._futures[:self.max_batch]
+            del self._items[:self.max_batch], self._futures[:self.max_batch]
+            if len(items) == self.max_batch:
+                self.full_batches += 1
+            task = asyncio.get_running_loop().create_task(self._run(items, futures))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if self._items and self._timer is None:
+            # Items that waited out a saturated batcher go now
+            self._dispatch()
+
+    async def _run(self, items: List, futures: List[asyncio.Future]) -> None:
+        size = len(items)
+        self.batches += 1
+        self.items += size
+        self.largest_batch = max(self.largest_batch, size)
+        bucket = 1 << (size - 1).bit_length()
+        self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+        try:
+            results = await self.handler(items)
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            self.failed_batches += 1
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            # A caller that gave up (cancelled) has a done future
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Send the pending items and wait for every batch in flight."""
+        self._dispatch()
+        while self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "windowMs": self.window * 1000,
+            "maxBatch": self.max_batch,
+            "pending": len(self._items),
+            "inFlight": len(self._running),
+            "batches": self.batches,
+            "items": self.items,
+            "avgBatchSize": self.items / self.batches if self.batches else 0.0,
+            "largestBatch": self.largest_batch,
+            "fullBatches": self.full_batches,
+            "failedBatches": self.failed_batches,
+            # Keyed by bucket upper bound: "4" counts batches of 3-4 items
+            "batchSizeHistogram": {str(bucket): self._histogram[bucket] for bucket in sorted(self._histogram)}
+        }
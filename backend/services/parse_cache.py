@@ -0,0 +1,262 @@
+"""
+Two-tier cache of expiry phrase parses.
+
+Entries are keyed on the normalized phrase and hold relative rules
+(``ParsedExpiry``: "+24h", "day+1 23:59:59", ...), never absolute time
+limits, so a hit is re-anchored to the moment it is served. The first
+tier is an in-process LRU; the second is the ``expiry_parse_cache``
+MongoDB collection shared by every node, so a phrase one node paid an
+LLM call for is a hit everywhere.
+
+``start`` warms the LRU from the shared collection, then from the
+``expiryRules.rawInput`` of recently created links: the most frequent
+phrases the grammar can't read on its own are turned back into rules
+from the limits that were stored for them.
+"""
+import os
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Set
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.circuit_breaker import mongo_breaker
+from utils.expiry_grammar import ParsedExpiry, normalize_expiry_text, parse_expiry_text, parsed_from_expiry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_CACHE_MAX_ENTRIES = int(os.environ.get('EXPIRY_CACHE_MAX_ENTRIES', '10000'))
+EXPIRY_CACHE_SHARED = os.environ.get('EXPIRY_CACHE_SHARED', 'true').lower() in ('1', 'true', 'yes')
+EXPIRY_CACHE_WARM_DAYS = float(os.environ.get('EXPIRY_CACHE_WARM_DAYS', '30'))
+EXPIRY_CACHE_WARM_LINKS = int(os.environ.get('EXPIRY_CACHE_WARM_LINKS', '100000'))
+
+COLLECTION = "expiry_parse_cache"
+
+
+def _to_doc(key: str, parsed: ParsedExpiry) -> dict:
+    return {"_id": key, "clickLimit": parsed.click_limit, "timeRules": list(parsed.time_rules)}
+
+
+def _from_doc(doc: dict) -> ParsedExpiry:
+    return ParsedExpiry(doc.get('clickLimit'), tuple(doc.get('timeRules') or ()), 1.0)
+
+
+class ExpiryParseCache:
+    """Normalized phrase -> relative parse, in-process LRU over a shared MongoDB collection; see the module docstring."""
+
+    def __init__(
+        self,
+        max_entries: int = EXPIRY_CACHE_MAX_ENTRIES,
+        shared: bool = EXPIRY_CACHE_SHARED,
+        warm_days: float = EXPIRY_CACHE_WARM_DAYS,
+        warm_links: int = EXPIRY_CACHE_WARM_LINKS
+    ):
+        # 0 disables the cache
+        self.max_entries = max_entries
+        self.shared = shared
+        self.warm_days = warm_days
+        self.warm_links = warm_links
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._entries = OrderedDict()  # normalized phrase -> ParsedExpiry
+        self._task: Optional[asyncio.Task] = None
+        self._writes: Set[asyncio.Task] = set()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.warmed = 0
+        self.shared_errors = 0
+
+    async def get(self, expiry_text: str) -> Optional[ParsedExpiry]:
+        """
+        Look a phrase up in the LRU, then in the shared collection.
+
+        Args:
+            expiry_text: The phrase as submitted
+
+        Returns:
+            The cached relative parse, or None on a miss
+        """
+        if not self.max_entries:
+            return None
+        key = normalize_expiry_text(expiry_text)
+        parsed = self._entries.get(key)
+        if parsed is not None:
+            self._entries.move_to_end(key)
+            self.local_hits += 1
+            return parsed
+
+        if self.db is not None:
+            try:
+                async with mongo_breaker:
+                    doc = await self.db[COLLECTION].find_one({"_id": key})
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Shared expiry parse cache unavailable: {e}")
+                doc = None
+            if doc is not None:
+                parsed = _from_doc(doc)
+                self._remember(key, parsed)
+                self.shared_hits += 1
+                return parsed
+
+        self.misses += 1
+        return None
+
+    def put(self, expiry_text: str, parsed: ParsedExpiry) -> None:
+        """Cache a parse in the LRU and, in the background, in the shared collection."""
+        if not self.max_entries:
+            return
+        key = normalize_expiry_text(expiry_text)
+        self._remember(key, parsed)
+        self.stores += 1
+        if self.db is not None:
+            self._write(key, {"$set": {**_to_doc(key, parsed), "updatedAt": datetime.utcnow()}})
+
+    def _remember(self, key: str, parsed: ParsedExpiry) -> None:
+        self._entries[key] = parsed
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _write(self, key: str, update: dict) -> None:
+        # Callers don't wait for the shared tier; stop() does
+        task = asyncio.get_running_loop().create_task(self._upsert(key, update))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _upsert(self, key: str, update: dict) -> None:
+        try:
+            async with mongo_breaker:
+                await self.db[COLLECTION].update_one({"_id": key}, update, upsert=True)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Could not write shared expiry parse cache entry: {e}")
+
+    def start(self, db: Optional[AsyncIOMotorDatabase], min_confidence: float) -> None:
+        """
+        Attach the shared tier and warm the LRU in a background task.
+
+        Args:
+            db: Database holding the shared collection and ``links``, or
+                None to run the LRU alone
+            min_confidence: Grammar confidence at which a phrase is parsed
+                without the LLM; such phrases aren't worth caching
+        """
+        if not self.max_entries or db is None or self._task is not None:
+            return
+        if self.shared:
+            self.db = db
+        self._task = asyncio.create_task(self._warm(db, min_confidence))
+
+    async def _warm(self, db: AsyncIOMotorDatabase, min_confidence: float) -> None:
+        try:
+            await self.warm(db, min_confidence)
+        except Exception as e:
+            logger.error(f"Error warming expiry parse cache: {e}")
+
+    async def warm(self, db: AsyncIOMotorDatabase, min_confidence: float) -> None:
+        """Load the shared collection, then the commonest recent phrases of ``links``."""
+        now = datetime.utcnow()
+        if self.db is not None:
+            docs = await db[COLLECTION].find().sort("updatedAt", -1).limit(self.max_entries).to_list(None)
+            # Oldest first, so the most recently stored end up most recently used
+            for doc in reversed(docs):
+                parsed = _from_doc(doc)
+                if self._elapsed(parsed, now):
+                    continue
+                self._remember(doc['_id'], parsed)
+                self.warmed += 1
+
+        since = now - timedelta(days=self.warm_days)
+        counts = Counter()
+        samples = {}
+        cursor = db.links.find(
+            {"createdAt": {"$gte": since}}, {"_id": 0, "expiryRules": 1, "createdAt": 1}
+        ).sort("createdAt", -1).limit(self.warm_links)
+        async for doc in cursor:
+            raw_input = (doc.get('expiryRules') or {}).get('rawInput')
+            if not raw_input:
+                continue
+            key = normalize_expiry_text(raw_input)
+            counts[key] += 1
+            samples.setdefault(key, doc)
+
+        warmed = 0
+        for key, _ in counts.most_common():
+            if warmed >= self.max_entries:
+                break
+            if key in self._entries:
+                continue
+            doc = samples[key]
+            rules = doc['expiryRules']
+            grammar = parse_expiry_text(rules['rawInput'])
+            if grammar.confidence >= min_confidence:
+                continue
+            parsed = parsed_from_expiry(rules['rawInput'], rules, doc['createdAt'])
+            if parsed is None or self._same_reading(parsed, grammar, doc['createdAt']):
+                # Indistinguishable from the grammar fallback; leave it to the LLM
+                continue
+            if self._elapsed(parsed, now):
+                # A date that has passed ("at 2025-01-31 ..."); serving it would create expired links
+                continue
+            self._entries[key] = parsed
+            self._entries.move_to_end(key, last=False)
+            warmed += 1
+            if self.db is not None:
+                self._write(key, {"$setOnInsert": {**_to_doc(key, parsed), "updatedAt": datetime.utcnow()}})
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.warmed += warmed
+        logger.info(f"Expiry parse cache warmed with {len(self._entries)} phrases")
+
+    @staticmethod
+    def _elapsed(parsed: ParsedExpiry, now: datetime) -> bool:
+        """Whether a parse's time limit would be at or before ``now``."""
+        return bool(parsed.time_rules) and min(at for _, at in parsed.anchored(now)) <= now
+
+    @staticmethod
+    def _same_reading(parsed: ParsedExpiry, grammar: ParsedExpiry, now: datetime) -> bool:
+        if parsed.click_limit != grammar.click_limit or bool(parsed.time_rules) != bool(grammar.time_rules):
+            return False
+        if not parsed.time_rules:
+            return True
+        at = min(at for _, at in parsed.anchored(now))
+        return abs((at - min(at for _, at in grammar.anchored(now))).total_seconds()) <= 60
+
+    async def stop(self) -> None:
+        """Stop warming and wait for shared writes in flight."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "enabled": bool(self.max_entries),
+            "shared": self.db is not None,
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "localHits": self.local_hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "hitRatio": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "warmed": self.warmed,
+            "sharedErrors": self.shared_errors
+        }
+
+
+expiry_parse_cache = ExpiryParseCache()
@@ -0,0 +1,230 @@
+"""
+Write links held by the in-memory fallback back to MongoDB after an outage.
+
+With ``LINK_STORE=fallback``, links created while MongoDB was down, and
+clicks and expiries on them, live only in the fallback engine. The
+reconciler polls that backlog and, whenever MongoDB accepts writes again,
+replays it in unordered ``bulk_write`` batches of upserts:
+
+- the document is created with ``$setOnInsert``, so replays never overwrite it
+- clicks are merged with ``$inc`` of the delta since the last write-back,
+  so clicks counted in MongoDB meanwhile are kept
+- ``expired`` is set with ``$set``, since expiry is terminal
+
+Each batch stamps ``syncSeq.<owner>`` on the documents it writes and only
+matches documents with a lower stamp. Retrying a batch whose outcome is
+unknown (e.g. a timeout) then hits the unique ``shortCode`` index for
+documents it already updated instead of adding their clicks twice.
+A duplicate key for a link id that is not in MongoDB means another node
+issued the same short code during the outage; those links stay in memory
+and are reported as conflicts.
+
+Links written back are dropped from the fallback, which bounds its size.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from services.circuit_breaker import CircuitOpenError
+from services.link_store import FallbackLinkStore
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get('RECONCILE_INTERVAL_SECONDS', '2'))
+RECONCILE_BATCH = int(os.environ.get('RECONCILE_BATCH', '500'))
+
+_DUPLICATE_KEY = 11000
+
+
+def reconcile_filter(short_code: str, link_id: str, owner: str, seq: int) -> dict:
+    """Filter matching a link's document unless this batch (or a later one) already wrote it."""
+    return {"shortCode": short_code, "id": link_id, f"syncSeq.{owner}": {"$not": {"$gte": seq}}}
+
+
+def reconcile_update(link: dict, clicks: int, owner: str, seq: int) -> dict:
+    insert_fields = {k: v for k, v in link.items() if k not in ('_id', 'clicks', 'status')}
+    update = {
+        "$setOnInsert": insert_fields,
+        "$inc": {"clicks": clicks},
+        "$set": {f"syncSeq.{owner}": seq}
+    }
+    if link.get('status') == 'expired':
+        update["$set"]["status"] = 'expired'
+    else:
+        insert_fields["status"] = link.get('status', 'active')
+    return update
+
+
+class OutageReconciler:
+    """Background write-back of the fallback engine's backlog; see the module docstring."""
+
+    def __init__(self, interval: float = RECONCILE_INTERVAL_SECONDS, batch_size: int = RECONCILE_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.owner = uuid.uuid4().hex
+        self._store: Optional[FallbackLinkStore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._seq = 0
+        # Clicks already written back for links still held in memory
+        self._synced: Dict[str, int] = {}
+        # Batch whose outcome is unknown; retried with the same sequence number
+        self._retry: Optional[Tuple[int, List[Tuple[dict, int]]]] = None
+        self.conflicts: Set[str] = set()
+        self.batches = 0
+        self.failed_batches = 0
+        self.synced_links = 0
+        self.synced_clicks = 0
+        self.last_batch_ms = 0.0
+        self.links_per_second = 0.0
+        self.last_error: Optional[str] = None
+
+    def _pending(self) -> List[str]:
+        return [code for code in self._store.fallback.links.codes() if code not in self.conflicts]
+
+    def _next_batch(self) -> Optional[Tuple[int, List[Tuple[dict, int]]]]:
+        if self._retry is not None:
+            return self._retry
+        links = self._store.fallback.links
+        items = []
+        for code in self._pending()[:self.batch_size]:
+            link = links.get(code)
+            items.append((link, link.get('clicks', 0) - self._synced.get(code, 0)))
+        if not items:
+            return None
+        self._seq += 1
+        return self._seq, items
+
+    async def _resolve_duplicates(self, items: List[Tuple[dict, int]]) -> Set[str]:
+        """Split duplicate-key failures into already-applied links and code conflicts; returns the applied ids."""
+        ids = [link['id'] for link, _ in items]
+        async with self._store.primary.breaker:
+            return {
+                doc['id'] async for doc in self._store.db.links.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})
+            }
+
+    async def run_once(self) -> int:
+        """
+        Write back one batch.
+
+        Returns:
+            Number of links written back (0 when idle or MongoDB is down)
+        """
+        batch = self._next_batch()
+        if batch is None:
+            return 0
+        seq, items = batch
+        operations = [
+            UpdateOne(
+                reconcile_filter(link['shortCode'], link['id'], self.owner, seq),
+                reconcile_update(link, clicks, self.owner, seq),
+                upsert=True
+            )
+            for link, clicks in items
+        ]
+        started = time.perf_counter()
+        failed: List[Tuple[dict, int]] = []
+        duplicates: List[Tuple[dict, int]] = []
+        try:
+            async with self._store.primary.breaker:
+                try:
+                    await self._store.db.links.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details.get('writeErrors', []):
+                        item = items[error['index']]
+                        (duplicates if error.get('code') == _DUPLICATE_KEY else failed).append(item)
+            if duplicates:
+                applied = await self._resolve_duplicates(duplicates)
+                for link, _ in duplicates:
+                    if link['id'] not in applied:
+                        self.conflicts.add(link['shortCode'])
+                        logger.error(
+                            f"Short code {link['shortCode']} was issued to another link during the outage; "
+                            f"link {link['id']} stays in memory"
+                        )
+        except Exception as e:
+            self._retry = (seq, items)
+            self.failed_batches += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            if not isinstance(e, CircuitOpenError):
+                logger.warning(f"Reconciliation batch failed, will retry: {e}")
+            return 0
+
+        self._retry = (seq, failed) if failed else None
+        if failed:
+            self.failed_batches += 1
+        written = 0
+        fallback = self._store.fallback
+        failed_codes = {link['shortCode'] for link, _ in failed}
+        for link, clicks in items:
+            code = link['shortCode']
+            if code in failed_codes or code in self.conflicts:
+                continue
+            written += 1
+            self.synced_clicks += clicks
+            if fallback.links.state(code) == (link.get('clicks', 0), link.get('status', 'active')):
+                fallback.discard(code)
+                self._synced.pop(code, None)
+            else:
+                # Changed while the batch was in flight; the difference goes out next round
+                self._synced[code] = link.get('clicks', 0)
+        self.batches += 1
+        self.synced_links += written
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+        if self.last_batch_ms:
+            self.links_per_second = written / (self.last_batch_ms / 1000)
+        logger.info(f"Reconciled {written} links into MongoDB ({len(self._pending())} left)")
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                written = await self.run_once()
+            except Exception as e:
+                logger.error(f"Error reconciling fallback links: {e}")
+                written = 0
+            # Keep going while catching up; otherwise poll
+            await asyncio.sleep(0 if written else self.interval)
+
+    def start(self, store: FallbackLinkStore) -> None:
+        if self._task is None:
+            self._store = store
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        pending = self._pending() if self._store is not None else []
+        backlog_clicks = 0
+        for code in pending:
+            backlog_clicks += self._store.fallback.links.state(code)[0] - self._synced.get(code, 0)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "backlogLinks": len(pending),
+            "backlogClicks": backlog_clicks,
+            "conflicts": len(self.conflicts),
+            "batches": self.batches,
+            "failedBatches": self.failed_batches,
+            "syncedLinks": self.synced_links,
+            "syncedClicks": self.synced_clicks,
+            "lastBatchMs": self.last_batch_ms,
+            "linksPerSecond": self.links_per_second,
+            "estimatedCatchUpSeconds": len(pending) / self.links_per_second if self.links_per_second else None,
+            "lastError": self.last_error
+        }
+
+
+reconciler = OutageReconciler()
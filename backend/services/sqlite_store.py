@@ -0,0 +1,275 @@
+"""
+SQLite link storage engine for single-node deployments (``LINK_STORE=sqlite``).
+
+The database runs in WAL mode so reads never wait for the writer. All
+writes go through one dedicated thread that owns the write connection:
+queued operations are drained in batches and each batch commits as one
+transaction, with a savepoint per operation so one failing write does
+not roll back its neighbours. Reads run on a small thread pool with one
+connection per thread. The event loop only ever awaits futures.
+
+Click and time limits are evaluated in SQL against the precomputed
+``click_limit`` and ``expires_at_epoch`` columns, inside the writer, so
+clicks are atomic without any locking in Python.
+"""
+import os
+import queue
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from bson import json_util
+from dotenv import load_dotenv
+from services.link_store import DuplicateLinkError, LinkStore
+from utils.expiry_fields import link_expires_at, link_click_limit
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'links.db')
+SQLITE_WRITE_BATCH = int(os.environ.get('SQLITE_WRITE_BATCH', '256'))
+SQLITE_READ_THREADS = int(os.environ.get('SQLITE_READ_THREADS', '4'))
+# NORMAL is durable across application crashes in WAL mode; FULL also survives power loss
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    short_code TEXT PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    click_limit INTEGER,
+    expires_at_epoch INTEGER,
+    doc TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_due ON links (status, expires_at_epoch);
+"""
+
+# Mirrors CompiledExpiry.is_expired for the click and time limit rules
+_CLICKABLE = (
+    "status != 'expired'"
+    " AND (click_limit IS NULL OR clicks < click_limit)"
+    " AND (expires_at_epoch IS NULL OR expires_at_epoch > ?)"
+)
+
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=False)
+
+_STOP = object()
+
+
+def _encode(link: dict) -> str:
+    # clicks and status live in their own columns so updates never rewrite the document
+    return json_util.dumps(
+        {k: v for k, v in link.items() if k not in ('_id', 'clicks', 'status')},
+        json_options=_JSON_OPTIONS
+    )
+
+
+def _decode(row: tuple) -> dict:
+    doc, clicks, status = row
+    link = json_util.loads(doc, json_options=_JSON_OPTIONS)
+    link['clicks'] = clicks
+    link['status'] = status
+    return link
+
+
+class SqliteLinkStore(LinkStore):
+    """Links in a local SQLite database (WAL mode, single writer thread)."""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str = SQLITE_PATH,
+        write_batch: int = SQLITE_WRITE_BATCH,
+        read_threads: int = SQLITE_READ_THREADS,
+        synchronous: str = SQLITE_SYNCHRONOUS
+    ):
+        self.path = path
+        self.write_batch = write_batch
+        self.synchronous = synchronous
+        self._writes: queue.Queue = queue.Queue()
+        self._local = threading.local()
+        self._readers = ThreadPoolExecutor(max_workers=read_threads, thread_name_prefix="sqlite-read")
+        self._reader_connections: List[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+        self.transactions = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.max_batch = 0
+
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, args=(connection,), name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are managed explicitly with BEGIN/COMMIT
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    # Writer thread
+
+    def _write_loop(self, connection: sqlite3.Connection) -> None:
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.write_batch:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._commit_batch(connection, batch)
+            if stop:
+                connection.close()
+                return
+
+    def _commit_batch(self, connection: sqlite3.Connection, batch: list) -> None:
+        results = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for op, loop, future in batch:
+                connection.execute("SAVEPOINT op")
+                try:
+                    results.append((loop, future, op(connection), None))
+                    connection.execute("RELEASE op")
+                except Exception as e:
+                    connection.execute("ROLLBACK TO op")
+                    connection.execute("RELEASE op")
+                    results.append((loop, future, None, e))
+            connection.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"SQLite write transaction failed: {e}")
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            results = [(loop, future, None, e) for _, loop, future in batch]
+        self.transactions += 1
+        self.writes += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        for loop, future, result, error in results:
+            if error is not None:
+                self.failed_writes += 1
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    async def _write(self, op: Callable[[sqlite3.Connection], object]):
+        # op must not return a cursor: it would be freed on the event loop thread,
+        # resetting its statement while the writer thread uses the connection
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((op, loop, future))
+        return await future
+
+    # Readers
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._reader_lock:
+                self._reader_connections.append(connection)
+        return connection
+
+    async def _read(self, sql: str, params: tuple) -> list:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._readers, lambda: self._reader().execute(sql, params).fetchall()
+        )
+
+    # LinkStore
+
+    async def insert(self, link: dict) -> None:
+        row = (
+            link['shortCode'], link['id'], link.get('clicks', 0), link.get('status', 'active'),
+            link_click_limit(link), link_expires_at(link), _encode(link)
+        )
+        try:
+            await self._write(lambda c: c.execute(
+                "INSERT INTO links (short_code, id, clicks, status, click_limit, expires_at_epoch, doc)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", row
+            ).rowcount)
+        except sqlite3.IntegrityError as e:
+            raise DuplicateLinkError(str(e)) from e
+
+    async def get_by_code(self, short_code: str) -> Optional[dict]:
+        rows = await self._read("SELECT doc, clicks, status FROM links WHERE short_code = ?", (short_code,))
+        return _decode(rows[0]) if rows else None
+
+    async def get_by_id(self, link_id: str) -> Optional[dict]:
+        rows = await self._read("SELECT doc, clicks, status FROM links WHERE id = ?", (link_id,))
+        return _decode(rows[0]) if rows else None
+
+    async def existing_codes(self, short_codes: Iterable[str]) -> Set[str]:
+        short_codes = list(short_codes)
+        if not short_codes:
+            return set()
+        placeholders = ', '.join('?' * len(short_codes))
+        rows = await self._read(f"SELECT short_code FROM links WHERE short_code IN ({placeholders})", tuple(short_codes))
+        return {row[0] for row in rows}
+
+    async def click(self, short_code: str, now: float) -> Tuple[Optional[dict], bool]:
+        def op(c: sqlite3.Connection):
+            counted = c.execute(
+                f"UPDATE links SET clicks = clicks + 1 WHERE short_code = ? AND {_CLICKABLE}", (short_code, now)
+            ).rowcount == 1
+            if not counted:
+                c.execute("UPDATE links SET status = 'expired' WHERE short_code = ?", (short_code,))
+            row = c.execute("SELECT doc, clicks, status FROM links WHERE short_code = ?", (short_code,)).fetchone()
+            return row, counted
+
+        row, counted = await self._write(op)
+        return (_decode(row) if row else None), counted
+
+    async def mark_expired(self, short_code: str) -> None:
+        await self._write(lambda c: c.execute(
+            "UPDATE links SET status = 'expired' WHERE short_code = ?", (short_code,)
+        ).rowcount)
+
+    async def add_clicks(self, increments: Dict[str, int]) -> Dict[str, int]:
+        params = [(clicks, code) for code, clicks in increments.items()]
+        await self._write(lambda c: c.executemany(
+            "UPDATE links SET clicks = clicks + ? WHERE short_code = ?", params
+        ).rowcount)
+        return {}
+
+    async def expire_due(self, now: float) -> int:
+        return await self._write(lambda c: c.execute(
+            "UPDATE links SET status = 'expired' WHERE status = 'active' AND expires_at_epoch <= ?", (now,)
+        ).rowcount)
+
+    async def close(self) -> None:
+        """Commit queued writes, then stop the writer thread and close every connection."""
+        self._writes.put(_STOP)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        self._readers.shutdown(wait=True)
+        with self._reader_lock:
+            for connection in self._reader_connections:
+                connection.close()
+            self._reader_connections.clear()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "path": self.path,
+            "queuedWrites": self._writes.qsize(),
+            "writes": self.writes,
+            "failedWrites": self.failed_writes,
+            "transactions": self.transactions,
+            "avgWritesPerTransaction": self.writes / self.transactions if self.transactions else 0.0,
+            "maxWritesPerTransaction": self.max_batch
+        }
+
+
+def _resolve(future: asyncio.Future, result, error: Optional[BaseException]) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
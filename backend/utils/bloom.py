@@ -0,0 +1,60 @@
+import math
+import hashlib
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized from the expected number of items and the target false-positive
+    rate; positions come from double hashing a single 128-bit BLAKE2b
+    digest, so each add or lookup hashes the key once.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def estimated_error_rate(self) -> float:
+        """False-positive rate expected at the current fill level."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def memory_report(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "numBits": self.num_bits,
+            "numHashes": self.num_hashes,
+            "bytes": len(self._bits),
+            "bitsPerItem": self.num_bits / self.capacity,
+            "targetErrorRate": self.error_rate,
+            "estimatedErrorRate": self.estimated_error_rate()
+        }
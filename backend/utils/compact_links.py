@@ -0,0 +1,620 @@
+"""
+Column-oriented, memory-bounded table of link documents.
+
+A link dict costs about 1 KB of Python objects. Here each link is a row
+number into typed arrays: integers and timestamps live unboxed in
+``array`` columns, the short code and URL share one UTF-8 arena, the
+UUID is kept as 16 raw bytes, and the rule summary, type and raw input
+are reference-counted entries in a shared string table (the same few
+phrases recur across links). Lookups by short code and by id go through
+open-addressing hash indexes stored in arrays too, so there is no
+per-link Python object at all.
+
+Indexes hash with CRC32 rather than the per-process salted ``hash()``,
+so a pickled table is usable as-is in another process; the journal
+snapshots it that way.
+
+Documents are rebuilt on read. One that does not fit the layout (an
+unexpected field or type) keeps its fields in a side dict instead; only
+clicks and status are always columnar.
+"""
+import re
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from utils.short_code import link_lookup_keys
+from utils.expiry_fields import link_click_limit, link_expires_at
+
+NONE = -(1 << 63)
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_NAIVE = -32768
+
+# Bytes an interned string costs beyond the str object itself: its list slot,
+# reference count and an entry in the index dict, with the dict's spare capacity
+_STRING_OVERHEAD_BYTES = 100
+
+_RULE_KEYS = {'summary', 'type', 'clickLimit', 'timeLimit', 'rawInput'}
+# '_id' is MongoDB's; a failed insert_one leaves it on the dict, and it is not kept
+_LINK_KEYS = {
+    '_id', 'id', 'shortCode', 'originalUrl', 'expiryRules', 'clicks', 'status', 'createdAt',
+    'expiresAtEpoch', 'clickLimit', 'shortCodeKey', 'idKey'
+}
+_STATUSES = ('active', 'expired')
+_UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z')
+
+# Flag bits
+_EXPIRED = 1
+_LOOKUP_KEYS = 2
+_FREE = 4
+
+
+class MemoryFullError(Exception):
+    """Raised when a link cannot be stored within the memory cap."""
+
+
+def _micros(value: datetime) -> Tuple[int, int]:
+    if value.tzinfo is None:
+        return (value - _EPOCH) // _MICROSECOND, _NAIVE
+    return (value - _EPOCH_UTC) // _MICROSECOND, int(value.utcoffset() // timedelta(minutes=1))
+
+
+def _datetime(micros: int, offset: int) -> datetime:
+    if offset == _NAIVE:
+        return _EPOCH + micros * _MICROSECOND
+    return (_EPOCH_UTC + micros * _MICROSECOND).astimezone(timezone(timedelta(minutes=offset)))
+
+
+def _is_datetime(value) -> bool:
+    return isinstance(value, datetime) and (value.tzinfo is None or isinstance(value.tzinfo, timezone))
+
+
+def _optional_int(value) -> bool:
+    return value is None or (type(value) is int and value != NONE)
+
+
+def _object_bytes(value) -> int:
+    """Approximate footprint of a side-dict document: its containers plus everything in them."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_object_bytes(key) + _object_bytes(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_object_bytes(item) for item in value)
+    return size
+
+
+def _layout_id(link: dict) -> Optional[bytes]:
+    """
+    The 16-byte id of a link whose every field has a column.
+
+    Returns:
+        The UUID bytes, or None if the document must be stored as a dict
+    """
+    rules = link.get('expiryRules')
+    if not (
+        link.keys() <= _LINK_KEYS
+        and isinstance(rules, dict) and rules.keys() == _RULE_KEYS
+        and all(isinstance(rules[key], str) for key in ('summary', 'type', 'rawInput'))
+        and 'clickLimit' in link and _optional_int(rules['clickLimit']) and rules['clickLimit'] == link['clickLimit']
+        and (rules['timeLimit'] is None or _is_datetime(rules['timeLimit']))
+        and 'expiresAtEpoch' in link and _optional_int(link['expiresAtEpoch'])
+        and isinstance(link.get('originalUrl'), str)
+        and _is_datetime(link.get('createdAt'))
+    ):
+        return None
+    link_id = link.get('id')
+    if not isinstance(link_id, str) or not _UUID.match(link_id):
+        return None
+    if 'shortCodeKey' in link or 'idKey' in link:
+        keys = {key: link[key] for key in ('shortCodeKey', 'idKey') if key in link}
+        if keys != link_lookup_keys(link['shortCode'], link['id']):
+            return None
+    return _id_key(link_id)
+
+
+def _id_key(link_id: str) -> bytes:
+    """The bytes a link id is indexed by: raw UUID bytes for canonical UUIDs."""
+    if _UUID.match(link_id):
+        return bytes.fromhex(link_id.replace('-', ''))
+    return link_id.encode()
+
+
+class _StringTable:
+    """Reference-counted interned strings addressed by index."""
+
+    def __init__(self):
+        self._strings: List[Optional[str]] = []
+        self._refs = array('I')
+        self._index: Dict[str, int] = {}
+        self._free: List[int] = []
+        self.bytes = 0
+
+    def acquire(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            if self._free:
+                index = self._free.pop()
+                self._strings[index] = value
+                self._refs[index] = 0
+            else:
+                index = len(self._strings)
+                self._strings.append(value)
+                self._refs.append(0)
+            self._index[value] = index
+            self.bytes += sys.getsizeof(value) + _STRING_OVERHEAD_BYTES
+        self._refs[index] += 1
+        return index
+
+    def release(self, index: int) -> None:
+        self._refs[index] -= 1
+        if not self._refs[index]:
+            value = self._strings[index]
+            del self._index[value]
+            self._strings[index] = None
+            self._free.append(index)
+            self.bytes -= sys.getsizeof(value) + _STRING_OVERHEAD_BYTES
+
+    def __getitem__(self, index: int) -> str:
+        return self._strings[index]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class _RowIndex:
+    """
+    Open-addressing (linear probing) hash set of row numbers.
+
+    Slots hold only the row; candidates are confirmed by the caller's
+    ``matches``, and ``row_hash`` recomputes a row's hash when resizing.
+    """
+
+    EMPTY = -1
+    DELETED = -2
+
+    def __init__(self, capacity: int = 1024):
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self._mask = capacity - 1
+        self._rows = array('i', [self.EMPTY]) * capacity
+        self._used = 0
+
+    def find(self, key_hash: int, matches: Callable[[int], bool]) -> int:
+        rows, mask = self._rows, self._mask
+        slot = key_hash & mask
+        while True:
+            row = rows[slot]
+            if row == self.EMPTY:
+                return -1
+            if row >= 0 and matches(row):
+                return row
+            slot = (slot + 1) & mask
+
+    def add(self, key_hash: int, row: int, row_hash: Callable[[int], int]) -> None:
+        if (self._used + 1) * 3 > len(self._rows) * 2:
+            self._resize(row_hash)
+        rows, mask = self._rows, self._mask
+        slot = key_hash & mask
+        while rows[slot] >= 0:
+            slot = (slot + 1) & mask
+        if rows[slot] == self.EMPTY:
+            self._used += 1
+        rows[slot] = row
+
+    def remove(self, key_hash: int, row: int) -> None:
+        rows, mask = self._rows, self._mask
+        slot = key_hash & mask
+        while rows[slot] != self.EMPTY:
+            if rows[slot] == row:
+                rows[slot] = self.DELETED
+                return
+            slot = (slot + 1) & mask
+
+    def _resize(self, row_hash: Callable[[int], int]) -> None:
+        live = [row for row in self._rows if row >= 0]
+        # Rebuild at most half full; this also drops tombstones
+        capacity = 1024
+        while capacity < (len(live) + 1) * 2:
+            capacity *= 2
+        self._allocate(capacity)
+        rows, mask = self._rows, self._mask
+        for row in live:
+            slot = row_hash(row) & mask
+            while rows[slot] != self.EMPTY:
+                slot = (slot + 1) & mask
+            rows[slot] = row
+        self._used = len(live)
+
+    @property
+    def bytes(self) -> int:
+        return len(self._rows) * self._rows.itemsize
+
+
+class CompactLinkTable:
+    """
+    Link documents in columns, keyed by short code and by id.
+
+    ``max_bytes`` caps the allocated footprint: once reached, new rows
+    reuse the slots of evicted ones. Expired links are evicted first;
+    then either the oldest links (``eviction="oldest"``) or nothing, in
+    which case ``put`` raises ``MemoryFullError`` (``eviction="reject"``).
+    """
+
+    def __init__(self, max_bytes: int = 0, eviction: str = 'reject'):
+        if eviction not in ('oldest', 'reject'):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._arena = bytearray()
+        self._garbage = 0
+        self._offset = array('q')
+        self._code_length = array('B')
+        self._url_length = array('I')
+        self._id = bytearray()
+        self._clicks = array('q')
+        self._click_limit = array('q')
+        self._expires_at = array('q')
+        self._time_limit = array('q')
+        self._time_limit_offset = array('h')
+        self._created_at = array('q')
+        self._created_at_offset = array('h')
+        self._summary = array('I')
+        self._type = array('I')
+        self._raw_input = array('I')
+        self._flags = bytearray()
+        self._strings = _StringTable()
+        self._by_code = _RowIndex()
+        self._by_id = _RowIndex()
+        self._documents: Dict[int, dict] = {}
+        self._document_sizes: Dict[int, int] = {}
+        self._document_bytes = 0
+        self._free: List[int] = []
+        self._count = 0
+        self.evicted_expired = 0
+        self.evicted_oldest = 0
+        self.rejected = 0
+
+    # Row access
+
+    def _code_hash(self, row: int) -> int:
+        offset = self._offset[row]
+        return zlib.crc32(self._arena[offset:offset + self._code_length[row]])
+
+    def _row_id_key(self, row: int) -> bytes:
+        document = self._documents.get(row)
+        if document is not None:
+            return _id_key(document['id'])
+        return bytes(self._id[row * 16:row * 16 + 16])
+
+    def _id_hash(self, row: int) -> int:
+        return zlib.crc32(self._row_id_key(row))
+
+    def _code(self, row: int) -> str:
+        offset = self._offset[row]
+        return self._arena[offset:offset + self._code_length[row]].decode()
+
+    def _link_id(self, row: int) -> str:
+        document = self._documents.get(row)
+        if document is not None:
+            return document['id']
+        digits = self._id[row * 16:row * 16 + 16].hex()
+        return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+    def _find(self, short_code: str) -> int:
+        encoded = short_code.encode()
+        length = len(encoded)
+
+        def matches(row: int) -> bool:
+            offset = self._offset[row]
+            return self._code_length[row] == length and self._arena[offset:offset + length] == encoded
+
+        return self._by_code.find(zlib.crc32(encoded), matches)
+
+    def _find_id(self, link_id: str) -> int:
+        key = _id_key(link_id)
+        return self._by_id.find(zlib.crc32(key), lambda row: self._row_id_key(row) == key)
+
+    def _document(self, row: int) -> dict:
+        flags = self._flags[row]
+        status = 'expired' if flags & _EXPIRED else 'active'
+        document = self._documents.get(row)
+        if document is not None:
+            return {**document, "clicks": self._clicks[row], "status": status}
+        short_code = self._code(row)
+        link_id = self._link_id(row)
+        offset = self._offset[row] + self._code_length[row]
+        click_limit = self._click_limit[row]
+        click_limit = None if click_limit == NONE else click_limit
+        expires_at = self._expires_at[row]
+        time_limit = self._time_limit[row]
+        link = {
+            "id": link_id,
+            "shortCode": short_code,
+            "originalUrl": self._arena[offset:offset + self._url_length[row]].decode(),
+            "expiryRules": {
+                "summary": self._strings[self._summary[row]],
+                "type": self._strings[self._type[row]],
+                "clickLimit": click_limit,
+                "timeLimit": None if time_limit == NONE else _datetime(time_limit, self._time_limit_offset[row]),
+                "rawInput": self._strings[self._raw_input[row]]
+            },
+            "clicks": self._clicks[row],
+            "status": status,
+            "createdAt": _datetime(self._created_at[row], self._created_at_offset[row]),
+            "expiresAtEpoch": None if expires_at == NONE else expires_at,
+            "clickLimit": click_limit
+        }
+        if flags & _LOOKUP_KEYS:
+            link.update(link_lookup_keys(short_code, link_id))
+        return link
+
+    # Reads
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, short_code: str) -> bool:
+        return self._find(short_code) >= 0
+
+    def get(self, short_code: str) -> Optional[dict]:
+        row = self._find(short_code)
+        return self._document(row) if row >= 0 else None
+
+    def get_by_id(self, link_id: str) -> Optional[dict]:
+        row = self._find_id(link_id)
+        return self._document(row) if row >= 0 else None
+
+    def codes(self) -> Iterator[str]:
+        """Short codes in row order; safe to modify the table while iterating."""
+        for row in range(len(self._flags)):
+            if not self._flags[row] & _FREE:
+                yield self._code(row)
+
+    def state(self, short_code: str) -> Optional[Tuple[int, str]]:
+        """(clicks, status) without rebuilding the document."""
+        row = self._find(short_code)
+        if row < 0:
+            return None
+        return self._clicks[row], 'expired' if self._flags[row] & _EXPIRED else 'active'
+
+    def items(self) -> Iterator[Tuple[str, int, str, Optional[int]]]:
+        """(short code, clicks, status, expiresAtEpoch) for every link."""
+        for row in range(len(self._flags)):
+            flags = self._flags[row]
+            if not flags & _FREE:
+                expires_at = self._expires_at[row]
+                yield (
+                    self._code(row), self._clicks[row], 'expired' if flags & _EXPIRED else 'active',
+                    None if expires_at == NONE else expires_at
+                )
+
+    # Writes
+
+    def add_clicks(self, short_code: str, clicks: int) -> bool:
+        row = self._find(short_code)
+        if row < 0:
+            return False
+        self._clicks[row] += clicks
+        return True
+
+    def click(self, short_code: str, now: float) -> Optional[bool]:
+        """
+        Count one click if the link is active and within its click and time
+        limits, in a single step like the conditional update of the other
+        engines.
+
+        Returns:
+            True if counted, False if the link may not be clicked, None if
+            it is unknown
+        """
+        row = self._find(short_code)
+        if row < 0:
+            return None
+        click_limit = self._click_limit[row]
+        expires_at = self._expires_at[row]
+        if (
+            self._flags[row] & _EXPIRED
+            or (click_limit != NONE and self._clicks[row] >= click_limit)
+            or (expires_at != NONE and expires_at <= now)
+        ):
+            return False
+        self._clicks[row] += 1
+        return True
+
+    def set_expired(self, short_code: str) -> bool:
+        """Mark a link expired; False if it is unknown or already expired."""
+        row = self._find(short_code)
+        if row < 0 or self._flags[row] & _EXPIRED:
+            return False
+        self._flags[row] |= _EXPIRED
+        return True
+
+    def put(self, link: dict) -> List[str]:
+        """
+        Store a link, replacing any link with the same short code.
+
+        Returns:
+            Short codes evicted to make room
+
+        Raises:
+            MemoryFullError: The cap is reached and nothing may be evicted
+        """
+        if link.get('status', 'active') not in _STATUSES:
+            raise ValueError(f"Unsupported link status: {link.get('status')}")
+        self.delete(link['shortCode'])
+        evicted = []
+        if self.max_bytes and self.memory_bytes() >= self.max_bytes:
+            # Reclaim the arena space of deleted links before evicting more of them
+            if self._garbage * 8 > len(self._arena):
+                self._compact_arena()
+            if not self._free and self.memory_bytes() >= self.max_bytes:
+                evicted = self._make_room()
+        row = self._free.pop() if self._free else self._append_row()
+        self._fill(row, link)
+        self._count += 1
+        if self._garbage > len(self._arena) // 2 and self._garbage > 1 << 20:
+            self._compact_arena()
+        return evicted
+
+    def delete(self, short_code: str) -> bool:
+        row = self._find(short_code)
+        if row < 0:
+            return False
+        self._clear(row, short_code)
+        return True
+
+    def _append_row(self) -> int:
+        row = len(self._flags)
+        for column in (
+            self._offset, self._clicks, self._click_limit, self._expires_at, self._time_limit,
+            self._created_at
+        ):
+            column.append(0)
+        for column in (self._code_length, self._url_length, self._time_limit_offset,
+                       self._created_at_offset, self._summary, self._type, self._raw_input):
+            column.append(0)
+        self._id += bytes(16)
+        self._flags.append(_FREE)
+        return row
+
+    def _fill(self, row: int, link: dict) -> None:
+        short_code = link['shortCode']
+        encoded_code = short_code.encode()
+        status = link.get('status', 'active')
+        self._clicks[row] = link.get('clicks', 0)
+        flags = _EXPIRED if status == 'expired' else 0
+        self._code_length[row] = len(encoded_code)
+        self._offset[row] = len(self._arena)
+        id_bytes = _layout_id(link)
+        if id_bytes is not None:
+            encoded_url = link['originalUrl'].encode()
+            self._arena += encoded_code + encoded_url
+            self._url_length[row] = len(encoded_url)
+            self._id[row * 16:row * 16 + 16] = id_bytes
+            rules = link['expiryRules']
+            click_limit = link['clickLimit']
+            self._click_limit[row] = NONE if click_limit is None else click_limit
+            expires_at = link['expiresAtEpoch']
+            self._expires_at[row] = NONE if expires_at is None else expires_at
+            if rules['timeLimit'] is None:
+                self._time_limit[row] = NONE
+            else:
+                self._time_limit[row], self._time_limit_offset[row] = _micros(rules['timeLimit'])
+            self._created_at[row], self._created_at_offset[row] = _micros(link['createdAt'])
+            self._summary[row] = self._strings.acquire(rules['summary'])
+            self._type[row] = self._strings.acquire(rules['type'])
+            self._raw_input[row] = self._strings.acquire(rules['rawInput'])
+            if 'shortCodeKey' in link or 'idKey' in link:
+                flags |= _LOOKUP_KEYS
+        else:
+            self._arena += encoded_code
+            self._url_length[row] = 0
+            document = {k: v for k, v in link.items() if k not in ('clicks', 'status', '_id')}
+            self._documents[row] = document
+            self._document_sizes[row] = _object_bytes(document)
+            self._document_bytes += self._document_sizes[row]
+            # Limits derived like the other engines do, so click() needs no document
+            try:
+                click_limit, expires_at = link_click_limit(link), link_expires_at(link)
+            except (AttributeError, TypeError, ValueError):
+                click_limit = expires_at = None
+            self._click_limit[row] = click_limit if _optional_int(click_limit) and click_limit is not None else NONE
+            self._expires_at[row] = expires_at if _optional_int(expires_at) and expires_at is not None else NONE
+            created_at = link.get('createdAt')
+            self._created_at[row] = _micros(created_at)[0] if _is_datetime(created_at) else 0
+        self._flags[row] = flags
+        self._by_code.add(zlib.crc32(encoded_code), row, self._code_hash)
+        self._by_id.add(self._id_hash(row), row, self._id_hash)
+
+    def _clear(self, row: int, short_code: str) -> None:
+        self._by_code.remove(zlib.crc32(short_code.encode()), row)
+        self._by_id.remove(self._id_hash(row), row)
+        self._garbage += self._code_length[row] + self._url_length[row]
+        if self._documents.pop(row, None) is not None:
+            self._document_bytes -= self._document_sizes.pop(row)
+        else:
+            self._strings.release(self._summary[row])
+            self._strings.release(self._type[row])
+            self._strings.release(self._raw_input[row])
+        self._flags[row] = _FREE
+        self._free.append(row)
+        self._count -= 1
+
+    def _make_room(self) -> List[str]:
+        """Free about 1% of the rows, expired ones first."""
+        target = max(1, self._count // 100)
+        flags = self._flags
+        victims = []
+        for row in range(len(flags)):
+            if flags[row] & _EXPIRED:
+                victims.append(row)
+                if len(victims) == target:
+                    break
+        self.evicted_expired += len(victims)
+        if len(victims) < target and self.eviction == 'oldest':
+            chosen = set(victims)
+            live = [
+                (self._created_at[row], row) for row in range(len(self._flags))
+                if not self._flags[row] & _FREE and row not in chosen
+            ]
+            live.sort()
+            oldest = [row for _, row in live[:target - len(victims)]]
+            self.evicted_oldest += len(oldest)
+            victims.extend(oldest)
+        if not victims:
+            self.rejected += 1
+            raise MemoryFullError(f"In-memory link store is full ({self.max_bytes} bytes)")
+        evicted = []
+        for row in victims:
+            short_code = self._code(row)
+            self._clear(row, short_code)
+            evicted.append(short_code)
+        return evicted
+
+    def _compact_arena(self) -> None:
+        arena = bytearray()
+        for row in range(len(self._flags)):
+            if self._flags[row] & _FREE:
+                continue
+            offset = self._offset[row]
+            self._offset[row] = len(arena)
+            arena += self._arena[offset:offset + self._code_length[row] + self._url_length[row]]
+        self._arena = arena
+        self._garbage = 0
+
+    # Accounting
+
+    def memory_bytes(self) -> int:
+        """Allocated footprint of the table, side-dict documents included."""
+        columns = (
+            self._offset, self._code_length, self._url_length, self._clicks, self._click_limit,
+            self._expires_at, self._time_limit, self._time_limit_offset, self._created_at,
+            self._created_at_offset, self._summary, self._type, self._raw_input
+        )
+        return (
+            sum(len(column) * column.itemsize for column in columns)
+            + len(self._arena) + len(self._id) + len(self._flags)
+            + self._strings.bytes + self._by_code.bytes + self._by_id.bytes
+            + len(self._free) * 8
+            + self._document_bytes + sys.getsizeof(self._documents)
+        )
+
+    def stats(self) -> dict:
+        memory = self.memory_bytes()
+        return {
+            "links": self._count,
+            "documentLinks": len(self._documents),
+            "internedStrings": len(self._strings),
+            "memoryBytes": memory,
+            "bytesPerLink": memory / self._count if self._count else 0.0,
+            "maxBytes": self.max_bytes,
+            "eviction": self.eviction,
+            "evictedExpired": self.evicted_expired,
+            "evictedOldest": self.evicted_oldest,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+
+def to_utc_datetime(value: Union[datetime, str, None]) -> Optional[datetime]:
+    """
+    Normalize a stored time limit to a timezone-aware UTC datetime.
+
+    Args:
+        value: A datetime (naive values are treated as UTC), an ISO 8601
+            string (optionally ending in 'Z') or None
+
+    Returns:
+        Aware UTC datetime, or None if no value was given
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,46 @@
+import math
+from typing import Optional
+from utils.dates import to_utc_datetime
+
+
+def normalize_expiry_fields(expiry_rules: Optional[dict]) -> dict:
+    """
+    Precompute the numeric expiry fields stored at the top level of a link.
+
+    ``expiresAtEpoch`` is the time limit as integer Unix seconds, rounded
+    up so a link never expires before its ``timeLimit``, and ``clickLimit``
+    the click limit as an int; either is None when the rule has no such
+    limit. Hot paths compare these directly instead of
+    re-parsing ``expiryRules.timeLimit`` on every request.
+
+    Args:
+        expiry_rules: The link's ``expiryRules`` dict
+
+    Returns:
+        Dictionary with ``expiresAtEpoch`` and ``clickLimit``
+    """
+    expiry_rules = expiry_rules or {}
+    time_limit = to_utc_datetime(expiry_rules.get('timeLimit'))
+    click_limit = expiry_rules.get('clickLimit')
+    try:
+        click_limit = int(click_limit) if click_limit is not None else None
+    except (TypeError, ValueError):
+        click_limit = None
+    return {
+        "expiresAtEpoch": math.ceil(time_limit.timestamp()) if time_limit is not None else None,
+        "clickLimit": click_limit
+    }
+
+
+def link_expires_at(link: dict) -> Optional[int]:
+    """Expiry time of a link in Unix seconds, derived on the fly for unmigrated documents."""
+    if 'expiresAtEpoch' in link:
+        return link['expiresAtEpoch']
+    return normalize_expiry_fields(link.get('expiryRules'))['expiresAtEpoch']
+
+
+def link_click_limit(link: dict) -> Optional[int]:
+    """Click limit of a link, derived on the fly for unmigrated documents."""
+    if 'expiresAtEpoch' in link:
+        return link.get('clickLimit')
+    return normalize_expiry_fields(link.get('expiryRules'))['clickLimit']
@@ -0,0 +1,625 @@
+"""
+Deterministic expiry phrase parser.
+
+A phrase is tokenized in one pass by a single compiled pattern, then
+read left to right against a small grammar of expiry clauses:
+
+    rule   := clause (("or" | "and" | ",") clause)*
+    clause := count CLICK                      "3 clicks", "5 times", "twice"
+            | count DURATION (count DURATION)*  "24 hours", "1 hour 30 minutes"
+            | "next" ("week" | "month" | "year")
+            | "end of" ("day" | "week" | "month") | "eod" | "eow" | "eom"
+            | [CLOCK] DAY [["at"] CLOCK]      "tomorrow", "friday at 5pm"
+            | CLOCK                            "5pm", "17:30", "noon"
+
+where DAY is "today", "tomorrow", a weekday or a date ("2025-01-31",
+"1/31", "jan 31st", "31 january 2025"). Words such as "expire",
+"after", "in" or "whichever comes first" are skipped.
+
+Time clauses compile to a relative rule string that ``anchor`` turns
+into a datetime for a given moment, so a parse is independent of when
+it was made:
+
+    "+24h", "+1h30m", "+2mo"   offset from now
+    "day+1 23:59:59"           a day relative to today, at a time
+    "weekday 4 17:00:00"       the next Friday (0 is Monday), at a time
+    "time 17:00:00"            the next occurrence of a time of day
+    "week-end 23:59:59"        the coming Sunday
+    "month-end 23:59:59"       the last day of this month
+    "date 01-31 23:59:59"      the next January 31st
+    "at 2025-01-31 23:59:59"   an absolute moment
+
+Every parse carries a confidence in [0, 1]: the share of the phrase's
+words that the grammar accounted for, lowered for readings that are
+genuinely ambiguous ("next friday", "03/04", "3 clicks and 2 days"), and
+zero for limits too large to store ("10**21 clicks", "in 9999 years"),
+so those go to the LLM.
+
+``parsed_from_expiry`` goes the other way, turning an absolute parse
+(from the LLM, or stored on a link) back into relative rules so it can
+be cached and re-anchored later.
+"""
+import re
+import calendar
+from datetime import MAXYEAR, MINYEAR, datetime, timedelta
+from typing import List, Optional, Tuple
+from utils.dates import to_utc_datetime
+
+# Used when nothing in the phrase is recognized
+DEFAULT_TIME_RULE = "+7d"
+# Rule time for a day given without one
+END_OF_DAY = "23:59:59"
+# Largest click limit the stores hold (an int64 in MongoDB, SQLite and the memory table)
+MAX_CLICK_LIMIT = 2 ** 63 - 1
+# Where a rule beyond the range of datetime is anchored
+LATEST_MOMENT = datetime.max.replace(microsecond=0)
+
+_TOKEN = re.compile(r"""
+    (?P<iso>\d{4}-\d{1,2}-\d{1,2})
+  | (?P<slash>\d{1,2}/\d{1,2}(?:/\d{2,4})?)
+  | (?P<clock>\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?m\.?(?![a-z]))?|\d{1,2}\s*[ap]\.?m\.?(?![a-z]))
+  | (?P<ordinal>\d{1,2}(?:st|nd|rd|th)(?![a-z]))
+  | (?P<number>\d{1,3}(?:,\d{3})+(?!\d)|\d+(?:\.\d+)?)
+  | (?P<word>[a-z]+)
+  | (?P<sep>[,;&+])
+""", re.VERBOSE)
+
+_CLOCK = re.compile(r"(\d{1,2})(?::(\d{2}))?(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?")
+
+_OFFSET_PART = re.compile(r"(\d+)(mo|[smhdwy])")
+
+# Smaller unit and its size, to turn fractional durations into whole ones
+_SMALLER = {'y': ('mo', 12), 'mo': ('d', 30), 'w': ('d', 7), 'd': ('h', 24), 'h': ('m', 60), 'm': ('s', 60)}
+
+# Largest first, the order offset rules list their parts in
+_UNIT_NAMES = {'y': 'year', 'mo': 'month', 'w': 'week', 'd': 'day', 'h': 'hour', 'm': 'minute', 's': 'second'}
+
+_FILLERS = {
+    'expire', 'expires', 'expired', 'expiring', 'expiry', 'expiration', 'link', 'url', 'it', 'the', 'after',
+    'in', 'within', 'for', 'from', 'now', 'until', 'till', 'til', 'before', 'max', 'maximum', 'most', 'up',
+    'to', 'upto', 'only', 'total', 'limit', 'limited', 'whichever', 'whatever', 'comes', 'happens', 'first',
+    'sooner', 'earlier', 'earliest', 'is', 'be', 'should', 'will', 'can', 'may', 'let', 'make', 'keep',
+    'valid', 'active', 'alive', 'live', 'last', 'lasts', 'please', 'me', 'i', 'want', 'allow', 'allowed',
+    'than', 'reached', 'once', 'just', 'about', 'approximately', 'exactly', 'delete', 'disable', 'kill'
+}
+
+_NUMBER_WORDS = [
+    'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten', 'eleven', 'twelve',
+    'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen'
+]
+_TENS = {'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90}
+_UNITS = {
+    's': ('second', 'seconds', 'sec', 'secs'),
+    'm': ('minute', 'minutes', 'min', 'mins', 'm'),
+    'h': ('hour', 'hours', 'hr', 'hrs', 'h'),
+    'd': ('day', 'days', 'd'),
+    'w': ('week', 'weeks', 'wk', 'wks', 'w'),
+    'mo': ('month', 'months', 'mo', 'mos'),
+    'y': ('year', 'years', 'yr', 'yrs', 'y')
+}
+_CLICK_WORDS = ('click', 'clicks', 'time', 'times', 'x', 'visit', 'visits', 'view', 'views', 'use', 'uses',
+                'open', 'opens', 'redirect', 'redirects', 'hit', 'hits', 'access', 'accesses')
+_WEEKDAYS = [
+    ('monday', 'mon'), ('tuesday', 'tue', 'tues'), ('wednesday', 'wed'), ('thursday', 'thu', 'thur', 'thurs'),
+    ('friday', 'fri'), ('saturday', 'sat'), ('sunday', 'sun')
+]
+_MONTHS = [
+    ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'), ('may',), ('june', 'jun'),
+    ('july', 'jul'), ('august', 'aug'), ('september', 'sep', 'sept'), ('october', 'oct'),
+    ('november', 'nov'), ('december', 'dec')
+]
+
+
+def _word_table() -> dict:
+    words = {word: ('filler', None) for word in _FILLERS}
+    words.update({word: ('num', n) for n, word in enumerate(_NUMBER_WORDS)})
+    words.update({word: ('num', n) for word, n in _TENS.items()})
+    words.update({'a': ('num', 1), 'an': ('num', 1), 'single': ('num', 1), 'half': ('num', 0.5),
+                  'couple': ('num', 2), 'hundred': ('hundred', 100), 'thousand': ('hundred', 1000)})
+    words.update({word: ('unit', unit) for unit, names in _UNITS.items() for word in names})
+    words.update({word: ('click', None) for word in _CLICK_WORDS})
+    words.update({'twice': ('clicks', 2), 'thrice': ('clicks', 3)})
+    words.update({word: ('weekday', day) for day, names in enumerate(_WEEKDAYS) for word in names})
+    # "may" stays a filler unless it sits next to a day number
+    words.update({word: ('month', month) for month, names in enumerate(_MONTHS, 1) for word in names})
+    words.update({'today': ('day', 0), 'tonight': ('day', 0), 'tomorrow': ('day', 1), 'tmrw': ('day', 1),
+                  'tmr': ('day', 1), 'tomorow': ('day', 1)})
+    words.update({'noon': ('clock', "12:00:00"), 'midday': ('clock', "12:00:00"), 'midnight': ('clock', END_OF_DAY)})
+    words.update({'eod': ('end', 'day'), 'eow': ('end', 'week'), 'eom': ('end', 'month')})
+    words.update({'next': ('next', None), 'this': ('this', None), 'coming': ('this', None), 'end': ('end', None),
+                  'of': ('of', None), 'or': ('or', None), 'and': ('and', None), 'at': ('at', None),
+                  'by': ('at', None), 'on': ('at', None), 'around': ('at', None)})
+    return words
+
+
+_WORDS = _word_table()
+
+# Tokens that carry no meaning on their own when no clause consumed them
+_NEUTRAL = {'filler', 'at', 'or', 'and', 'sep', 'of', 'this'}
+
+
+class ParsedExpiry:
+    """
+    A grammar reading of an expiry phrase.
+
+    ``click_limit`` is None when the phrase sets no click limit and
+    ``time_rules`` holds the relative time rules (the earliest wins);
+    ``to_expiry`` anchors them and renders the expiry dict.
+    """
+
+    __slots__ = ('click_limit', 'time_rules', 'confidence')
+
+    def __init__(self, click_limit: Optional[int], time_rules: Tuple[str, ...], confidence: float):
+        self.click_limit = click_limit
+        self.time_rules = time_rules
+        self.confidence = confidence
+
+    @property
+    def type(self) -> str:
+        if self.click_limit is not None:
+            return "hybrid" if self.time_rules else "clicks"
+        return "time"
+
+    def to_expiry(self, now: Optional[datetime] = None) -> dict:
+        """
+        Anchor the rules to a moment and build the parsed expiry dict.
+
+        Args:
+            now: Naive UTC moment the rules are relative to (default: now)
+
+        Returns:
+            Dictionary with type, clickLimit, timeLimit (ISO 8601 with a
+            'Z' suffix, or None) and summary
+        """
+        now = (now or datetime.utcnow()).replace(microsecond=0)
+        parts = []
+        if self.click_limit is not None:
+            parts.append(f"after {self.click_limit} click{'s' if self.click_limit != 1 else ''}")
+        time_limit = None
+        for rule, at in self.anchored(now):
+            parts.append(describe(rule, at, now))
+            time_limit = at if time_limit is None else min(time_limit, at)
+        return {
+            "type": self.type,
+            "clickLimit": self.click_limit,
+            "timeLimit": time_limit.isoformat() + 'Z' if time_limit is not None else None,
+            "summary": "Expires " + " or ".join(parts)
+        }
+
+    def anchored(self, now: datetime) -> List[Tuple[str, datetime]]:
+        """
+        (rule, moment) for each time rule. A rule beyond the range of
+        datetime ("in 9999 years") is anchored at ``LATEST_MOMENT``.
+        """
+        moments = []
+        for rule in self.time_rules:
+            try:
+                moments.append((rule, anchor(rule, now)))
+            except OverflowError:
+                moments.append((rule, LATEST_MOMENT))
+        return moments
+
+    def __repr__(self) -> str:
+        return f"ParsedExpiry({self.click_limit!r}, {self.time_rules!r}, {self.confidence:.2f})"
+
+
+def _tokenize(text: str) -> List[tuple]:
+    """(kind, value, word) tokens of a phrase; unrecognized words have kind 'word'."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        kind = match.lastgroup
+        raw = match.group(kind)
+        if kind == 'word':
+            kind, value = _WORDS.get(raw, ('word', None))
+        elif kind == 'number':
+            value = float(raw) if '.' in raw else int(raw.replace(',', ''))
+            kind = 'num'
+        elif kind == 'ordinal':
+            value = int(raw[:-2])
+        elif kind == 'clock':
+            value = _clock_time(raw)
+            if value is None:
+                kind = 'word'
+        elif kind == 'iso':
+            value = tuple(int(part) for part in raw.split('-'))
+        elif kind == 'slash':
+            value = tuple(int(part) for part in raw.split('/'))
+        else:
+            value = None
+        tokens.append((kind, value, raw))
+    return tokens
+
+
+def _clock_time(raw: str) -> Optional[str]:
+    hour, minute, second, meridiem = _CLOCK.match(raw).groups()
+    hour, minute, second = int(hour), int(minute or 0), int(second or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    if hour > 23 or minute > 59 or second > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}:{second:02d}"
+
+
+def _kind(tokens: list, i: int) -> Optional[str]:
+    return tokens[i][0] if i < len(tokens) else None
+
+
+def _count(tokens: list, i: int) -> Optional[Tuple[float, int]]:
+    """A quantity: "3", "twenty four", "a", "half an", "a couple of", "one hundred"."""
+    if _kind(tokens, i) != 'num':
+        return None
+    value, raw = tokens[i][1], tokens[i][2]
+    i += 1
+    if raw in _TENS and _kind(tokens, i) == 'num' and isinstance(tokens[i][1], int) and 0 < tokens[i][1] < 10:
+        value += tokens[i][1]
+        i += 1
+    elif raw in ('a', 'an') and _kind(tokens, i) == 'num' and tokens[i][2] in ('couple', 'half'):
+        value = tokens[i][1]
+        i += 1
+    if raw == 'half' or tokens[i - 1][2] == 'half':
+        if _kind(tokens, i) == 'num' and tokens[i][2] in ('a', 'an'):
+            i += 1
+    if _kind(tokens, i) == 'hundred':
+        value *= tokens[i][1]
+        i += 1
+    if _kind(tokens, i) == 'of':
+        i += 1
+    return value, i
+
+
+def _whole_offset(value: float, unit: str) -> Tuple[int, str, float]:
+    """Express a duration in whole units, stepping down for fractions like 1.5 hours."""
+    certainty = 1.0
+    while value != int(value) and unit in _SMALLER:
+        if unit in ('y', 'mo'):
+            certainty = 0.8
+        unit, size = _SMALLER[unit]
+        value *= size
+    return int(round(value)), unit, certainty
+
+
+def _year(tokens: list, i: int) -> Tuple[Optional[int], int]:
+    j = i + 1 if _kind(tokens, i) == 'sep' else i
+    if _kind(tokens, j) == 'num' and isinstance(tokens[j][1], int) and 1900 <= tokens[j][1] <= 2200:
+        return tokens[j][1], j + 1
+    return None, i
+
+
+def _date_rule(year: Optional[int], month: int, day: int) -> Optional[str]:
+    try:
+        datetime(year or 2000, month, day)
+    except ValueError:
+        return None
+    return f"at {year:04d}-{month:02d}-{day:02d}" if year else f"date {month:02d}-{day:02d}"
+
+
+def _day(tokens: list, i: int) -> Optional[Tuple[str, int, float]]:
+    """A day without a time: (rule prefix, next index, certainty)."""
+    kind, value, raw = tokens[i]
+    if kind == 'day':
+        return f"day+{value}", i + 1, 1.0
+    if raw in ('day', 'days') and _kind(tokens, i + 1) == 'filler' and tokens[i + 1][2] == 'after' \
+            and _kind(tokens, i + 2) == 'day' and tokens[i + 2][1] == 1:
+        return "day+2", i + 3, 1.0
+    if kind == 'next' and _kind(tokens, i + 1) == 'unit' and tokens[i + 1][1] == 'd':
+        return "day+1", i + 2, 1.0
+    if kind in ('next', 'this') and _kind(tokens, i + 1) == 'weekday':
+        # "next friday" is this coming friday to some and the one after to others
+        return f"weekday {tokens[i + 1][1]}", i + 2, 0.6 if kind == 'next' else 1.0
+    if kind == 'weekday':
+        return f"weekday {value}", i + 1, 1.0
+    if kind == 'this' and _kind(tokens, i + 1) == 'unit' and tokens[i + 1][1] in ('w', 'mo'):
+        return "week-end" if tokens[i + 1][1] == 'w' else "month-end", i + 2, 1.0
+    if kind == 'end':
+        if value is None:
+            j = i + 1
+            if _kind(tokens, j) == 'of':
+                j += 1
+            if _kind(tokens, j) == 'filler' and tokens[j][2] == 'the':
+                j += 1
+            if _kind(tokens, j) in ('day', 'this'):
+                if tokens[j][0] == 'day':
+                    return f"day+{tokens[j][1]}", j + 1, 1.0
+                j += 1
+            if _kind(tokens, j) != 'unit' or tokens[j][1] not in ('d', 'w', 'mo'):
+                return None
+            value, i = {'d': 'day', 'w': 'week', 'mo': 'month'}[tokens[j][1]], j
+        return {'day': "day+0", 'week': "week-end", 'month': "month-end"}[value], i + 1, 1.0
+    if kind == 'iso':
+        rule = _date_rule(*value)
+        return (rule, i + 1, 1.0) if rule else None
+    if kind == 'slash':
+        first, second = value[0], value[1]
+        year = value[2] if len(value) > 2 else None
+        if year is not None and year < 100:
+            year += 2000
+        # Month first unless that's impossible; "03/04" could be either
+        certainty = 0.7 if first <= 12 and second <= 12 and first != second else 1.0
+        month, day = (first, second) if first <= 12 else (second, first)
+        rule = _date_rule(year, month, day)
+        return (rule, i + 1, certainty) if rule else None
+    if kind == 'month' and _kind(tokens, i + 1) in ('num', 'ordinal') and isinstance(tokens[i + 1][1], int):
+        year, j = _year(tokens, i + 2)
+        rule = _date_rule(year, value, tokens[i + 1][1])
+        return (rule, j, 1.0) if rule else None
+    if kind in ('num', 'ordinal') and isinstance(value, int):
+        j = i + 2 if _kind(tokens, i + 1) == 'of' else i + 1
+        if _kind(tokens, j) == 'month':
+            year, k = _year(tokens, j + 1)
+            rule = _date_rule(year, tokens[j][1], value)
+            return (rule, k, 1.0) if rule else None
+    return None
+
+
+def _clock(tokens: list, i: int) -> Tuple[Optional[str], int]:
+    """An optional time of day, possibly after "at"/"by"."""
+    j = i + 1 if _kind(tokens, i) == 'at' else i
+    if _kind(tokens, j) == 'clock':
+        return tokens[j][1], j + 1
+    return None, i
+
+
+def _clause(tokens: list, i: int) -> Optional[tuple]:
+    """
+    Match one clause at ``i``.
+
+    Returns:
+        (kind, value, next index, certainty) with kind 'clicks' (value the
+        count), 'offset' (value a list of (n, unit)) or 'rule' (value a
+        rule string), or None
+    """
+    kind = tokens[i][0]
+    if kind == 'clicks':
+        return 'clicks', tokens[i][1], i + 1, 1.0
+
+    day = _day(tokens, i)
+    if day is not None:
+        prefix, j, certainty = day
+        clock, j = _clock(tokens, j)
+        return 'rule', f"{prefix} {clock or END_OF_DAY}", j, certainty
+
+    if kind == 'clock':
+        j = i + 1
+        if _kind(tokens, j) == 'at':
+            j += 1
+        day = _day(tokens, j) if j < len(tokens) else None
+        if day is not None:
+            return 'rule', f"{day[0]} {tokens[i][1]}", day[1], day[2]
+        return 'rule', f"time {tokens[i][1]}", i + 1, 1.0
+
+    if kind == 'next' and _kind(tokens, i + 1) == 'unit' and tokens[i + 1][1] in ('w', 'mo', 'y'):
+        return 'offset', [(1, tokens[i + 1][1])], i + 2, 0.9
+
+    count = _count(tokens, i)
+    if count is None:
+        return None
+    value, j = count
+    if _kind(tokens, j) == 'click':
+        if value != int(value) or value < 1:
+            return None
+        if value > MAX_CLICK_LIMIT:
+            return 'clicks', MAX_CLICK_LIMIT, j + 1, 0.0
+        return 'clicks', int(value), j + 1, 1.0
+    if _kind(tokens, j) == 'unit' and value > 0:
+        n, unit, certainty = _whole_offset(value, tokens[j][1])
+        return 'offset', [(n, unit)], j + 1, certainty
+    return None
+
+
+def parse_expiry_text(text: str) -> ParsedExpiry:
+    """
+    Read an expiry phrase with the grammar.
+
+    Args:
+        text: Natural language expiry, e.g. "5 clicks or by friday 5pm"
+
+    Returns:
+        ParsedExpiry; when nothing was recognized it has the default
+        7-day rule and confidence 0, and a click limit above
+        ``MAX_CLICK_LIMIT`` is capped at it, also with confidence 0
+    """
+    tokens = _tokenize(text)
+    clicks: List[int] = []
+    rules: List = []  # rule strings, or lists of (n, unit) offset parts
+    matched = unknown = 0
+    certainty = 1.0
+    joiner = None
+    i = 0
+    while i < len(tokens):
+        clause = _clause(tokens, i)
+        if clause is None:
+            kind, _, raw = tokens[i]
+            if kind in ('or', 'and', 'sep'):
+                joiner = joiner if joiner == 'or' else kind
+            elif kind == 'click' and raw.endswith('s') and not clicks:
+                # "expire after clicks": a click limit without a number
+                clicks.append(3)
+                certainty *= 0.3
+                matched += 1
+            elif kind not in _NEUTRAL and raw not in _FILLERS:
+                unknown += 1
+            i += 1
+            continue
+
+        kind, value, j, clause_certainty = clause
+        matched += j - i
+        certainty *= clause_certainty
+        if kind == 'offset' and rules and isinstance(rules[-1], list) and joiner != 'or':
+            # "1 hour 30 minutes", "2 days and 3 hours"
+            rules[-1].extend(value)
+        else:
+            if joiner == 'and' and (clicks or rules):
+                # The stored rule means "whichever first"; "and" may mean both
+                certainty *= 0.6
+            if kind == 'clicks':
+                if clicks:
+                    certainty *= 0.5
+                clicks.append(value)
+            else:
+                rules.append(value)
+        joiner = None
+        i = j
+
+    if not clicks and not rules:
+        return ParsedExpiry(None, (DEFAULT_TIME_RULE,), 0.0)
+    time_rules = tuple(rule if isinstance(rule, str) else _offset_rule(rule) for rule in rules)
+    if not all(_in_range(rule, datetime.utcnow()) for rule in time_rules):
+        certainty = 0.0
+    return ParsedExpiry(min(clicks) if clicks else None, time_rules, certainty * matched / (matched + unknown))
+
+
+def _in_range(rule: str, now: datetime) -> bool:
+    try:
+        anchor(rule, now)
+    except OverflowError:
+        return False
+    return True
+
+
+def normalize_expiry_text(text: str) -> str:
+    """Canonical form of a phrase, for cache keys: lowercase tokens joined by single spaces."""
+    return " ".join(match.group() for match in _TOKEN.finditer(text.lower()))
+
+
+def parsed_from_expiry(text: str, expiry: dict, now: datetime) -> Optional[ParsedExpiry]:
+    """
+    Relative rules reproducing an absolute parse made at ``now``.
+
+    The phrase decides how the time limit moves with the clock: phrases
+    naming a date keep it, weekdays stay on that weekday, "tomorrow" or a
+    time of day (or an end-of-day 23:59:59) stay on that day offset, and
+    anything else becomes an offset rounded to the minute.
+
+    Args:
+        text: The phrase that was parsed
+        expiry: Parsed expiry dict (type, clickLimit, timeLimit)
+        now: Naive UTC moment the parse was made at
+
+    Returns:
+        ParsedExpiry with confidence 1, or None if the parse is malformed
+    """
+    try:
+        click_limit = expiry.get('clickLimit')
+        if click_limit is not None:
+            click_limit = int(click_limit)
+            if not 1 <= click_limit <= MAX_CLICK_LIMIT:
+                return None
+        time_limit = to_utc_datetime(expiry.get('timeLimit'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if click_limit is None and time_limit is None:
+        return None
+    time_rules = (_rule_for_time_limit(text, time_limit.replace(tzinfo=None), now),) if time_limit else ()
+    parsed = ParsedExpiry(click_limit, time_rules, 1.0)
+    return parsed if parsed.type == expiry.get('type') else None
+
+
+def _rule_for_time_limit(text: str, time_limit: datetime, now: datetime) -> str:
+    tokens = _tokenize(text)
+    kinds = {kind for kind, _, raw in tokens if raw != 'may'}
+    clock = f"{time_limit:%H:%M:%S}"
+    days = (time_limit.date() - now.date()).days
+    if time_limit <= now or kinds & {'iso', 'slash', 'month'}:
+        return f"at {time_limit:%Y-%m-%d} {clock}"
+    if 'weekday' in kinds:
+        return f"weekday {time_limit.weekday()} {clock}"
+    if clock == END_OF_DAY or kinds & {'clock', 'day'}:
+        return f"day+{days} {clock}"
+    minutes = max(1, round((time_limit - now).total_seconds() / 60))
+    # Hours up to two days ("+24h"), days and hours beyond ("+3d3h")
+    days, minutes = divmod(minutes, 1440) if minutes >= 2880 else (0, minutes)
+    return _offset_rule([(days, 'd'), (minutes // 60, 'h'), (minutes % 60, 'm')])
+
+
+def _offset_rule(parts: List[Tuple[int, str]]) -> str:
+    totals = {}
+    for n, unit in parts:
+        totals[unit] = totals.get(unit, 0) + n
+    return "+" + "".join(f"{totals[unit]}{unit}" for unit in _UNIT_NAMES if totals.get(unit))
+
+
+def _add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    if not MINYEAR <= year <= MAXYEAR:
+        raise OverflowError(f"year {year} is out of range")
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def anchor(rule: str, now: datetime) -> datetime:
+    """
+    Resolve a relative time rule to a moment.
+
+    Args:
+        rule: A rule string, see the module docstring
+        now: Naive UTC moment to resolve against
+
+    Returns:
+        Naive UTC datetime
+
+    Raises:
+        OverflowError: The moment is beyond the range of datetime
+        ValueError: The rule is malformed
+    """
+    if rule.startswith('+'):
+        moment = now
+        for n, unit in _OFFSET_PART.findall(rule):
+            n = int(n)
+            if unit in ('mo', 'y'):
+                moment = _add_months(moment, n * 12 if unit == 'y' else n)
+            else:
+                moment += timedelta(**{_UNIT_NAMES[unit] + 's': n})
+        return moment
+
+    head, _, clock = rule.rpartition(' ')
+    hour, minute, second = (int(part) for part in clock.split(':'))
+
+    def on(day: datetime) -> datetime:
+        return datetime(day.year, day.month, day.day, hour, minute, second)
+
+    if head.startswith('day+'):
+        return on(now + timedelta(days=int(head[4:])))
+    if head.startswith('at '):
+        return on(datetime.strptime(head[3:], '%Y-%m-%d'))
+    if head == 'time' or head.startswith('weekday ') or head == 'week-end':
+        weekday = 6 if head == 'week-end' else int(head[8:]) if head != 'time' else now.weekday()
+        moment = on(now + timedelta(days=(weekday - now.weekday()) % 7))
+        if moment <= now:
+            moment += timedelta(days=1 if head == 'time' else 7)
+        return moment
+    if head == 'month-end':
+        moment = on(now.replace(day=calendar.monthrange(now.year, now.month)[1]))
+        if moment <= now:
+            following = _add_months(now.replace(day=1), 1)
+            moment = on(following.replace(day=calendar.monthrange(following.year, following.month)[1]))
+        return moment
+    if head.startswith('date '):
+        month, day = (int(part) for part in head[5:].split('-'))
+        for year in range(now.year, min(now.year + 8, MAXYEAR + 1)):
+            if day <= calendar.monthrange(year, month)[1]:
+                moment = on(datetime(year, month, day))
+                if moment > now:
+                    return moment
+    raise ValueError(f"Unknown expiry rule: {rule}")
+
+
+def describe(rule: str, at: datetime, now: datetime) -> str:
+    """
+    Human-readable form of an anchored rule, e.g. "in 24 hours" or
+    "tomorrow at 5:00 PM".
+    """
+    if rule.startswith('+'):
+        return "in " + " ".join(
+            f"{n} {_UNIT_NAMES[unit]}{'s' if n != '1' else ''}" for n, unit in _OFFSET_PART.findall(rule)
+        )
+    clock = f"{at.hour % 12 or 12}:{at.minute:02d} {'AM' if at.hour < 12 else 'PM'}"
+    days = (at.date() - now.date()).days
+    if days == 0:
+        return f"today at {clock}"
+    if days == 1:
+        return f"tomorrow at {clock}"
+    day = f"{at:%a, %b} {at.day}" + (f", {at.year}" if at.year != now.year else "")
+    return f"on {day} at {clock}"
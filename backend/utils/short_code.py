@@ -1,32 +1,344 @@
+import os
+import re
 import random
 import string
+import uuid
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+from bson import Binary
+from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from utils.code_permutation import FeistelPermutation
 
+load_dotenv()
 
-async def generate_unique_short_code(db: AsyncIOMotorDatabase, length: int = 6) -> str:
+logger = logging.getLogger(__name__)
+
+SHORT_CODE_ALPHABET = string.ascii_letters + string.digits
+MIN_SHORT_CODE_LENGTH = 6
+MAX_SHORT_CODE_LENGTH = 16
+
+# "off": plain random codes; "embed": new codes end in a check character;
+# "enforce": embed, and reject codes whose check character does not verify
+SHORT_CODE_CHECK_CHAR = os.environ.get('SHORT_CODE_CHECK_CHAR', 'off').lower()
+
+# "random": sample characters and check each candidate against the database;
+# "counter": permute a node-partitioned counter into a code, no lookups needed
+SHORT_CODE_GENERATOR = os.environ.get('SHORT_CODE_GENERATOR', 'random').lower()
+SHORT_CODE_FEISTEL_KEY = os.environ.get('SHORT_CODE_FEISTEL_KEY', '')
+SHORT_CODE_NODE_ID = int(os.environ.get('SHORT_CODE_NODE_ID', '0'))
+SHORT_CODE_COUNTER_BLOCK = int(os.environ.get('SHORT_CODE_COUNTER_BLOCK', '1000'))
+
+# Also store shortCodeKey (int64) and idKey (binary UUID) on links and use
+# them as the lookup keys; run scripts.migrate_short_code_keys first
+SHORT_CODE_INT_KEY = os.environ.get('SHORT_CODE_INT_KEY', 'false').lower() in ('1', 'true', 'yes')
+
+COUNTER_CODE_LENGTH = 7
+MAX_INT_KEY_LENGTH = 10
+MAX_SHORT_CODE_NODES = 1024
+
+_SHORT_CODE_PATTERN = re.compile(
+    f"[A-Za-z0-9]{{{MIN_SHORT_CODE_LENGTH},{MAX_SHORT_CODE_LENGTH}}}"
+)
+_ALPHABET_INDEX = {char: index for index, char in enumerate(SHORT_CODE_ALPHABET)}
+
+
+def compute_check_char(body: str) -> str:
+    """
+    Compute a Luhn mod N check character over the short code alphabet.
+
+    Catches every single-character typo and most adjacent transpositions.
+
+    Args:
+        body: Short code without its check character
+
+    Returns:
+        The check character to append
+    """
+    base = len(SHORT_CODE_ALPHABET)
+    factor = 2
+    total = 0
+    for char in reversed(body):
+        addend = factor * _ALPHABET_INDEX[char]
+        total += addend // base + addend % base
+        factor = 1 if factor == 2 else 2
+    return SHORT_CODE_ALPHABET[(base - total % base) % base]
+
+
+def encode_base62(value: int, length: int) -> str:
+    """
+    Encode a non-negative integer as a fixed-width base62 string.
+
+    Args:
+        value: Integer below ``62 ** length``
+        length: Number of characters to produce
+
+    Returns:
+        The encoded string, left-padded with the alphabet's zero digit
+    """
+    base = len(SHORT_CODE_ALPHABET)
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, base)
+        chars.append(SHORT_CODE_ALPHABET[digit])
+    if value:
+        raise ValueError("value does not fit in the requested length")
+    return ''.join(reversed(chars))
+
+
+def decode_base62(short_code: str) -> int:
+    """Inverse of ``encode_base62``."""
+    base = len(SHORT_CODE_ALPHABET)
+    value = 0
+    for char in short_code:
+        value = value * base + _ALPHABET_INDEX[char]
+    return value
+
+
+def short_code_key(short_code: str) -> Optional[int]:
+    """
+    Map a short code to a unique signed 64-bit integer.
+
+    Uses bijective base62 (digits 1..62), so codes of different lengths
+    never share a key, e.g. "abc" and "aabc". Codes up to 10 characters
+    fit in an int64.
+
+    Args:
+        short_code: The short code
+
+    Returns:
+        The integer key, or None if the code is too long to have one
+    """
+    if len(short_code) > MAX_INT_KEY_LENGTH:
+        return None
+    base = len(SHORT_CODE_ALPHABET)
+    value = 0
+    for char in short_code:
+        value = value * base + _ALPHABET_INDEX[char] + 1
+    return value
+
+
+def link_id_key(link_id: str) -> Optional[Binary]:
+    """16-byte binary form of a link's UUID ``id``, or None if it is not a UUID."""
+    try:
+        return Binary.from_uuid(uuid.UUID(link_id))
+    except ValueError:
+        return None
+
+
+def link_lookup_keys(short_code: str, link_id: str) -> dict:
+    """
+    Compact indexed fields for the ``SHORT_CODE_INT_KEY`` storage layout.
+
+    Args:
+        short_code: The link's short code
+        link_id: The link's UUID string
+
+    Returns:
+        Dictionary with ``shortCodeKey`` and/or ``idKey`` where available
+    """
+    keys = {}
+    code_key = short_code_key(short_code)
+    if code_key is not None:
+        keys['shortCodeKey'] = code_key
+    id_key = link_id_key(link_id)
+    if id_key is not None:
+        keys['idKey'] = id_key
+    return keys
+
+
+def short_code_filter(short_code: str) -> dict:
+    """Query filter selecting a link by short code in the configured layout."""
+    if SHORT_CODE_INT_KEY:
+        code_key = short_code_key(short_code)
+        if code_key is not None:
+            return {"shortCodeKey": code_key}
+    return {"shortCode": short_code}
+
+
+def short_codes_filter(short_codes: Iterable[str]) -> dict:
+    """Query filter selecting every link whose short code is in ``short_codes``."""
+    short_codes = list(short_codes)
+    if SHORT_CODE_INT_KEY and all(len(code) <= MAX_INT_KEY_LENGTH for code in short_codes):
+        return {"shortCodeKey": {"$in": [short_code_key(code) for code in short_codes]}}
+    return {"shortCode": {"$in": short_codes}}
+
+
+def link_id_filter(link_id: str) -> dict:
+    """Query filter selecting a link by its UUID in the configured layout."""
+    if SHORT_CODE_INT_KEY:
+        id_key = link_id_key(link_id)
+        if id_key is not None:
+            return {"idKey": id_key}
+    return {"id": link_id}
+
+
+def is_valid_short_code(short_code: str) -> bool:
+    """
+    Cheap structural check run before any database access.
+
+    Args:
+        short_code: Candidate short code from a request path
+
+    Returns:
+        True if the code could have been issued by the generator
+    """
+    if not _SHORT_CODE_PATTERN.fullmatch(short_code):
+        return False
+    if SHORT_CODE_CHECK_CHAR == 'enforce':
+        return compute_check_char(short_code[:-1]) == short_code[-1]
+    return True
+
+
+def random_short_code(length: int = 6) -> str:
+    """
+    Sample a random short code, without checking it against the database.
+
+    Args:
+        length: Number of random characters (default 6)
+
+    Returns:
+        The code, with a check character appended when enabled
+    """
+    short_code = ''.join(random.choice(SHORT_CODE_ALPHABET) for _ in range(length))
+    if SHORT_CODE_CHECK_CHAR in ('embed', 'enforce'):
+        short_code += compute_check_char(short_code)
+    return short_code
+
+
+async def generate_unique_short_code(
+    code_exists: Callable[[str], Awaitable[bool]],
+    length: int = 6,
+    might_exist: Optional[Callable[[str], bool]] = None
+) -> str:
     """
     Generate a unique short code for link shortening.
     
     Args:
-        db: MongoDB database instance
+        code_exists: Async check against the link store
         length: Length of the short code (default 6)
+        might_exist: Optional membership test; candidates it rules out
+            are accepted without a database collision check
     
     Returns:
         A unique alphanumeric short code
     """
-    chars = string.ascii_letters + string.digits
     max_attempts = 10
     
     for _ in range(max_attempts):
-        short_code = ''.join(random.choice(chars) for _ in range(length))
+        short_code = random_short_code(length)
         
+        if might_exist is not None and not might_exist(short_code):
+            return short_code
+
         # Check if code already exists
         try:
-            existing = await db.links.find_one({"shortCode": short_code})
+            existing = await code_exists(short_code)
         except Exception:
-            existing = None
+            existing = False
         if not existing:
             return short_code
     
     # If we couldn't generate unique code in max_attempts, try with longer code
-    return await generate_unique_short_code(db, length + 1)
+    return await generate_unique_short_code(code_exists, length + 1, might_exist)
+
+
+class CounterCodeAllocator:
+    """
+    Issues short codes from a counter instead of random sampling.
+
+    The counter space ``[0, 62 ** 7)`` is split into ``MAX_SHORT_CODE_NODES``
+    equal partitions and each node only draws from its own. Within a
+    partition, blocks of sequence numbers are leased with an atomic
+    ``$inc`` on the ``counters`` collection, so restarts and concurrent
+    processes sharing a node ID still never reuse a value. Each value is
+    passed through a keyed Feistel permutation of the whole space, which
+    keeps codes unique by construction but non-sequential.
+    """
+
+    def __init__(
+        self,
+        key: str = SHORT_CODE_FEISTEL_KEY,
+        node_id: int = SHORT_CODE_NODE_ID,
+        block_size: int = SHORT_CODE_COUNTER_BLOCK
+    ):
+        if not 0 <= node_id < MAX_SHORT_CODE_NODES:
+            raise ValueError(f"SHORT_CODE_NODE_ID must be in [0, {MAX_SHORT_CODE_NODES})")
+        self.key = key
+        self.node_id = node_id
+        self.block_size = block_size
+        self.domain = len(SHORT_CODE_ALPHABET) ** COUNTER_CODE_LENGTH
+        self.partition_size = self.domain // MAX_SHORT_CODE_NODES
+        self._permutation = FeistelPermutation(key.encode(), self.domain) if key else None
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+        self.leases = 0
+
+    async def _lease_block(self, db: AsyncIOMotorDatabase) -> None:
+        counter = await db.counters.find_one_and_update(
+            {"_id": f"shortCode:{self.node_id}"},
+            {"$inc": {"next": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        end = counter['next']
+        if end > self.partition_size:
+            raise RuntimeError(f"Short code counter partition {self.node_id} is exhausted")
+        self._next, self._end = end - self.block_size, end
+        self.leases += 1
+
+    async def next_code(self, db: AsyncIOMotorDatabase) -> str:
+        """
+        Issue the next code for this node.
+
+        Args:
+            db: MongoDB database instance holding the ``counters`` collection
+
+        Returns:
+            A 7-character code (plus check character when enabled)
+        """
+        if self._permutation is None:
+            raise RuntimeError("SHORT_CODE_FEISTEL_KEY is required for counter short codes")
+        async with self._lock:
+            if self._next >= self._end:
+                await self._lease_block(db)
+            sequence = self._next
+            self._next += 1
+        value = self._permutation.permute(self.node_id * self.partition_size + sequence)
+        short_code = encode_base62(value, COUNTER_CODE_LENGTH)
+        if SHORT_CODE_CHECK_CHAR in ('embed', 'enforce'):
+            short_code += compute_check_char(short_code)
+        return short_code
+
+
+counter_codes = CounterCodeAllocator()
+
+
+async def generate_short_code(
+    db: Optional[AsyncIOMotorDatabase],
+    code_exists: Callable[[str], Awaitable[bool]],
+    might_exist: Optional[Callable[[str], bool]] = None
+) -> str:
+    """
+    Generate a short code using the configured ``SHORT_CODE_GENERATOR`` mode.
+
+    Counter mode falls back to random codes when no block can be leased,
+    or when the link store has no MongoDB database behind it.
+
+    Args:
+        db: MongoDB database holding the ``counters`` collection, or None
+        code_exists: Async check against the link store
+        might_exist: Optional membership test passed to the random generator
+
+    Returns:
+        A unique alphanumeric short code
+    """
+    if SHORT_CODE_GENERATOR == 'counter' and db is not None:
+        try:
+            return await counter_codes.next_code(db)
+        except Exception as e:
+            logger.warning(f"Counter short code unavailable, using random code: {e}")
+    return await generate_unique_short_code(code_exists, might_exist=might_exist)
@@ -0,0 +1,71 @@
+import os
+import sys
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytest
+
+# The backend imports its modules from its own directory, as server.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+import mongomock.collection  # noqa: E402
+import mongomock.filtering  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+from models import Link, ExpiryRules  # noqa: E402
+from utils.expiry_fields import normalize_expiry_fields  # noqa: E402
+from services.link_cache import link_cache, miss_cache  # noqa: E402
+
+# mongomock knows {"$type": "null"} but leaves it unimplemented; the clickable
+# clauses use it. Missing fields are mongomock's NOTHING sentinel, so they do
+# not match, as in MongoDB.
+mongomock.filtering.TYPE_MAP['null'] = lambda value: value is None
+
+_find_and_modify = mongomock.collection.Collection._find_and_modify
+
+
+def _find_and_modify_by_id(self, query, projection=None, update=None, upsert=False, sort=None, *args, **kwargs):
+    # mongomock re-reads the AFTER document with the original filter unless the
+    # projection keeps _id, so an update that makes the filter stop matching
+    # (the click that reaches the limit) returned None; MongoDB returns it.
+    found = self.find_one(query, {"_id": 1}, sort=sort)
+    if found is not None:
+        query = {"_id": found["_id"]}
+    return _find_and_modify(self, query, projection, update, upsert, sort, *args, **kwargs)
+
+
+mongomock.collection.Collection._find_and_modify = _find_and_modify_by_id
+
+
+def new_link(short_code: str, click_limit: Optional[int] = None, hours: Optional[float] = None) -> dict:
+    """A link document as ``create_link`` stores it."""
+    time_limit = datetime.utcnow() + timedelta(hours=hours) if hours is not None else None
+    link_type = "hybrid" if click_limit and time_limit else "clicks" if click_limit else "time"
+    link = Link(
+        shortCode=short_code,
+        originalUrl=f"https://example.com/{short_code}",
+        expiryRules=ExpiryRules(
+            summary="Expires", type=link_type, clickLimit=click_limit, timeLimit=time_limit, rawInput="test"
+        ),
+        clicks=0,
+        status="active"
+    ).model_dump()
+    link.update(normalize_expiry_fields(link['expiryRules']))
+    return link
+
+
+@pytest.fixture
+def mongo_db():
+    """A fresh in-process MongoDB stand-in with the unique shortCode index."""
+    db = AsyncMongoMockClient()['xpirelink_test']
+    asyncio.run(db.links.create_index("shortCode", unique=True))
+    return db
+
+
+@pytest.fixture(autouse=True)
+def clear_link_caches():
+    link_cache.clear()
+    miss_cache.clear()
+    yield
+    link_cache.clear()
+    miss_cache.clear()
@@ -0,0 +1,276 @@
+import asyncio
+import sys
+import types
+from datetime import datetime
+
+import pytest
+
+from services.ai_parser import HEDGE_MIN_SAMPLES, SYSTEM_PROMPT, ExpiryParser, GeminiClient
+from services.parse_cache import ExpiryParseCache
+
+# The grammar can't read it, so every parse needs the LLM
+PHRASE = "until the spring launch"
+ANSWER = {"type": "time", "clickLimit": None, "timeLimit": "2100-01-01T00:00:00Z", "summary": "Expires at launch"}
+
+
+class GatedLLM:
+    """Answers once ``release`` is set, counting calls per phrase."""
+
+    def __init__(self, answer=ANSWER):
+        self.answer = answer
+        self.release = asyncio.Event()
+        self.calls = []
+
+    async def __call__(self, expiry_text: str, now: datetime) -> dict:
+        self.calls.append(expiry_text)
+        await self.release.wait()
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return dict(self.answer)
+
+
+class TimedLLM:
+    """Call ``n`` answers after ``latencies[n]`` seconds; records how each call ended."""
+
+    def __init__(self, *latencies: float):
+        self.latencies = list(latencies)
+        self.calls = 0
+        self.answered = []
+        self.cancelled = []
+
+    async def __call__(self, expiry_text: str, now: datetime) -> dict:
+        call = self.calls
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latencies[call])
+        except asyncio.CancelledError:
+            self.cancelled.append(call)
+            raise
+        self.answered.append(call)
+        return {**ANSWER, "summary": f"Answered by call {call}"}
+
+
+async def parse_and_settle(parser: ExpiryParser, llm: TimedLLM) -> dict:
+    """Parse, then let cancelled calls unwind, before asyncio.run would cancel them itself."""
+    result = await parser.parse(PHRASE)
+    await asyncio.sleep(0)
+    result["cancelled"] = list(llm.cancelled)
+    return result
+
+
+class FakeChat:
+    """Stands in for emergentintegrations' LlmChat, one instance per conversation."""
+
+    instances = []
+
+    def __init__(self, api_key: str, session_id: str, system_message: str):
+        self.session_id = session_id
+        self.system_message = system_message
+        self.sent = []
+        FakeChat.instances.append(self)
+
+    def with_model(self, provider: str, model: str) -> "FakeChat":
+        return self
+
+    async def send_message(self, message) -> str:
+        self.sent.append(message.text)
+        return "```json\n" + '{"type": "clicks", "clickLimit": 3, "timeLimit": null, "summary": "Expires"}' + "\n```"
+
+
+@pytest.fixture
+def integration(monkeypatch):
+    """An importable fake emergentintegrations.llm.chat."""
+    FakeChat.instances = []
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+    chat.LlmChat = FakeChat
+    chat.UserMessage = lambda text: types.SimpleNamespace(text=text)
+    monkeypatch.setitem(sys.modules, "emergentintegrations", types.ModuleType("emergentintegrations"))
+    monkeypatch.setitem(sys.modules, "emergentintegrations.llm", types.ModuleType("emergentintegrations.llm"))
+    monkeypatch.setitem(sys.modules, "emergentintegrations.llm.chat", chat)
+    return FakeChat
+
+
+@pytest.fixture
+def uncached():
+    return ExpiryParseCache(max_entries=0, shared=False)
+
+
+@pytest.fixture
+def calibrated(uncached):
+    """A parser whose recent calls all took 20 ms, so slower calls are hedged after that."""
+    def make(llm, deadline_ms: float = 1000) -> ExpiryParser:
+        parser = ExpiryParser(cache=uncached, llm=llm, deadline_ms=deadline_ms, hedge_percentile=90)
+        parser._latencies.extend([0.02] * HEDGE_MIN_SAMPLES)
+        return parser
+    return make
+
+
+def test_concurrent_parses_of_a_phrase_share_one_call(uncached):
+    async def parse_together():
+        llm = GatedLLM()
+        parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=0)
+        parses = [asyncio.ensure_future(parser.parse(text)) for text in (PHRASE, PHRASE.upper(), f"  {PHRASE}  ")]
+        await asyncio.sleep(0)
+        llm.release.set()
+        return llm, parser, await asyncio.gather(*parses)
+
+    llm, parser, results = asyncio.run(parse_together())
+    assert llm.calls == [PHRASE]
+    assert all(result["timeLimit"] == ANSWER["timeLimit"] for result in results)
+    assert parser.stats()["coalescedParses"] == 2 and parser.stats()["llmParses"] == 1
+    assert parser.stats()["inFlight"] == 0
+
+
+def test_callers_get_their_own_copy(uncached):
+    async def parse_and_modify():
+        llm = GatedLLM()
+        parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=0)
+        parses = [asyncio.ensure_future(parser.parse(PHRASE)) for _ in range(2)]
+        await asyncio.sleep(0)
+        llm.release.set()
+        first, second = await asyncio.gather(*parses)
+        first["summary"] = "changed"
+        return second
+
+    assert asyncio.run(parse_and_modify())["summary"] == ANSWER["summary"]
+
+
+def test_different_phrases_are_not_coalesced(uncached):
+    async def parse_two_phrases():
+        llm = GatedLLM()
+        parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=0)
+        parses = [asyncio.ensure_future(parser.parse(text)) for text in (PHRASE, "until the autumn launch")]
+        await asyncio.sleep(0)
+        llm.release.set()
+        await asyncio.gather(*parses)
+        return llm
+
+    assert sorted(asyncio.run(parse_two_phrases()).calls) == sorted([PHRASE, "until the autumn launch"])
+
+
+def test_a_caller_giving_up_leaves_the_call_to_the_others(uncached):
+    async def cancel_the_first_caller():
+        llm = GatedLLM()
+        parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=0)
+        first = asyncio.ensure_future(parser.parse(PHRASE))
+        second = asyncio.ensure_future(parser.parse(PHRASE))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        llm.release.set()
+        return llm, first, await second
+
+    llm, first, result = asyncio.run(cancel_the_first_caller())
+    assert first.cancelled()
+    assert result["timeLimit"] == ANSWER["timeLimit"]
+    assert llm.calls == [PHRASE]
+
+
+def test_a_failed_call_falls_back_for_everyone_and_is_not_reused(uncached):
+    async def fail_then_retry():
+        llm = GatedLLM(answer=RuntimeError("quota exceeded"))
+        parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=0)
+        parses = [asyncio.ensure_future(parser.parse(PHRASE)) for _ in range(3)]
+        await asyncio.sleep(0)
+        llm.release.set()
+        results = await asyncio.gather(*parses)
+        await parser.parse(PHRASE)
+        return llm, parser, results
+
+    llm, parser, results = asyncio.run(fail_then_retry())
+    # The grammar's 7-day default
+    assert all(result["summary"] == "Expires in 7 days" for result in results)
+    assert len(llm.calls) == 2
+    assert parser.stats()["fallbacks"] == 2 and parser.stats()["coalescedParses"] == 2
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins(calibrated):
+    llm = TimedLLM(0.5, 0.01)
+    parser = calibrated(llm)
+
+    result = asyncio.run(parse_and_settle(parser, llm))
+
+    assert result["summary"] == "Answered by call 1"
+    assert (llm.answered, result["cancelled"]) == ([1], [0])
+    assert parser.stats()["hedgesSent"] == 1 and parser.stats()["hedgedParses"] == 1
+
+
+def test_original_call_answering_first_cancels_the_hedge(calibrated):
+    llm = TimedLLM(0.05, 0.5)
+    parser = calibrated(llm)
+
+    result = asyncio.run(parse_and_settle(parser, llm))
+
+    assert result["summary"] == "Answered by call 0"
+    assert (llm.answered, result["cancelled"]) == ([0], [1])
+    assert parser.stats()["hedgesSent"] == 1 and parser.stats()["llmParses"] == 1
+
+
+def test_fast_call_is_not_hedged(calibrated):
+    llm = TimedLLM(0.005)
+    parser = calibrated(llm)
+
+    asyncio.run(parser.parse(PHRASE))
+
+    assert llm.calls == 1 and parser.stats()["hedgesSent"] == 0
+
+
+def test_uncalibrated_parser_does_not_hedge(uncached):
+    llm = TimedLLM(0.05)
+    parser = ExpiryParser(cache=uncached, llm=llm, hedge_percentile=90)
+
+    asyncio.run(parser.parse(PHRASE))
+
+    assert llm.calls == 1 and parser.hedge_delay() is None
+
+
+def test_deadline_falls_back_to_the_grammar_and_cancels_every_call(calibrated):
+    llm = TimedLLM(5, 5)
+    parser = calibrated(llm, deadline_ms=100)
+
+    result = asyncio.run(asyncio.wait_for(parse_and_settle(parser, llm), timeout=1))
+
+    assert result["summary"] == "Expires in 7 days"
+    assert llm.answered == [] and sorted(result["cancelled"]) == [0, 1]
+    assert parser.stats()["timeouts"] == 1 and parser.stats()["fallbacks"] == 1
+    # Counted at the deadline, so the next hedge delay reflects the slow period
+    assert parser._latencies[-1] == pytest.approx(0.1)
+
+
+def test_client_gives_each_parse_its_own_session(integration):
+    client = GeminiClient(api_key="test-key")
+
+    async def ask_twice():
+        return await asyncio.gather(*(client.ask(PHRASE, datetime(2025, 1, 15, 12)) for _ in range(2)))
+
+    results = asyncio.run(ask_twice())
+    first, second = integration.instances
+    assert results == [{"type": "clicks", "clickLimit": 3, "timeLimit": None, "summary": "Expires"}] * 2
+    assert first.session_id != second.session_id
+    assert first.session_id.rsplit("-", 1)[0] == second.session_id.rsplit("-", 1)[0]
+    assert first.system_message == SYSTEM_PROMPT
+    # The current time travels in the message, not the constant system prompt
+    assert first.sent == [f"Current date and time: 2025-01-15 12:00:00 UTC\nParse this expiry rule: {PHRASE}"]
+    assert client.stats()["ready"] and client.stats()["calls"] == 2
+
+
+def test_client_without_a_key_fails_fast(integration, caplog):
+    client = GeminiClient(api_key=None)
+    client.start()
+    client.start()
+
+    with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+        asyncio.run(client.ask(PHRASE, datetime(2025, 1, 15, 12)))
+    assert caplog.text.count("Gemini expiry parsing disabled") == 1
+    assert integration.instances == []
+    stats = client.stats()
+    assert (stats["ready"], stats["calls"], stats["error"]) == (False, 0, "Missing GEMINI_API_KEY")
+
+
+def test_client_without_the_package_fails_fast(monkeypatch):
+    monkeypatch.setitem(sys.modules, "emergentintegrations.llm.chat", None)
+    client = GeminiClient(api_key="test-key")
+
+    with pytest.raises(RuntimeError, match="emergentintegrations unavailable"):
+        asyncio.run(client.ask(PHRASE, datetime(2025, 1, 15, 12)))
+    assert not client.stats()["ready"]
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+
+from tests.conftest import new_link
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from services.link_store import FallbackLinkStore, MemoryLinkStore, MongoLinkStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def breaker(clock: FakeClock, **options) -> CircuitBreaker:
+    options = {"failure_threshold": 3, "reset_seconds": 10, "half_open_probes": 1, **options}
+    return CircuitBreaker("test", clock=clock, **options)
+
+
+async def call(cb: CircuitBreaker, error: BaseException = None) -> None:
+    async with cb:
+        if error is not None:
+            raise error
+
+
+def fail(cb: CircuitBreaker) -> None:
+    with pytest.raises(AutoReconnect):
+        asyncio.run(call(cb, AutoReconnect("connection reset")))
+
+
+def test_opens_after_consecutive_failures():
+    cb = breaker(FakeClock())
+    fail(cb)
+    fail(cb)
+    assert cb.state == CLOSED
+
+    fail(cb)
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call(cb))
+    assert cb.rejected == 1
+
+
+def test_success_resets_the_failure_count():
+    cb = breaker(FakeClock())
+    fail(cb)
+    fail(cb)
+    asyncio.run(call(cb))
+    fail(cb)
+    fail(cb)
+    assert cb.state == CLOSED
+
+
+def test_query_errors_do_not_count_as_failures():
+    cb = breaker(FakeClock(), failure_threshold=1)
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(call(cb, DuplicateKeyError("E11000")))
+    assert cb.state == CLOSED
+
+
+def test_half_open_probe_success_closes():
+    clock = FakeClock()
+    cb = breaker(clock, failure_threshold=1)
+    fail(cb)
+    clock.now += 9.9
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call(cb))
+
+    clock.now += 0.1
+    asyncio.run(call(cb))
+    assert cb.state == CLOSED
+    assert (cb.opened, cb.half_opened, cb.closed) == (1, 1, 1)
+
+
+def test_half_open_probe_failure_reopens_for_another_period():
+    clock = FakeClock()
+    cb = breaker(clock, failure_threshold=1)
+    fail(cb)
+    clock.now += 10
+    fail(cb)
+    assert cb.state == OPEN
+
+    clock.now += 9
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call(cb))
+    clock.now += 1
+    asyncio.run(call(cb))
+    assert cb.state == CLOSED
+
+
+def test_half_open_admits_one_probe_at_a_time():
+    clock = FakeClock()
+    cb = breaker(clock, failure_threshold=1)
+    fail(cb)
+    clock.now += 10
+
+    async def concurrent_probes():
+        probe_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def probe():
+            async with cb:
+                probe_started.set()
+                await release.wait()
+
+        first = asyncio.create_task(probe())
+        await probe_started.wait()
+        assert cb.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await call(cb)
+        release.set()
+        await first
+
+    asyncio.run(concurrent_probes())
+    assert cb.state == CLOSED
+
+
+def test_cancelled_probe_frees_its_slot():
+    clock = FakeClock()
+    cb = breaker(clock, failure_threshold=1)
+    fail(cb)
+    clock.now += 10
+
+    async def cancelled_probe():
+        async def probe():
+            async with cb:
+                await asyncio.sleep(3600)
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await call(cb)
+
+    asyncio.run(cancelled_probe())
+    assert cb.state == CLOSED
+
+
+def test_threshold_zero_disables_the_breaker():
+    cb = breaker(FakeClock(), failure_threshold=0)
+    for _ in range(5):
+        fail(cb)
+    asyncio.run(call(cb))
+    assert cb.state == CLOSED
+
+
+def test_fallback_store_routes_by_breaker_state(mongo_db):
+    clock = FakeClock()
+    cb = breaker(clock, failure_threshold=1)
+    store = FallbackLinkStore(MongoLinkStore(mongo_db, cb), MemoryLinkStore())
+    fail(cb)
+
+    async def insert_during_outage() -> bool:
+        await store.insert(new_link("Outage"))
+        return store.answered_by_primary()
+
+    assert not asyncio.run(insert_during_outage())
+    assert "Outage" in store.fallback.links
+
+    clock.now += 10
+    asyncio.run(store.insert(new_link("Healed")))
+    assert "Healed" not in store.fallback.links
+    assert asyncio.run(mongo_db.links.count_documents({"shortCode": "Healed"})) == 1
+    assert cb.state == CLOSED
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from services import link_service
+from services.click_buffer import ClickBuffer
+from services.link_service import flush_click_buffer
+from services.link_store import MemoryLinkStore
+
+
+class SlowStore(MemoryLinkStore):
+    """A memory store whose add_clicks waits for ``release``."""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def add_clicks(self, increments):
+        self.writing.set()
+        await self.release.wait()
+        return await super().add_clicks(increments)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = ClickBuffer(enabled=True, flush_interval=3600, max_pending=2)
+    monkeypatch.setattr(link_service, "click_buffer", buffer)
+    return buffer
+
+
+@pytest.fixture
+def unlimited_link():
+    return {
+        "id": "0f8e2b6c-51d4-4c39-8a7e-3b2d9c1e4f50", "shortCode": "Buffer",
+        "originalUrl": "https://example.com/buffer", "clicks": 0, "status": "active",
+        "expiresAtEpoch": None, "clickLimit": None
+    }
+
+
+def test_stop_during_a_flush_keeps_every_click(buffer, unlimited_link):
+    async def stop_mid_flush():
+        store = SlowStore()
+        await store.insert(unlimited_link)
+        buffer.start(lambda: flush_click_buffer(store))
+        buffer.add("Buffer", 2)
+        await store.writing.wait()
+        # Drained and in flight; these arrive during the flush
+        buffer.add("Buffer", 1)
+        stopping = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0)
+        assert not buffer.accepting
+        store.release.set()
+        await asyncio.wait_for(stopping, timeout=1)
+        return store.links.state("Buffer")
+
+    assert asyncio.run(stop_mid_flush()) == (3, "active")
+    assert buffer.stats()["flushedClicks"] == 3
+
+
+def test_failed_flush_requeues_the_clicks(buffer, monkeypatch):
+    store = MemoryLinkStore()
+
+    async def unavailable(increments):
+        raise ConnectionError("store down")
+
+    monkeypatch.setattr(store, "add_clicks", unavailable)
+    buffer.add("Buffer", 1)
+
+    asyncio.run(flush_click_buffer(store))
+
+    assert buffer.pending("Buffer") == 1
+    assert buffer.stats()["flushedClicks"] == 0
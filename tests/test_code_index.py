@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.code_index import ShortCodeIndex
+from utils.bloom import BloomFilter
+
+
+@pytest.fixture
+def issued_codes(mongo_db):
+    codes = [f"Code{i:02d}" for i in range(50)]
+    asyncio.run(mongo_db.links.insert_many(
+        [{"shortCode": code, "createdAt": datetime.utcnow()} for code in codes]
+    ))
+    return codes
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(10_000, 0.01)
+    items = [f"item-{i}" for i in range(10_000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate_is_near_the_target():
+    bloom = BloomFilter(10_000, 0.01)
+    for i in range(10_000):
+        bloom.add(f"item-{i}")
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(20_000))
+    assert false_positives / 20_000 < 0.02
+    assert bloom.estimated_error_rate() == pytest.approx(0.01, rel=0.2)
+
+
+@pytest.mark.parametrize("capacity, error_rate", [(0, 0.01), (100, 0), (100, 1)])
+def test_bloom_filter_rejects_bad_sizing(capacity, error_rate):
+    with pytest.raises(ValueError):
+        BloomFilter(capacity, error_rate)
+
+
+def test_every_code_may_exist_until_the_first_build():
+    index = ShortCodeIndex(enabled=True, capacity=1000)
+
+    assert index.might_exist("Never1")
+
+
+def test_build_and_refresh_track_issued_codes(mongo_db, issued_codes):
+    index = ShortCodeIndex(enabled=True, capacity=1000)
+    asyncio.run(index.build(mongo_db))
+
+    assert all(index.might_exist(code) for code in issued_codes)
+    assert not index.might_exist("Never1")
+
+    # Issued by another node after the build
+    asyncio.run(mongo_db.links.insert_one({"shortCode": "Later1", "createdAt": datetime.utcnow()}))
+    asyncio.run(index.refresh(mongo_db))
+    assert index.might_exist("Later1")
+    assert index.stats()["definiteMisses"] == 1
+
+
+def test_local_creates_are_seen_at_once():
+    index = ShortCodeIndex(enabled=True, capacity=1000)
+    index.ready = True
+    index.add("Local1")
+
+    assert index.might_exist("Local1")
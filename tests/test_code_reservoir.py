@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import ConnectionFailure
+
+import services.code_reservoir as code_reservoir
+import services.link_service as link_service
+import utils.short_code as short_code
+from tests.conftest import new_link
+from models import CreateLinkRequest
+from services.circuit_breaker import CircuitBreaker
+from services.code_reservoir import CodeReservoir
+from services.link_store import FallbackLinkStore, MemoryLinkStore, MongoLinkStore
+
+
+def reservoir() -> CodeReservoir:
+    return CodeReservoir(enabled=True, size=5, low_watermark=1, batch_size=5, lease_seconds=600)
+
+
+async def reservations(db) -> dict:
+    return {doc['_id']: doc async for doc in db.code_reservations.find()}
+
+
+def test_failed_insert_returns_code_to_pool(mongo_db, monkeypatch):
+    pool = reservoir()
+    asyncio.run(pool._maintain(mongo_db))
+    first = pool._codes[0]
+    store = MongoLinkStore(mongo_db)
+
+    async def refuse(link):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(store, "insert", refuse)
+    monkeypatch.setattr(link_service, "code_reservoir", pool)
+    with pytest.raises(RuntimeError):
+        asyncio.run(link_service.create_link(store, CreateLinkRequest(originalUrl="https://a.io", expiryText="3 clicks")))
+
+    assert pool._codes[0] == first
+    assert first in asyncio.run(reservations(mongo_db))
+
+
+def test_refill_adopts_lapsed_leases(mongo_db):
+    lapsed = datetime.utcnow() - timedelta(seconds=1)
+    asyncio.run(mongo_db.code_reservations.insert_many([
+        {"_id": "Orphan1", "owner": "crashed", "leaseUntil": lapsed},
+        {"_id": "Issued1", "owner": "crashed", "leaseUntil": lapsed}
+    ]))
+    asyncio.run(mongo_db.links.insert_one(new_link("Issued1")))
+    pool = reservoir()
+
+    asyncio.run(pool._maintain(mongo_db))
+
+    assert "Orphan1" in pool._codes and "Issued1" not in pool._codes
+    held = asyncio.run(reservations(mongo_db))
+    assert held["Orphan1"]["owner"] == pool.owner and "Issued1" not in held
+
+
+def test_lease_kept_until_fallback_link_reaches_mongodb(mongo_db, monkeypatch):
+    pool = reservoir()
+    asyncio.run(pool._maintain(mongo_db))
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=3600)
+    breaker.record_failure(ConnectionFailure("connection refused"))
+    store = FallbackLinkStore(MongoLinkStore(mongo_db, breaker), MemoryLinkStore())
+    monkeypatch.setattr(link_service, "code_reservoir", pool)
+
+    created = asyncio.run(link_service.create_link(store, CreateLinkRequest(originalUrl="https://a.io", expiryText="3 clicks")))
+    code = created["shortCode"]
+    asyncio.run(pool._maintain(mongo_db))
+    assert code in asyncio.run(reservations(mongo_db))
+
+    asyncio.run(mongo_db.links.insert_one(asyncio.run(store.fallback.get_by_code(code))))
+    asyncio.run(pool._maintain(mongo_db))
+    assert code not in asyncio.run(reservations(mongo_db))
+
+
+def test_inline_codes_skip_reserved_ones(mongo_db, monkeypatch):
+    pool = reservoir()
+    asyncio.run(mongo_db.code_reservations.insert_one(
+        {"_id": "Leased", "owner": "other", "leaseUntil": datetime.utcnow() + timedelta(minutes=10)}
+    ))
+    candidates = iter(["Leased", "Fresh1"])
+    monkeypatch.setattr(short_code, "random_short_code", lambda length=6: next(candidates))
+    monkeypatch.setattr(link_service, "code_reservoir", pool)
+
+    assert asyncio.run(link_service._generate_code(MongoLinkStore(mongo_db))) == "Fresh1"
+
+
+def test_refill_uses_counter_generator(mongo_db, monkeypatch):
+    allocator = short_code.CounterCodeAllocator(key="test-key", node_id=3, block_size=4)
+    monkeypatch.setattr(code_reservoir, "SHORT_CODE_GENERATOR", "counter")
+    monkeypatch.setattr(code_reservoir, "counter_codes", allocator)
+    pool = reservoir()
+
+    asyncio.run(pool._maintain(mongo_db))
+
+    permutation = allocator._permutation
+    sequences = sorted(permutation.invert(short_code.decode_base62(code)) for code in pool._codes)
+    base = 3 * allocator.partition_size
+    assert sequences == list(range(base, base + pool.size))
+
+
+def test_refill_pass_gives_up_when_every_candidate_collides(mongo_db, monkeypatch):
+    asyncio.run(mongo_db.code_reservations.insert_one(
+        {"_id": "Taken1", "owner": "other", "leaseUntil": datetime.utcnow() + timedelta(minutes=10)}
+    ))
+    monkeypatch.setattr(short_code, "random_short_code", lambda length=6: "Taken1")
+    monkeypatch.setattr(code_reservoir, "random_short_code", lambda length=6: "Taken1")
+    pool = reservoir()
+
+    assert asyncio.run(pool._maintain(mongo_db)) is False
+    # Two attempts per batch needed to fill the pool
+    assert pool.refills == 2 and len(pool._codes) == 0
+
+
+def test_failed_passes_back_off(mongo_db, monkeypatch):
+    monkeypatch.setattr(code_reservoir, "CODE_RESERVOIR_RETRY_SECONDS", 0.02)
+    monkeypatch.setattr(code_reservoir, "CODE_RESERVOIR_MAX_RETRY_SECONDS", 0.08)
+    pool = reservoir()
+    passes = []
+
+    async def failing_pass(db):
+        passes.append(asyncio.get_running_loop().time())
+        # As if every pop woke the refill loop
+        pool._wake.set()
+        return False
+
+    monkeypatch.setattr(pool, "_maintain", failing_pass)
+
+    async def run_briefly():
+        pool.start(mongo_db)
+        await asyncio.sleep(0.3)
+        await pool.stop(mongo_db)
+
+    asyncio.run(run_briefly())
+    gaps = [later - earlier for earlier, later in zip(passes, passes[1:])]
+    assert 3 <= len(passes) <= 8
+    assert gaps[0] >= 0.015 and gaps[-1] >= 0.07
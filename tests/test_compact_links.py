@@ -0,0 +1,33 @@
+import pytest
+
+from tests.conftest import new_link
+from utils.compact_links import CompactLinkTable, MemoryFullError
+
+
+def side_dict_link(short_code: str, payload: int = 10_000) -> dict:
+    """A link with a field outside the columnar layout."""
+    link = new_link(short_code)
+    link['tags'] = ["x" * payload]
+    return link
+
+
+def test_memory_bytes_counts_side_dict_documents():
+    table = CompactLinkTable()
+    table.put(new_link("Column"))
+    before = table.memory_bytes()
+
+    table.put(side_dict_link("Sided1"))
+    assert table.stats()["documentLinks"] == 1
+    assert table.memory_bytes() - before >= 10_000
+
+    table.delete("Sided1")
+    assert table.memory_bytes() - before < 1_000
+
+
+def test_side_dict_documents_count_toward_the_cap():
+    table = CompactLinkTable(max_bytes=CompactLinkTable().memory_bytes() + 50_000)
+    with pytest.raises(MemoryFullError):
+        for i in range(20):
+            table.put(side_dict_link(f"Side{i:02d}"))
+    assert len(table) < 20
+
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import utils.short_code as short_code
+from utils.code_permutation import FeistelPermutation
+from utils.short_code import CounterCodeAllocator, MAX_SHORT_CODE_NODES, decode_base62, is_valid_short_code
+
+
+def issue(allocator: CounterCodeAllocator, db, count: int) -> list:
+    async def next_codes():
+        return [await allocator.next_code(db) for _ in range(count)]
+
+    return asyncio.run(next_codes())
+
+
+@pytest.mark.parametrize("domain", [2, 62, 1000, 4097])
+def test_permutation_is_a_bijection(domain):
+    permutation = FeistelPermutation(b"test-key", domain)
+    outputs = [permutation.permute(value) for value in range(domain)]
+
+    assert sorted(outputs) == list(range(domain))
+    assert [permutation.invert(value) for value in outputs] == list(range(domain))
+
+
+def test_permutation_depends_on_the_key():
+    first = FeistelPermutation(b"key-one", 1000)
+    second = FeistelPermutation(b"key-two", 1000)
+
+    assert [first.permute(v) for v in range(20)] != [second.permute(v) for v in range(20)]
+
+
+def test_permutation_rejects_values_outside_the_domain():
+    permutation = FeistelPermutation(b"test-key", 1000)
+
+    with pytest.raises(ValueError):
+        permutation.permute(1000)
+    with pytest.raises(ValueError):
+        permutation.invert(-1)
+
+
+def test_codes_are_seven_valid_characters(mongo_db):
+    codes = issue(CounterCodeAllocator(key="test-key", node_id=0, block_size=10), mongo_db, 25)
+
+    assert len(set(codes)) == 25
+    assert all(len(code) == 7 and is_valid_short_code(code) for code in codes)
+
+
+def test_nodes_draw_from_disjoint_partitions(mongo_db):
+    issued = {}
+    for node_id in (0, 1, MAX_SHORT_CODE_NODES - 1):
+        allocator = CounterCodeAllocator(key="test-key", node_id=node_id, block_size=5)
+        codes = issue(allocator, mongo_db, 12)
+        values = [allocator._permutation.invert(decode_base62(code)) for code in codes]
+        low = node_id * allocator.partition_size
+        assert all(low <= value < low + allocator.partition_size for value in values)
+        issued[node_id] = set(codes)
+
+    assert not issued[0] & issued[1] and not issued[1] & issued[MAX_SHORT_CODE_NODES - 1]
+
+
+def test_processes_sharing_a_node_lease_separate_blocks(mongo_db):
+    first = CounterCodeAllocator(key="test-key", node_id=7, block_size=4)
+    second = CounterCodeAllocator(key="test-key", node_id=7, block_size=4)
+
+    codes = issue(first, mongo_db, 6) + issue(second, mongo_db, 6)
+
+    assert len(set(codes)) == 12
+    assert first.leases == 2 and second.leases == 2
+
+
+@pytest.mark.parametrize("node_id", [-1, MAX_SHORT_CODE_NODES])
+def test_invalid_node_id_is_rejected(node_id):
+    with pytest.raises(ValueError, match="SHORT_CODE_NODE_ID"):
+        CounterCodeAllocator(key="test-key", node_id=node_id)
+
+
+def test_missing_key_is_rejected(mongo_db):
+    with pytest.raises(RuntimeError, match="SHORT_CODE_FEISTEL_KEY"):
+        issue(CounterCodeAllocator(key="", node_id=0), mongo_db, 1)
+
+
+def test_counter_mode_without_a_key_falls_back_to_random_codes(mongo_db, monkeypatch):
+    monkeypatch.setattr(short_code, "SHORT_CODE_GENERATOR", "counter")
+    monkeypatch.setattr(short_code, "counter_codes", CounterCodeAllocator(key="", node_id=0))
+
+    async def never_exists(code):
+        return False
+
+    code = asyncio.run(short_code.generate_short_code(mongo_db, never_exists))
+    assert len(code) == 6
@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from tests.conftest import new_link
+from services.expiry_engine import ExpiryRule, compile_expiry, register_rule
+from services.link_store import LinkStore, MemoryLinkStore
+
+
+def test_incomplete_link_store_fails_on_creation():
+    class ReadOnlyStore(LinkStore):
+        async def get_by_code(self, short_code):
+            return None
+
+    with pytest.raises(TypeError, match="insert"):
+        ReadOnlyStore()
+    MemoryLinkStore()
+
+
+def test_incomplete_rule_type_fails_on_registration():
+    class NeverExpires(ExpiryRule):
+        @classmethod
+        def compile(cls, link):
+            return cls()
+
+    with pytest.raises(TypeError, match="clickable_clause"):
+        register_rule(NeverExpires)
+
+
+def test_compiled_rules_expire_on_clicks_and_time():
+    link = new_link("Abc123", click_limit=2, hours=1)
+    compiled = compile_expiry(link)
+    now = time.time()
+
+    assert not compiled.is_expired(1, now)
+    assert compiled.is_expired(2, now)
+    assert compiled.is_expired(0, now + 7200)
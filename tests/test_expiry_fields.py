@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from scripts.migrate_expiry_fields import migrate
+from utils.expiry_fields import link_click_limit, link_expires_at, normalize_expiry_fields
+
+NOON = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def unmigrated_links(mongo_db):
+    """Links stored before the numeric expiry fields existed."""
+    links = [
+        {"shortCode": "Timed1", "expiryRules": {"timeLimit": NOON.replace(microsecond=500_000), "clickLimit": None}},
+        {"shortCode": "Click1", "expiryRules": {"timeLimit": None, "clickLimit": 3}},
+    ]
+    asyncio.run(mongo_db.links.insert_many([dict(link) for link in links]))
+    return links
+
+
+@pytest.mark.parametrize("time_limit, epoch", [
+    (NOON, NOON.timestamp()),
+    (NOON.replace(microsecond=1), NOON.timestamp() + 1),
+    (NOON.replace(microsecond=999_999), NOON.timestamp() + 1),
+    (NOON.replace(tzinfo=None), NOON.timestamp()),
+    ("2026-01-01T12:00:00.250Z", NOON.timestamp() + 1),
+])
+def test_epoch_never_precedes_the_time_limit(time_limit, epoch):
+    fields = normalize_expiry_fields({"timeLimit": time_limit})
+
+    assert fields["expiresAtEpoch"] == epoch
+    assert isinstance(fields["expiresAtEpoch"], int)
+
+
+@pytest.mark.parametrize("click_limit, expected", [(5, 5), ("5", 5), (5.0, 5), (None, None), ("lots", None)])
+def test_click_limit_is_normalized_to_an_int(click_limit, expected):
+    assert normalize_expiry_fields({"clickLimit": click_limit})["clickLimit"] == expected
+
+
+def test_missing_rules_have_no_limits():
+    assert normalize_expiry_fields(None) == {"expiresAtEpoch": None, "clickLimit": None}
+
+
+def test_unmigrated_links_derive_the_fields():
+    link = {"expiryRules": {"timeLimit": NOON, "clickLimit": 2}}
+
+    assert link_expires_at(link) == NOON.timestamp()
+    assert link_click_limit(link) == 2
+    assert link_click_limit({"expiresAtEpoch": None, "clickLimit": 7, "expiryRules": {"clickLimit": 2}}) == 7
+
+
+def test_migration_backfills_once(mongo_db, unmigrated_links):
+    assert asyncio.run(migrate(mongo_db, chunk_size=1)) == 2
+    assert asyncio.run(migrate(mongo_db, chunk_size=1)) == 0
+
+    timed = asyncio.run(mongo_db.links.find_one({"shortCode": "Timed1"}))
+    clicks = asyncio.run(mongo_db.links.find_one({"shortCode": "Click1"}))
+    assert (timed["expiresAtEpoch"], timed["clickLimit"]) == (NOON.timestamp() + 1, None)
+    assert (clicks["expiresAtEpoch"], clicks["clickLimit"]) == (None, 3)
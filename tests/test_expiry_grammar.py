@@ -0,0 +1,189 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from models import CreateLinkRequest
+from services.ai_parser import ExpiryParser, _parse_response
+from services.link_service import create_link
+from services.link_store import MemoryLinkStore
+from services.parse_cache import ExpiryParseCache
+from utils.expiry_grammar import MAX_CLICK_LIMIT, parse_expiry_text, parsed_from_expiry
+
+# A Wednesday
+NOW = datetime(2025, 1, 15, 12, 0, 0)
+
+
+class FakeLLM:
+    """Records the phrases it is asked about; answers with ``answer`` or raises it."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.asked = []
+
+    async def __call__(self, expiry_text: str, now: datetime) -> dict:
+        self.asked.append(expiry_text)
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+@pytest.fixture
+def parser_with(monkeypatch):
+    """The process-wide parser, with an uncached fake LLM behind it."""
+    def install(answer) -> FakeLLM:
+        llm = FakeLLM(answer)
+        parser = ExpiryParser(min_confidence=0.8, cache=ExpiryParseCache(max_entries=0, shared=False), llm=llm)
+        monkeypatch.setattr("services.ai_parser.expiry_parser", parser)
+        return llm
+    return install
+
+
+def time_limit(phrase: str) -> str:
+    return parse_expiry_text(phrase).to_expiry(NOW)["timeLimit"]
+
+
+@pytest.mark.parametrize("phrase, rule, expected", [
+    ("24 hours", "+24h", "2025-01-16T12:00:00Z"),
+    ("1 hour 30 minutes", "+1h30m", "2025-01-15T13:30:00Z"),
+    ("2 days and 3 hours", "+2d3h", "2025-01-17T15:00:00Z"),
+    ("half an hour", "+30m", "2025-01-15T12:30:00Z"),
+    ("1.5 hours", "+90m", "2025-01-15T13:30:00Z"),
+    ("twenty four hours", "+24h", "2025-01-16T12:00:00Z"),
+    ("a week", "+1w", "2025-01-22T12:00:00Z"),
+    ("3 months", "+3mo", "2025-04-15T12:00:00Z"),
+])
+def test_durations(phrase, rule, expected):
+    assert parse_expiry_text(phrase).time_rules == (rule,)
+    assert time_limit(phrase) == expected
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("friday", "2025-01-17T23:59:59Z"),
+    ("this friday", "2025-01-17T23:59:59Z"),
+    ("friday at 5pm", "2025-01-17T17:00:00Z"),
+    # Today is Wednesday, so it means the next one
+    ("wednesday 9am", "2025-01-22T09:00:00Z"),
+    ("eow", "2025-01-19T23:59:59Z"),
+])
+def test_weekdays(phrase, expected):
+    assert time_limit(phrase) == expected
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("tomorrow", "2025-01-16T23:59:59Z"),
+    ("tomorrow at noon", "2025-01-16T12:00:00Z"),
+    ("day after tomorrow", "2025-01-17T23:59:59Z"),
+    ("tonight", "2025-01-15T23:59:59Z"),
+    ("eod", "2025-01-15T23:59:59Z"),
+])
+def test_tomorrow_and_today(phrase, expected):
+    assert time_limit(phrase) == expected
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("2025-01-31", "2025-01-31T23:59:59Z"),
+    ("jan 31st", "2025-01-31T23:59:59Z"),
+    ("1/31", "2025-01-31T23:59:59Z"),
+    ("31 january 2026", "2026-01-31T23:59:59Z"),
+    ("end of month", "2025-01-31T23:59:59Z"),
+])
+def test_dates(phrase, expected):
+    assert time_limit(phrase) == expected
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("5pm", "2025-01-15T17:00:00Z"),
+    ("17:30", "2025-01-15T17:30:00Z"),
+    ("midnight", "2025-01-15T23:59:59Z"),
+])
+def test_times_of_day(phrase, expected):
+    assert time_limit(phrase) == expected
+
+
+@pytest.mark.parametrize("phrase, clicks, expected", [
+    ("5 clicks or by friday 5pm", 5, "2025-01-17T17:00:00Z"),
+    ("3 clicks or 24 hours whichever comes first", 3, "2025-01-16T12:00:00Z"),
+    ("10 clicks and 2 days", 10, "2025-01-17T12:00:00Z"),
+])
+def test_hybrids(phrase, clicks, expected):
+    expiry = parse_expiry_text(phrase).to_expiry(NOW)
+
+    assert (expiry["type"], expiry["clickLimit"], expiry["timeLimit"]) == ("hybrid", clicks, expected)
+
+
+@pytest.mark.parametrize("phrase, confidence", [
+    ("expire after 3 clicks", 1.0),
+    ("twice", 1.0),
+    ("friday at 5pm", 1.0),
+    ("next month", 0.9),
+    ("03/04", 0.7),
+    ("10 clicks and 2 days", 0.6),
+    ("next friday", 0.6),
+    ("3 clicks please foo bar", 0.5),
+    ("3 clicks 5 clicks", 0.5),
+    ("expire after clicks", 0.3),
+    ("blah blah", 0.0),
+    ("2/30", 0.0),
+])
+def test_confidence(phrase, confidence):
+    assert parse_expiry_text(phrase).confidence == pytest.approx(confidence)
+
+
+@pytest.mark.parametrize("phrase", ["expire in 9999 years", "100000000 days", "in 99999999999999999999 minutes"])
+def test_offsets_beyond_datetime_have_no_confidence(phrase):
+    parsed = parse_expiry_text(phrase)
+
+    assert parsed.confidence == 0.0
+    # Read as "never", should the LLM not answer
+    assert parsed.to_expiry(NOW)["timeLimit"] == "9999-12-31T23:59:59Z"
+
+
+def test_out_of_range_rule_keeps_the_other_clauses():
+    parsed = parse_expiry_text("3 clicks or 9999 years")
+    expiry = parsed.to_expiry(NOW)
+
+    assert parsed.confidence == 0.0
+    assert (expiry["type"], expiry["clickLimit"], expiry["timeLimit"]) == ("hybrid", 3, "9999-12-31T23:59:59Z")
+
+
+def test_click_limits_beyond_int64_are_capped_without_confidence():
+    assert parse_expiry_text(f"{MAX_CLICK_LIMIT} clicks").confidence == 1.0
+
+    parsed = parse_expiry_text("1000000000000000000000 clicks")
+    assert (parsed.click_limit, parsed.confidence) == (MAX_CLICK_LIMIT, 0.0)
+
+
+def test_llm_answers_beyond_int64_are_not_cached():
+    expiry = {"type": "clicks", "clickLimit": 10 ** 21, "timeLimit": None, "summary": "Expires"}
+
+    assert parsed_from_expiry("a zillion clicks", expiry, NOW) is None
+
+
+def test_llm_click_limits_beyond_int64_are_refused():
+    with pytest.raises(ValueError):
+        _parse_response('{"type": "clicks", "clickLimit": 1e21, "timeLimit": null, "summary": "Expires"}')
+
+
+def test_out_of_range_phrases_go_to_the_llm(parser_with):
+    llm = parser_with({"type": "time", "clickLimit": None, "timeLimit": "2100-01-01T00:00:00Z", "summary": "Expires"})
+    store = MemoryLinkStore()
+    request = CreateLinkRequest(originalUrl="https://a.io", expiryText="expire in 9999 years")
+
+    created = asyncio.run(create_link(store, request))
+
+    assert llm.asked == ["expire in 9999 years"]
+    stored = asyncio.run(store.get_by_code(created["shortCode"]))
+    assert stored["expiresAtEpoch"] == datetime(2100, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_oversized_click_limit_is_stored_capped_when_the_llm_fails(parser_with):
+    llm = parser_with(RuntimeError("Missing GEMINI_API_KEY"))
+    store = MemoryLinkStore()
+    request = CreateLinkRequest(originalUrl="https://a.io", expiryText="1000000000000000000000 clicks")
+
+    created = asyncio.run(create_link(store, request))
+
+    assert llm.asked == ["1000000000000000000000 clicks"]
+    stored = asyncio.run(store.get_by_code(created["shortCode"]))
+    assert stored["clickLimit"] == MAX_CLICK_LIMIT
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+import pytest
+from mongomock_motor import AsyncCursor
+
+from services.indexes import (
+    LINK_INDEXES, QUERY_SHAPES, audit_query_shapes, bootstrap_link_indexes, ensure_link_indexes
+)
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    """
+    Stand-in for MongoDB's query planner, which mongomock lacks: a filter
+    is index-served when a built index leads with one of its top-level fields.
+    """
+    explained = []
+
+    async def explain(cursor):
+        explained.append(cursor._spec)
+        indexes = await asyncio.to_thread(cursor.collection.index_information)
+        leading = {info['key'][0][0] for name, info in indexes.items() if name != '_id_'}
+        if leading & set(cursor._spec):
+            return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+    monkeypatch.setattr(AsyncCursor, "explain", explain, raising=False)
+    return explained
+
+
+@pytest.fixture
+def indexed_db(mongo_db):
+    asyncio.run(ensure_link_indexes(mongo_db))
+    return mongo_db
+
+
+def test_every_declared_index_is_built(indexed_db):
+    built = asyncio.run(indexed_db.links.index_information())
+
+    assert {spec.name for spec in LINK_INDEXES} <= set(built)
+    assert built['shortCodeKey_unique']['partialFilterExpression'] == {"shortCodeKey": {"$exists": True}}
+
+
+def test_rebuilding_leaves_existing_indexes_alone(indexed_db):
+    before = asyncio.run(indexed_db.links.index_information())
+    asyncio.run(ensure_link_indexes(indexed_db))
+
+    assert asyncio.run(indexed_db.links.index_information()) == before
+
+
+def test_failed_index_does_not_stop_the_others(mongo_db, monkeypatch, caplog):
+    collection = type(mongo_db.links)
+    create_index = collection.create_index
+
+    async def blocked_by_duplicates(self, keys, name=None, **kwargs):
+        if name == "id_unique":
+            raise RuntimeError("E11000 duplicate key error")
+        return await create_index(self, keys, name=name, **kwargs)
+
+    monkeypatch.setattr(collection, "create_index", blocked_by_duplicates)
+    with caplog.at_level(logging.ERROR, logger="services.indexes"):
+        asyncio.run(ensure_link_indexes(mongo_db))
+
+    built = asyncio.run(mongo_db.links.index_information())
+    assert "id_unique" not in built and "createdAt" in built
+    assert "id_unique" in caplog.text and "get_link_stats" in caplog.text
+
+
+def test_every_query_shape_is_served_by_a_declared_index(indexed_db, planner):
+    assert asyncio.run(audit_query_shapes(indexed_db)) == {}
+    assert len(planner) == len(QUERY_SHAPES)
+
+
+def test_audit_reports_shapes_that_scan_the_collection(indexed_db, planner):
+    asyncio.run(indexed_db.links.drop_index("active_expiresAtEpoch"))
+
+    assert asyncio.run(audit_query_shapes(indexed_db)) == {"expire_due_links": ["COLLSCAN"]}
+
+
+def test_strict_bootstrap_refuses_unindexed_shapes(mongo_db, planner, monkeypatch):
+    monkeypatch.setattr("services.indexes.LINK_INDEXES", [spec for spec in LINK_INDEXES if spec.name != "createdAt"])
+
+    with pytest.raises(RuntimeError, match="code_index.refresh"):
+        asyncio.run(bootstrap_link_indexes(mongo_db, audit="strict"))
+
+
+def test_warn_bootstrap_logs_and_starts(mongo_db, planner, monkeypatch, caplog):
+    monkeypatch.setattr("services.indexes.LINK_INDEXES", [spec for spec in LINK_INDEXES if spec.name != "createdAt"])
+
+    with caplog.at_level(logging.WARNING, logger="services.indexes"):
+        asyncio.run(bootstrap_link_indexes(mongo_db, audit="warn"))
+    assert "parse_cache.warm is not index-served" in caplog.text
+
+
+def test_bootstrap_without_audit_only_builds(mongo_db, planner):
+    asyncio.run(bootstrap_link_indexes(mongo_db, audit="off"))
+
+    assert planner == []
+    assert "shortCode_unique" in asyncio.run(mongo_db.links.index_information())
@@ -0,0 +1,95 @@
+import time
+import asyncio
+
+import pytest
+
+from services.link_cache import LinkCache, MissCache
+from services.link_service import get_link_by_short_code
+from services.link_store import MemoryLinkStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 5000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def unlimited_link():
+    return {
+        "id": "7c1f3a52-0d47-4b8e-9a31-2f5e6c8d9b10", "shortCode": "Cache1",
+        "originalUrl": "https://example.com/cache", "clicks": 0, "status": "active",
+        "expiresAtEpoch": None, "clickLimit": None
+    }
+
+
+def test_entries_expire_after_the_ttl(clock, unlimited_link):
+    cache = LinkCache(max_entries=10, ttl_seconds=30)
+    cache.put("Cache1", unlimited_link)
+
+    clock.now += 29
+    assert cache.get("Cache1")["originalUrl"] == "https://example.com/cache"
+    clock.now += 1
+    assert cache.get("Cache1") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_ttl_never_outlives_the_time_limit(clock, unlimited_link):
+    cache = LinkCache(max_entries=10, ttl_seconds=30)
+    cache.put("Cache1", {**unlimited_link, "expiresAtEpoch": int(time.time()) + 5})
+
+    clock.now += 6
+    assert cache.get("Cache1") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock, unlimited_link):
+    cache = LinkCache(max_entries=2, ttl_seconds=30)
+    for code in ("Aaaaa1", "Bbbbb1"):
+        cache.put(code, {**unlimited_link, "shortCode": code})
+    cache.get("Aaaaa1")
+    cache.put("Ccccc1", {**unlimited_link, "shortCode": "Ccccc1"})
+
+    assert cache.get("Bbbbb1") is None
+    assert cache.get("Aaaaa1") is not None and cache.get("Ccccc1") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_entries_disables_the_cache(unlimited_link):
+    cache = LinkCache(max_entries=0)
+    cache.put("Cache1", unlimited_link)
+
+    assert cache.get("Cache1") is None
+
+
+def test_miss_cache_forgets_after_its_ttl(clock):
+    misses = MissCache(max_entries=10, ttl_seconds=60)
+    misses.add("Gone01")
+
+    assert "Gone01" in misses
+    clock.now += 60
+    assert "Gone01" not in misses
+
+
+def test_repeat_lookups_are_served_from_the_cache(unlimited_link, monkeypatch):
+    store = MemoryLinkStore()
+    asyncio.run(store.insert(dict(unlimited_link)))
+    reads = []
+    get_by_code = store.get_by_code
+
+    async def counted(short_code):
+        reads.append(short_code)
+        return await get_by_code(short_code)
+
+    monkeypatch.setattr(store, "get_by_code", counted)
+    for _ in range(3):
+        assert asyncio.run(get_link_by_short_code(store, "Cache1"))["shortCode"] == "Cache1"
+    assert reads == ["Cache1"]
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import threading
+
+from tests.conftest import new_link
+from services.link_journal import CLICKS, DELETE, INSERT, STATUS, LinkJournal
+from services.link_store import MemoryLinkStore
+
+
+def segments(directory) -> list:
+    return sorted(name for name in os.listdir(directory) if name.startswith('journal-'))
+
+
+def test_recover_replays_every_record_kind(tmp_path):
+    journal = LinkJournal(str(tmp_path))
+    journal.recover()
+    for record in (
+        (INSERT, new_link("Keep01", click_limit=5)), (INSERT, new_link("Gone01")),
+        (CLICKS, "Keep01", 3), (STATUS, "Keep01", "expired"), (DELETE, "Gone01")
+    ):
+        journal.append(record)
+    asyncio.run(journal.flush())
+
+    links = LinkJournal(str(tmp_path)).recover()
+
+    assert len(links) == 1
+    assert links.state("Keep01") == (3, "expired")
+    assert "Gone01" not in links
+
+
+def test_recover_stops_at_a_torn_record(tmp_path):
+    journal = LinkJournal(str(tmp_path))
+    journal.recover()
+    journal.append((INSERT, new_link("Whole1")))
+    journal.append((INSERT, new_link("Torn01")))
+    asyncio.run(journal.flush())
+    path = os.path.join(tmp_path, segments(tmp_path)[-1])
+    # Crash in the middle of writing the last record
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    recovered = LinkJournal(str(tmp_path))
+    links = recovered.recover()
+
+    assert "Whole1" in links and "Torn01" not in links
+    assert recovered.replayed_records == 1
+
+
+def test_snapshot_folds_segments_and_recovery_replays_the_rest(tmp_path):
+    journal = LinkJournal(str(tmp_path))
+    journal.recover()
+    journal.append((INSERT, new_link("Snap01")))
+    journal.append((CLICKS, "Snap01", 2))
+
+    async def snapshot_then_write():
+        await journal.snapshot()
+        journal.append((CLICKS, "Snap01", 1))
+        journal.append((INSERT, new_link("After1")))
+        await journal.flush()
+
+    asyncio.run(snapshot_then_write())
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.snap')]) == 1
+    assert len(segments(tmp_path)) == 1
+
+    recovered = LinkJournal(str(tmp_path))
+    links = recovered.recover()
+    assert links.state("Snap01") == (3, "active") and "After1" in links
+    assert recovered.replayed_records == 2
+
+
+def test_appends_are_flushed_while_a_snapshot_is_written(tmp_path, monkeypatch):
+    journal = LinkJournal(str(tmp_path))
+    journal.recover()
+    journal.append((INSERT, new_link("Before")))
+    compacting = threading.Event()
+    finish = threading.Event()
+    compact = journal._compact
+
+    def slow_compact(upto):
+        compacting.set()
+        finish.wait(5)
+        compact(upto)
+
+    monkeypatch.setattr(journal, "_compact", slow_compact)
+
+    async def flush_during_snapshot():
+        snapshot = asyncio.create_task(journal.snapshot())
+        while not compacting.is_set():
+            await asyncio.sleep(0.001)
+        journal.append((INSERT, new_link("During")))
+        await asyncio.wait_for(journal.flush(), timeout=1)
+        flushed_before_snapshot_done = not snapshot.done()
+        finish.set()
+        await snapshot
+        return flushed_before_snapshot_done
+
+    assert asyncio.run(flush_during_snapshot())
+    links = LinkJournal(str(tmp_path)).recover()
+    assert "Before" in links and "During" in links
+
+
+def test_memory_store_restores_links_after_a_crash(tmp_path):
+    async def run_and_crash():
+        store = MemoryLinkStore(LinkJournal(str(tmp_path), fsync_ms=1))
+        await store.open()
+        await store.insert(new_link("Crash1", click_limit=3))
+        await store.click("Crash1", 0)
+        await store.journal.flush()
+        # No close(): the process dies here
+
+    async def restart():
+        store = MemoryLinkStore(LinkJournal(str(tmp_path)))
+        await store.open()
+        link = await store.get_by_code("Crash1")
+        await store.close()
+        return link
+
+    asyncio.run(run_and_crash())
+    link = asyncio.run(restart())
+    assert link["clicks"] == 1 and link["clickLimit"] == 3
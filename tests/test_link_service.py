@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from pymongo.errors import ConnectionFailure
+
+import utils.short_code as short_code
+from tests.conftest import new_link
+from models import CreateLinkRequest
+from services.circuit_breaker import CircuitBreaker
+from services.code_index import short_code_index
+from services.link_cache import miss_cache
+from services.link_service import create_link, get_link_by_short_code, track_click
+from services.link_store import DuplicateLinkError, FallbackLinkStore, MemoryLinkStore, MongoLinkStore
+from services.sqlite_store import SqliteLinkStore
+
+
+def fallback_store(db, mongo_down: bool = False) -> FallbackLinkStore:
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=3600)
+    if mongo_down:
+        breaker.record_failure(ConnectionFailure("connection refused"))
+    return FallbackLinkStore(MongoLinkStore(db, breaker), MemoryLinkStore())
+
+
+def test_miss_answered_by_mongodb_is_cached(mongo_db):
+    store = fallback_store(mongo_db)
+
+    assert asyncio.run(get_link_by_short_code(store, "Abc123")) is None
+    assert "Abc123" in miss_cache
+
+
+def test_miss_during_outage_is_not_cached(mongo_db):
+    store = fallback_store(mongo_db, mongo_down=True)
+
+    assert asyncio.run(get_link_by_short_code(store, "Abc123")) is None
+    assert asyncio.run(track_click(store, "Abc123"))["status"] == "not_found"
+    assert "Abc123" not in miss_cache
+
+
+def test_link_created_during_outage_resolves_after_recovery(mongo_db):
+    store = fallback_store(mongo_db)
+    asyncio.run(store.fallback.insert(new_link("Abc123")))
+
+    link = asyncio.run(get_link_by_short_code(store, "Abc123"))
+    result = asyncio.run(track_click(store, "Abc123"))
+
+    assert link["shortCode"] == "Abc123"
+    assert result["shouldRedirect"] and result["currentClicks"] == 1
+    assert "Abc123" not in miss_cache
+
+
+def test_duplicate_code_is_not_stored_in_memory(mongo_db):
+    store = fallback_store(mongo_db)
+    asyncio.run(store.insert(new_link("Taken1")))
+
+    with pytest.raises(DuplicateLinkError):
+        asyncio.run(store.insert(new_link("Taken1")))
+    assert len(store.fallback.links) == 0
+
+
+def test_query_errors_are_not_treated_as_outages(mongo_db, monkeypatch):
+    store = fallback_store(mongo_db)
+    asyncio.run(store.fallback.insert(new_link("Abc123")))
+
+    async def broken(short_code):
+        raise TypeError("bad filter")
+
+    monkeypatch.setattr(store.primary, "get_by_code", broken)
+    with pytest.raises(TypeError):
+        asyncio.run(store.get_by_code("Abc123"))
+
+
+def test_create_link_retries_duplicate_codes(mongo_db, monkeypatch):
+    store = fallback_store(mongo_db)
+    asyncio.run(store.insert(new_link("Taken1")))
+    candidates = iter(["Taken1", "Fresh1"])
+    monkeypatch.setattr(short_code, "random_short_code", lambda length=6: next(candidates))
+    # As for a code another node issued since the Bloom filter last refreshed
+    monkeypatch.setattr(short_code_index, "might_exist", lambda code: False)
+
+    created = asyncio.run(create_link(store, CreateLinkRequest(originalUrl="https://a.io", expiryText="3 clicks")))
+
+    assert created["shortCode"] == "Fresh1"
+    assert asyncio.run(mongo_db.links.count_documents({})) == 2
+    assert len(store.fallback.links) == 0
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def local_store(request, tmp_path):
+    """The engines without MongoDB, which report duplicates through their own errors."""
+    if request.param == "memory":
+        yield MemoryLinkStore()
+        return
+    store = SqliteLinkStore(str(tmp_path / "links.db"))
+    yield store
+    asyncio.run(store.close())
+
+
+def test_engines_report_duplicate_codes_alike(local_store):
+    asyncio.run(local_store.insert(new_link("Taken1")))
+
+    with pytest.raises(DuplicateLinkError):
+        asyncio.run(local_store.insert(new_link("Taken1")))
+    assert asyncio.run(local_store.existing_codes(["Taken1"])) == {"Taken1"}
+
+
+def test_create_link_retries_duplicate_codes_on_local_engines(local_store, monkeypatch):
+    asyncio.run(local_store.insert(new_link("Taken1")))
+    candidates = iter(["Taken1", "Fresh1"])
+    monkeypatch.setattr(short_code, "random_short_code", lambda length=6: next(candidates))
+    monkeypatch.setattr(short_code_index, "might_exist", lambda code: False)
+    # As for a code inserted between the existence check and the insert
+    monkeypatch.setattr(local_store, "code_exists", lambda code: asyncio.sleep(0, False))
+
+    created = asyncio.run(create_link(local_store, CreateLinkRequest(originalUrl="https://a.io", expiryText="3 clicks")))
+
+    assert created["shortCode"] == "Fresh1"
+    assert asyncio.run(local_store.existing_codes(["Taken1", "Fresh1"])) == {"Taken1", "Fresh1"}
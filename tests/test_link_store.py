@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import new_link
+from services.circuit_breaker import CircuitBreaker
+from services.link_store import MongoLinkStore
+
+
+def mongo_store(db, **options) -> MongoLinkStore:
+    return MongoLinkStore(db, CircuitBreaker("test"), **options)
+
+
+async def click_concurrently(store: MongoLinkStore, short_code: str, clicks: int) -> list:
+    return await asyncio.gather(*(store.click(short_code, 0) for _ in range(clicks)))
+
+
+@pytest.mark.parametrize("waves", [1, 3])
+def test_batched_clicks_grant_exactly_the_limit(mongo_db, waves):
+    store = mongo_store(mongo_db, click_batching=True)
+    asyncio.run(store.insert(new_link("Limit5", click_limit=5)))
+
+    async def click_in_waves():
+        results = []
+        for _ in range(waves):
+            results += await click_concurrently(store, "Limit5", 20)
+        return results
+
+    results = asyncio.run(click_in_waves())
+    assert sum(counted for _, counted in results) == 5
+    stored = asyncio.run(store.get_by_code("Limit5"))
+    assert stored["clicks"] == 5 and stored["status"] == "expired"
+
+
+def test_click_grant_records_stay_out_of_reads(mongo_db):
+    batched = mongo_store(mongo_db, click_batching=True)
+    store = mongo_store(mongo_db)
+    link = new_link("Grants", click_limit=10)
+    asyncio.run(store.insert(link))
+
+    results = asyncio.run(click_concurrently(batched, "Grants", 3))
+    raw = asyncio.run(mongo_db.links.find_one({"shortCode": "Grants"}))
+    assert batched.owner in raw["clickGrants"]
+
+    reads = [document for document, _ in results] + [
+        asyncio.run(store.get_by_code("Grants")),
+        asyncio.run(store.get_by_id(link["id"])),
+        asyncio.run(store.click("Grants", 0))[0],
+        asyncio.run(mongo_store(mongo_db, read_batching=True).get_by_code("Grants"))
+    ]
+    for document in reads:
+        assert "clickGrants" not in document and "_id" not in document
+    assert reads[-1]["clicks"] == 4
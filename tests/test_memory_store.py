@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from models import CreateLinkRequest
+from services.link_journal import CLICKS, INSERT, STATUS
+from services.link_service import create_link, track_click
+from services.link_store import MemoryLinkStore
+
+
+class RecordingJournal:
+    """Keeps appended records instead of writing them."""
+
+    def __init__(self):
+        self.records = []
+
+    def append(self, record) -> None:
+        self.records.append(record)
+
+
+@pytest.fixture
+def store():
+    return MemoryLinkStore(journal=RecordingJournal())
+
+
+@pytest.fixture
+def limited_code(store):
+    request = CreateLinkRequest(originalUrl="https://example.com/limited", expiryText="expire after 5 clicks")
+    return asyncio.run(create_link(store, request))["shortCode"]
+
+
+def test_concurrent_redirects_grant_exactly_the_limit(store, limited_code):
+    async def redirect_many():
+        return await asyncio.gather(*(track_click(store, limited_code) for _ in range(200)))
+
+    results = asyncio.run(redirect_many())
+    link = asyncio.run(store.get_by_code(limited_code))
+    assert sum(result["shouldRedirect"] for result in results) == 5
+    assert (link["clicks"], link["status"]) == (5, "expired")
+
+
+def test_only_counted_clicks_and_one_expiry_are_journaled(store, limited_code):
+    async def click_seven_times():
+        return await asyncio.gather(*(store.click(limited_code, time.time()) for _ in range(7)))
+
+    asyncio.run(click_seven_times())
+    records = [record for record in store.journal.records if record[0] != INSERT]
+    assert records.count((CLICKS, limited_code, 1)) == 5
+    assert records.count((STATUS, limited_code, "expired")) == 1
+    assert len(records) == 6
+
+
+def test_side_dict_links_are_limited_too(store, limited_code):
+    link = asyncio.run(store.get_by_code(limited_code))
+    link.update(shortCode="Tagged", id="tagged-link", tags=["outside the columns"])
+    asyncio.run(store.insert(link))
+    assert store.links.stats()["documentLinks"] == 1
+
+    async def click_many():
+        return await asyncio.gather(*(store.click("Tagged", time.time()) for _ in range(20)))
+
+    assert [counted for _, counted in asyncio.run(click_many())].count(True) == 5
+
+
+def test_time_limit_refuses_and_expires(store):
+    request = CreateLinkRequest(originalUrl="https://example.com/hour", expiryText="expire in 1 hour")
+    code = asyncio.run(create_link(store, request))["shortCode"]
+
+    assert asyncio.run(store.click(code, time.time()))[1] is True
+    link, counted = asyncio.run(store.click(code, time.time() + 3601))
+    assert not counted and link["status"] == "expired"
+
+
+def test_unknown_code_is_not_counted(store):
+    assert asyncio.run(store.click("Nobody", time.time())) == (None, False)
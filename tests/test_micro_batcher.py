@@ -0,0 +1,123 @@
+import asyncio
+
+from services.micro_batcher import MicroBatcher
+
+
+class Recorder:
+    """A handler that records its batches and doubles every item."""
+
+    def __init__(self):
+        self.batches = []
+        self.release = None
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        if self.release is not None:
+            await self.release.wait()
+        return [item * 2 for item in items]
+
+
+def test_window_flushes_concurrent_items_as_one_batch():
+    handler = Recorder()
+    batcher = MicroBatcher(handler, window_ms=20, max_batch=100)
+
+    async def submit_three():
+        return await asyncio.gather(*(batcher.submit(i) for i in (1, 2, 3)))
+
+    assert asyncio.run(submit_three()) == [2, 4, 6]
+    assert handler.batches == [[1, 2, 3]]
+    assert batcher.stats()["fullBatches"] == 0
+
+
+def test_full_batch_goes_out_without_waiting_for_the_window():
+    handler = Recorder()
+    batcher = MicroBatcher(handler, window_ms=60_000, max_batch=2)
+
+    async def submit_four():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=1)
+
+    assert asyncio.run(submit_four()) == [0, 2, 4, 6]
+    assert handler.batches == [[0, 1], [2, 3]]
+    assert batcher.stats()["fullBatches"] == 2
+
+
+def test_handler_error_reaches_every_caller():
+    async def broken(items):
+        raise RuntimeError("backend down")
+
+    batcher = MicroBatcher(broken, window_ms=0, max_batch=10)
+
+    async def submit_three():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(submit_three())
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert batcher.stats()["failedBatches"] == 1
+
+
+def test_item_error_reaches_only_its_caller():
+    async def handler(items):
+        return [ValueError(item) if item < 0 else item for item in items]
+
+    batcher = MicroBatcher(handler, window_ms=0, max_batch=10)
+
+    async def submit_mixed():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(-1), batcher.submit(2), return_exceptions=True)
+
+    first, failed, last = asyncio.run(submit_mixed())
+    assert (first, last) == (1, 2)
+    assert isinstance(failed, ValueError)
+    assert batcher.stats()["failedBatches"] == 0
+
+
+def test_cancelled_caller_does_not_disturb_the_batch():
+    handler = Recorder()
+    batcher = MicroBatcher(handler, window_ms=0, max_batch=10)
+
+    async def cancel_one_waiter():
+        handler.release = asyncio.Event()
+        waiters = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+        while not handler.batches:
+            await asyncio.sleep(0)
+        # Gives up while its batch is in the handler
+        waiters[1].cancel()
+        handler.release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    first, cancelled, last = asyncio.run(cancel_one_waiter())
+    assert (first, last) == (0, 4)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert handler.batches == [[0, 1, 2]]
+
+
+def test_items_queue_behind_a_saturated_batcher():
+    handler = Recorder()
+    batcher = MicroBatcher(handler, window_ms=0, max_batch=10, max_in_flight=1)
+
+    async def submit_while_busy():
+        handler.release = asyncio.Event()
+        first = asyncio.create_task(batcher.submit(0))
+        while not handler.batches:
+            await asyncio.sleep(0)
+        later = [asyncio.create_task(batcher.submit(i)) for i in (1, 2, 3)]
+        await asyncio.sleep(0.01)
+        assert batcher.stats()["pending"] == 3
+        handler.release.set()
+        return await asyncio.gather(first, *later)
+
+    assert asyncio.run(submit_while_busy()) == [0, 2, 4, 6]
+    assert handler.batches == [[0], [1, 2, 3]]
+
+
+def test_close_sends_pending_items():
+    handler = Recorder()
+    batcher = MicroBatcher(handler, window_ms=60_000, max_batch=10)
+
+    async def submit_then_close():
+        waiter = asyncio.create_task(batcher.submit(5))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(batcher.close(), timeout=1)
+        return await waiter
+
+    assert asyncio.run(submit_then_close()) == 10
+    assert batcher.stats()["batchSizeHistogram"] == {"1": 1}
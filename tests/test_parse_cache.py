@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from tests.conftest import new_link
+from services.parse_cache import COLLECTION, ExpiryParseCache
+
+
+def stored_link(short_code: str, raw_input: str, time_limit: datetime, created_at: datetime) -> dict:
+    link = new_link(short_code)
+    link["expiryRules"].update(type="time", timeLimit=time_limit, rawInput=raw_input)
+    link["createdAt"] = created_at
+    return link
+
+
+def test_warm_skips_entries_whose_time_limit_has_passed(mongo_db):
+    now = datetime.utcnow()
+    created = now - timedelta(days=20)
+    asyncio.run(mongo_db.links.insert_many([
+        stored_link("Launch", "until the spring launch on the 6th of oct", created + timedelta(days=10), created),
+        stored_link("Sprint", "for the whole sprint", created + timedelta(days=14), created),
+    ]))
+    asyncio.run(mongo_db[COLLECTION].insert_many([
+        {"_id": "until the 2020 retreat", "clickLimit": None, "timeRules": ["at 2020-01-01 23:59:59"], "updatedAt": now},
+        {"_id": "for a fortnight", "clickLimit": None, "timeRules": ["+14d"], "updatedAt": now},
+    ]))
+    cache = ExpiryParseCache(max_entries=100, shared=True)
+    cache.db = mongo_db
+
+    # Every phrase counts as one the grammar can't read
+    asyncio.run(cache.warm(mongo_db, min_confidence=1.01))
+
+    # The launch names a date, ten days ago; the sprint became a 14-day offset
+    assert set(cache._entries) == {"for the whole sprint", "for a fortnight"}
+    assert cache.stats()["warmed"] == 2
+    assert asyncio.run(cache.get("for the whole sprint")).time_rules == ("+14d",)
@@ -0,0 +1,125 @@
+import asyncio
+
+from pymongo.errors import AutoReconnect, ConnectionFailure
+
+from tests.conftest import new_link
+from services.circuit_breaker import CircuitBreaker
+from services.link_store import FallbackLinkStore, MemoryLinkStore, MongoLinkStore
+from services.reconciler import OutageReconciler
+
+
+class Outage:
+    """A FallbackLinkStore whose MongoDB breaker opens and heals on demand."""
+
+    def __init__(self, db):
+        self.now = 0.0
+        self.breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10, clock=lambda: self.now)
+        self.store = FallbackLinkStore(MongoLinkStore(db, self.breaker), MemoryLinkStore())
+        self.reconciler = OutageReconciler(interval=0, batch_size=100)
+        self.reconciler._store = self.store
+
+    def begin(self) -> None:
+        self.breaker.record_failure(ConnectionFailure("connection refused"))
+
+    def end(self) -> None:
+        self.now += 10
+
+
+async def stored(db, short_code: str) -> dict:
+    return await db.links.find_one({"shortCode": short_code}, {"_id": 0})
+
+
+def test_link_created_during_outage_is_written_back(mongo_db):
+    outage = Outage(mongo_db)
+    outage.begin()
+    link = new_link("Outage", click_limit=5)
+    asyncio.run(outage.store.insert(link))
+
+    assert asyncio.run(outage.reconciler.run_once()) == 0
+    assert "Outage" in outage.store.fallback.links
+
+    outage.end()
+    assert asyncio.run(outage.reconciler.run_once()) == 1
+    written = asyncio.run(stored(mongo_db, "Outage"))
+    assert written["id"] == link["id"] and written["clickLimit"] == 5 and written["status"] == "active"
+    assert "Outage" not in outage.store.fallback.links
+    assert asyncio.run(outage.reconciler.run_once()) == 0
+
+
+def test_outage_clicks_are_merged_exactly_once(mongo_db, monkeypatch):
+    outage = Outage(mongo_db)
+    outage.begin()
+    asyncio.run(outage.store.insert(new_link("Clicky")))
+    for _ in range(3):
+        asyncio.run(outage.store.click("Clicky", 0))
+    outage.end()
+
+    collection = type(mongo_db.links)
+    bulk_write = collection.bulk_write
+
+    async def applied_then_timed_out(self, *args, **kwargs):
+        await bulk_write(self, *args, **kwargs)
+        raise AutoReconnect("timed out waiting for the reply")
+
+    # The first attempt's outcome is unknown, so the same batch is replayed
+    monkeypatch.setattr(collection, "bulk_write", applied_then_timed_out)
+    assert asyncio.run(outage.reconciler.run_once()) == 0
+    monkeypatch.setattr(collection, "bulk_write", bulk_write)
+    # The timeout reopened the breaker
+    outage.end()
+    assert asyncio.run(outage.reconciler.run_once()) == 1
+
+    assert asyncio.run(stored(mongo_db, "Clicky"))["clicks"] == 3
+    assert "Clicky" not in outage.store.fallback.links
+    assert outage.reconciler.synced_clicks == 3
+
+
+def test_click_during_reconciliation_is_written_in_the_next_batch(mongo_db, monkeypatch):
+    outage = Outage(mongo_db)
+    outage.begin()
+    asyncio.run(outage.store.insert(new_link("Racing")))
+    asyncio.run(outage.store.click("Racing", 0))
+    outage.end()
+    collection = type(mongo_db.links)
+    bulk_write = collection.bulk_write
+
+    async def reconcile_with_concurrent_clicks():
+        in_flight = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_bulk_write(self, *args, **kwargs):
+            in_flight.set()
+            await release.wait()
+            return await bulk_write(self, *args, **kwargs)
+
+        monkeypatch.setattr(collection, "bulk_write", slow_bulk_write)
+        batch = asyncio.create_task(outage.reconciler.run_once())
+        await in_flight.wait()
+        # Not in MongoDB yet, so the click is counted in memory
+        await outage.store.click("Racing", 0)
+        release.set()
+        assert await batch == 1
+        assert "Racing" in outage.store.fallback.links
+
+        monkeypatch.setattr(collection, "bulk_write", bulk_write)
+        # Now in MongoDB, so this click is counted there
+        await outage.store.click("Racing", 0)
+        assert await outage.reconciler.run_once() == 1
+
+    asyncio.run(reconcile_with_concurrent_clicks())
+    assert asyncio.run(stored(mongo_db, "Racing"))["clicks"] == 3
+    assert "Racing" not in outage.store.fallback.links
+
+
+def test_code_issued_elsewhere_during_outage_stays_in_memory(mongo_db):
+    outage = Outage(mongo_db)
+    outage.begin()
+    mine = new_link("Shared")
+    asyncio.run(outage.store.insert(mine))
+    asyncio.run(mongo_db.links.insert_one(new_link("Shared")))
+    outage.end()
+
+    assert asyncio.run(outage.reconciler.run_once()) == 0
+    assert "Shared" in outage.reconciler.conflicts
+    assert asyncio.run(outage.store.fallback.get_by_code("Shared"))["id"] == mine["id"]
+    assert asyncio.run(mongo_db.links.count_documents({"shortCode": "Shared"})) == 1
@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+from itertools import product
+
+import pytest
+
+import utils.short_code as short_code
+from scripts.migrate_short_code_keys import migrate
+from utils.short_code import (
+    SHORT_CODE_ALPHABET, link_id_filter, link_lookup_keys, short_code_filter, short_code_key, short_codes_filter
+)
+
+
+@pytest.fixture
+def int_key_layout(monkeypatch):
+    monkeypatch.setattr(short_code, "SHORT_CODE_INT_KEY", True)
+
+
+@pytest.fixture
+def legacy_links(mongo_db):
+    """Links stored before the int64 layout: no shortCodeKey or idKey."""
+    links = [{"id": str(uuid.uuid4()), "shortCode": code, "clicks": 0} for code in ("Abc123", "Xyz789", "Q1w2E3r4T5y6")]
+    asyncio.run(mongo_db.links.insert_many([dict(link) for link in links]))
+    return links
+
+
+def test_keys_are_unique_across_lengths():
+    codes = [''.join(chars) for length in (1, 2) for chars in product(SHORT_CODE_ALPHABET, repeat=length)]
+    keys = {short_code_key(code) for code in codes}
+
+    assert len(keys) == len(codes)
+
+
+def test_ten_characters_fit_in_an_int64():
+    longest = SHORT_CODE_ALPHABET[-1] * 10
+
+    assert short_code_key(longest) < 2 ** 63
+    assert short_code_key(longest + "a") is None
+
+
+def test_lookup_keys_skip_fields_that_do_not_fit():
+    keys = link_lookup_keys("Q1w2E3r4T5y6", "not-a-uuid")
+
+    assert keys == {}
+
+
+def test_filters_use_the_keys_only_when_enabled(int_key_layout):
+    link_id = str(uuid.uuid4())
+
+    assert short_code_filter("Abc123") == {"shortCodeKey": short_code_key("Abc123")}
+    assert short_code_filter("Q1w2E3r4T5y6") == {"shortCode": "Q1w2E3r4T5y6"}
+    assert short_codes_filter(["Abc123", "Q1w2E3r4T5y6"]) == {"shortCode": {"$in": ["Abc123", "Q1w2E3r4T5y6"]}}
+    assert list(link_id_filter(link_id)) == ["idKey"]
+
+
+def test_filters_default_to_the_string_fields():
+    assert short_code_filter("Abc123") == {"shortCode": "Abc123"}
+    assert link_id_filter("some-id") == {"id": "some-id"}
+
+
+def test_migration_backfills_keys_and_is_rerunnable(mongo_db, legacy_links, int_key_layout):
+    assert asyncio.run(migrate(mongo_db, chunk_size=2)) == 3
+    assert asyncio.run(migrate(mongo_db, chunk_size=2)) == 0
+
+    for link in legacy_links[:2]:
+        found = asyncio.run(mongo_db.links.find_one(short_code_filter(link['shortCode'])))
+        assert found['id'] == link['id']
+        assert asyncio.run(mongo_db.links.find_one(link_id_filter(link['id'])))['shortCode'] == link['shortCode']
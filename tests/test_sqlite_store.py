@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+
+from services.link_store import DuplicateLinkError
+from services.sqlite_store import SqliteLinkStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "links.db")
+
+
+@pytest.fixture
+def store(db_path):
+    store = SqliteLinkStore(db_path, read_threads=2)
+    yield store
+    asyncio.run(store.close())
+
+
+@pytest.fixture
+def make_link():
+    """Link documents with the precomputed expiry fields create_link stores."""
+    def make(short_code: str, click_limit=None, expires_at=None) -> dict:
+        return {
+            "id": str(uuid.uuid4()), "shortCode": short_code, "originalUrl": f"https://example.com/{short_code}",
+            "clicks": 0, "status": "active", "clickLimit": click_limit, "expiresAtEpoch": expires_at
+        }
+    return make
+
+
+def test_concurrent_clicks_respect_the_limit(store, make_link):
+    asyncio.run(store.insert(make_link("Limit3", click_limit=3)))
+
+    async def click_twenty_times():
+        return await asyncio.gather(*(store.click("Limit3", time.time()) for _ in range(20)))
+
+    outcomes = asyncio.run(click_twenty_times())
+    link = asyncio.run(store.get_by_code("Limit3"))
+    assert [counted for _, counted in outcomes].count(True) == 3
+    assert (link["clicks"], link["status"]) == (3, "expired")
+
+
+def test_batched_writes_apply_in_submission_order(store, make_link):
+    now = time.time()
+    writing, release = threading.Event(), threading.Event()
+
+    def hold_the_writer(connection):
+        writing.set()
+        release.wait()
+
+    async def one_batch():
+        held = asyncio.ensure_future(store._write(hold_the_writer))
+        await asyncio.get_running_loop().run_in_executor(None, writing.wait)
+        # Queued behind the held write, so the writer drains them as one batch
+        batch = asyncio.gather(
+            store.insert(make_link("Order1", click_limit=5)),
+            store.click("Order1", now),
+            store.click("Order1", now),
+            store.mark_expired("Order1"),
+            store.click("Order1", now)
+        )
+        await asyncio.sleep(0)
+        release.set()
+        await held
+        return await batch
+
+    _, (first, counted_first), (second, counted_second), _, (last, counted_last) = asyncio.run(one_batch())
+    assert (first["clicks"], second["clicks"], counted_first, counted_second) == (1, 2, True, True)
+    assert (last["clicks"], last["status"], counted_last) == (2, "expired", False)
+    assert store.stats()["transactions"] == 2
+    assert store.stats()["maxWritesPerTransaction"] == 5
+
+
+def test_duplicate_insert_fails_alone(store, make_link):
+    taken = make_link("Taken1")
+    asyncio.run(store.insert(taken))
+
+    async def batch_with_duplicates():
+        return await asyncio.gather(
+            store.insert(make_link("Fresh1")),
+            store.insert(make_link("Taken1")),
+            store.insert({**make_link("Fresh2"), "id": taken["id"]}),
+            store.insert(make_link("Fresh3")),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(batch_with_duplicates())
+    assert [type(result) for result in results] == [type(None), DuplicateLinkError, DuplicateLinkError, type(None)]
+    assert asyncio.run(store.existing_codes(["Taken1", "Fresh1", "Fresh2", "Fresh3"])) == {"Taken1", "Fresh1", "Fresh3"}
+    assert asyncio.run(store.get_by_code("Taken1"))["id"] == taken["id"]
+    assert store.stats()["failedWrites"] == 2
+
+
+def test_time_limit_and_due_sweep(store, make_link):
+    now = time.time()
+    asyncio.run(store.insert(make_link("Past01", expires_at=int(now) - 1)))
+    asyncio.run(store.insert(make_link("Future", expires_at=int(now) + 3600)))
+
+    assert asyncio.run(store.click("Future", now))[1] is True
+    assert asyncio.run(store.expire_due(now)) == 1
+    assert asyncio.run(store.get_by_code("Past01"))["status"] == "expired"
+    assert asyncio.run(store.get_by_code("Future"))["status"] == "active"
+
+
+def test_close_commits_queued_writes(db_path, make_link):
+    link = make_link("Queued")
+
+    async def insert_then_close():
+        store = SqliteLinkStore(db_path)
+        pending = asyncio.ensure_future(store.insert(link))
+        await asyncio.sleep(0)
+        await store.close()
+        await pending
+
+    asyncio.run(insert_then_close())
+    reopened = SqliteLinkStore(db_path)
+    try:
+        assert asyncio.run(reopened.get_by_id(link["id"]))["shortCode"] == "Queued"
+    finally:
+        asyncio.run(reopened.close())
@@ -0,0 +1,62 @@
+import time
+import asyncio
+
+import pytest
+
+from models import CreateLinkRequest
+from services.circuit_breaker import CircuitBreaker
+from services.link_service import create_link, track_click
+from services.link_store import MongoLinkStore
+
+
+@pytest.fixture
+def store(mongo_db):
+    return MongoLinkStore(mongo_db, CircuitBreaker("test"))
+
+
+@pytest.fixture
+def three_click_code(store):
+    request = CreateLinkRequest(originalUrl="https://example.com/three", expiryText="expire after 3 clicks")
+    return asyncio.run(create_link(store, request))["shortCode"]
+
+
+@pytest.fixture
+def one_hour_code(store):
+    request = CreateLinkRequest(originalUrl="https://example.com/hour", expiryText="expire in 1 hour")
+    return asyncio.run(create_link(store, request))["shortCode"]
+
+
+def test_clicks_count_up_to_the_limit_then_expire(store, three_click_code):
+    results = [asyncio.run(track_click(store, three_click_code)) for _ in range(4)]
+
+    assert [result["shouldRedirect"] for result in results] == [True, True, True, False]
+    assert [result["currentClicks"] for result in results] == [1, 2, 3, 3]
+    assert results[-1]["status"] == "expired"
+    stored = asyncio.run(store.get_by_code(three_click_code))
+    assert stored["clicks"] == 3 and stored["status"] == "expired"
+
+
+def test_concurrent_clicks_never_pass_the_limit(store, three_click_code):
+    async def click_ten_times():
+        return await asyncio.gather(*(track_click(store, three_click_code) for _ in range(10)))
+
+    results = asyncio.run(click_ten_times())
+
+    assert sum(result["shouldRedirect"] for result in results) == 3
+    assert asyncio.run(store.get_by_code(three_click_code))["clicks"] == 3
+
+
+def test_click_after_the_time_limit_is_refused(store, one_hour_code, monkeypatch):
+    later = time.time() + 2 * 3600
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    result = asyncio.run(track_click(store, one_hour_code))
+
+    assert not result["shouldRedirect"] and result["status"] == "expired"
+    assert asyncio.run(store.get_by_code(one_hour_code))["clicks"] == 0
+
+
+def test_unknown_code_is_not_found(store):
+    result = asyncio.run(track_click(store, "Zz9Zz9"))
+
+    assert result["status"] == "not_found" and not result["shouldRedirect"]